@@ -2,7 +2,7 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
-from .utils import *
+from . import utils as _utils
 from .log import Logger
 from importlib.metadata import version, PackageNotFoundError
 
@@ -12,53 +12,91 @@ try:
 except PackageNotFoundError:
     __version__ = "unknown version"
 
-from .core.simulation_modules.volume_creation_module.model_based_adapter import \
-    ModelBasedAdapter
-from .core.simulation_modules.volume_creation_module.segmentation_based_adapter import \
-    SegmentationBasedAdapter
-from .core.simulation_modules.optical_module.mcx_adapter import \
-    MCXAdapter
-from .core.simulation_modules.optical_module.mcx_reflectance_adapter import \
-    MCXReflectanceAdapter
-from .core.simulation_modules.acoustic_module.k_wave_adapter import \
-    KWaveAdapter
-from .core.simulation_modules.reconstruction_module.delay_and_sum_adapter import \
-    DelayAndSumAdapter
-from .core.simulation_modules.reconstruction_module.delay_multiply_and_sum_adapter import \
-    DelayMultiplyAndSumAdapter
-from .core.simulation_modules.reconstruction_module.signed_delay_multiply_and_sum_adapter import \
-    SignedDelayMultiplyAndSumAdapter
-from .core.simulation_modules.reconstruction_module.time_reversal_adapter import \
-    TimeReversalAdapter
+# The adapters, processing components and devices are only imported when they are accessed for the first time,
+# such that importing simpa does not import torch, scipy, h5py, sklearn, matplotlib or the simulation backends.
+from .utils.lazy_import import create_lazy_attributes
 
-from .core.simulation_modules.reconstruction_module.delay_and_sum_adapter import \
-    reconstruct_delay_and_sum_pytorch
-from .core.simulation_modules.reconstruction_module.delay_multiply_and_sum_adapter import \
-    reconstruct_delay_multiply_and_sum_pytorch
-from .core.simulation_modules.reconstruction_module.signed_delay_multiply_and_sum_adapter import \
-    reconstruct_signed_delay_multiply_and_sum_pytorch
-from .core.simulation_modules.acoustic_module.k_wave_adapter import \
-    perform_k_wave_acoustic_forward_simulation
+_LAZY_ATTRIBUTES = {name: "simpa.utils" for name in _utils.__all__}
+# the submodules that were exposed by the former wildcard imports of simpa.utils and the device digital twins
+_LAZY_ATTRIBUTES.update({name: "simpa.utils" for name in [
+    "calculate", "constants", "deformation_manager", "dict_path_manager", "libraries", "path_manager",
+    "processing_device", "serializer", "settings", "tags", "tissue_properties"]})
+_LAZY_ATTRIBUTES.update({name: ".core.device_digital_twins" for name in [
+    "detection_geometries", "digital_device_twin_base", "illumination_geometries", "pa_devices"]})
+_LAZY_ATTRIBUTES.update({
+    "ModelBasedAdapter": ".core.simulation_modules.volume_creation_module.model_based_adapter",
+    "SegmentationBasedAdapter": ".core.simulation_modules.volume_creation_module.segmentation_based_adapter",
+    "MCXAdapter": ".core.simulation_modules.optical_module.mcx_adapter",
+    "MCXReflectanceAdapter": ".core.simulation_modules.optical_module.mcx_reflectance_adapter",
+    "FluenceSolverBase": ".core.simulation_modules.optical_module.fluence_solver",
+    "OpticalAdapterFluenceSolver": ".core.simulation_modules.optical_module.fluence_solver",
+    "KWaveAdapter": ".core.simulation_modules.acoustic_module.k_wave_adapter",
+    "DelayAndSumAdapter": ".core.simulation_modules.reconstruction_module.delay_and_sum_adapter",
+    "DelayMultiplyAndSumAdapter": ".core.simulation_modules.reconstruction_module.delay_multiply_and_sum_adapter",
+    "SignedDelayMultiplyAndSumAdapter":
+        ".core.simulation_modules.reconstruction_module.signed_delay_multiply_and_sum_adapter",
+    "TimeReversalAdapter": ".core.simulation_modules.reconstruction_module.time_reversal_adapter",
 
-from simpa.core.processing_components.monospectral.noise import GaussianNoise
-from simpa.core.processing_components.monospectral.noise import GammaNoise
-from simpa.core.processing_components.monospectral.noise import PoissonNoise
-from simpa.core.processing_components.monospectral.noise import SaltAndPepperNoise
-from simpa.core.processing_components.monospectral.noise import UniformNoise
-from simpa.core.processing_components.monospectral.field_of_view_cropping import FieldOfViewCropping
-from simpa.core.processing_components.monospectral.iterative_qPAI_algorithm import IterativeqPAI
-from simpa.core.processing_components.multispectral.linear_unmixing import LinearUnmixing
+    "reconstruct_delay_and_sum_pytorch": ".core.simulation_modules.reconstruction_module.delay_and_sum_adapter",
+    "reconstruct_delay_multiply_and_sum_pytorch":
+        ".core.simulation_modules.reconstruction_module.delay_multiply_and_sum_adapter",
+    "reconstruct_signed_delay_multiply_and_sum_pytorch":
+        ".core.simulation_modules.reconstruction_module.signed_delay_multiply_and_sum_adapter",
+    "perform_k_wave_acoustic_forward_simulation": ".core.simulation_modules.acoustic_module.k_wave_adapter",
 
-from .core.device_digital_twins import *
+    "GaussianNoise": ".core.processing_components.monospectral.noise",
+    "GammaNoise": ".core.processing_components.monospectral.noise",
+    "PoissonNoise": ".core.processing_components.monospectral.noise",
+    "SaltAndPepperNoise": ".core.processing_components.monospectral.noise",
+    "UniformNoise": ".core.processing_components.monospectral.noise",
+    "CompositeNoise": ".core.processing_components.monospectral.noise",
+    "FieldOfViewCropping": ".core.processing_components.monospectral.field_of_view_cropping",
+    "IterativeqPAI": ".core.processing_components.monospectral.iterative_qPAI_algorithm",
+    "LinearUnmixing": ".core.processing_components.multispectral.linear_unmixing",
 
-from .core.simulation import simulate
+    "DigitalDeviceTwinBase": ".core.device_digital_twins",
+    "PhotoacousticDevice": ".core.device_digital_twins",
+    "DetectionGeometryBase": ".core.device_digital_twins",
+    "CurvedArrayDetectionGeometry": ".core.device_digital_twins",
+    "LinearArrayDetectionGeometry": ".core.device_digital_twins",
+    "PlanarArrayDetectionGeometry": ".core.device_digital_twins",
+    "IlluminationGeometryBase": ".core.device_digital_twins",
+    "SlitIlluminationGeometry": ".core.device_digital_twins",
+    "GaussianBeamIlluminationGeometry": ".core.device_digital_twins",
+    "PencilArrayIlluminationGeometry": ".core.device_digital_twins",
+    "PencilBeamIlluminationGeometry": ".core.device_digital_twins",
+    "DiskIlluminationGeometry": ".core.device_digital_twins",
+    "RectangleIlluminationGeometry": ".core.device_digital_twins",
+    "RingIlluminationGeometry": ".core.device_digital_twins",
+    "MSOTAcuityIlluminationGeometry": ".core.device_digital_twins",
+    "MSOTInVisionIlluminationGeometry": ".core.device_digital_twins",
+    "InVision256TF": ".core.device_digital_twins",
+    "MSOTAcuityEcho": ".core.device_digital_twins",
+    "RSOMExplorerP50": ".core.device_digital_twins",
 
-from .io_handling import load_data_field, load_hdf5, save_data_field, save_hdf5
-from .io_handling.zenodo_download import download_from_zenodo
-from .io_handling.ipasc import export_to_ipasc
+    "simulate": ".core.simulation",
 
-from .visualisation.matplotlib_data_visualisation import visualise_data
-from .visualisation.matplotlib_device_visualisation import visualise_device
+    "load_data_field": ".io_handling",
+    "load_hdf5": ".io_handling",
+    "save_data_field": ".io_handling",
+    "save_hdf5": ".io_handling",
+    "open_data_field": ".io_handling",
+    "memory_map_data_field": ".io_handling",
+    "HDF5FileSession": ".io_handling",
+    "index_hdf5": ".io_handling",
+    "ShardedDatasetWriter": ".io_handling",
+    "ShardedDatasetReader": ".io_handling",
+    "SimulationDataset": ".io_handling",
+    "create_data_loader": ".io_handling",
+    "download_from_zenodo": ".io_handling.zenodo_download",
+    "export_to_ipasc": ".io_handling.ipasc",
 
-from .utils.quality_assurance.data_sanity_testing import assert_equal_shapes
-from .utils.quality_assurance.data_sanity_testing import assert_array_well_defined
+    "visualise_data": ".visualisation.matplotlib_data_visualisation",
+    "visualise_device": ".visualisation.matplotlib_device_visualisation",
+
+    "assert_equal_shapes": ".utils.quality_assurance.data_sanity_testing",
+    "assert_array_well_defined": ".utils.quality_assurance.data_sanity_testing",
+})
+
+__getattr__, __dir__, _lazy_names = create_lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+__all__ = ["Logger", "__version__"] + _lazy_names
@@ -1,12 +1,15 @@
 # SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
+import functools
 from abc import abstractmethod
+from typing import List, Optional
 
 from simpa.core.device_digital_twins import DigitalDeviceTwinBase
 from simpa.log import Logger
-from simpa.utils import Settings
+from simpa.utils import Settings, Tags
 from simpa.utils.processing_device import get_processing_device
+from simpa.utils.telemetry import measure_pipeline_element
 
 
 class PipelineElementBase:
@@ -23,6 +26,19 @@ class PipelineElementBase:
         self.global_settings = global_settings
         self.torch_device = get_processing_device(self.global_settings)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every run is recorded in the telemetry of the simulation, see Tags.RECORD_TELEMETRY.
+        if "run" in cls.__dict__ and not getattr(cls.run, "__isabstractmethod__", False):
+            run = cls.run
+
+            @functools.wraps(run)
+            def measured_run(self, *args, **kwargs):
+                with measure_pipeline_element(self, self.get_telemetry_wavelength()):
+                    return run(self, *args, **kwargs)
+
+            cls.run = measured_run
+
     @abstractmethod
     def run(self, digital_device_twin: DigitalDeviceTwinBase):
         """
@@ -31,3 +47,42 @@ class PipelineElementBase:
         :param digital_device_twin: The digital twin that can be used by the digital device_twin.
         """
         pass
+
+    def get_input_data_fields(self) -> Optional[List]:
+        """
+        Returns the data fields that are read by the run method. Entries are either data field tags, which refer to
+        the current Tags.WAVELENGTH, or (data_field, wavelength) tuples.
+        The graph execution mode of the simulate method uses this information to derive the execution order.
+
+        :return: list of data fields or None if the data fields are not known. In the latter case, the element
+            is scheduled as a barrier that does not run concurrently with any other pipeline element.
+        """
+        return None
+
+    def get_output_data_fields(self) -> Optional[List]:
+        """
+        Returns the data fields that are written by the run method in the same format as
+        get_input_data_fields.
+
+        :return: list of data fields or None if the data fields are not known.
+        """
+        return None
+
+    def uses_random_numbers(self) -> bool:
+        """
+        Returns whether the run method draws random numbers from numpy's global random state.
+        The graph and pipelined execution modes of the simulate method run such elements one at a time and with the
+        random state of the sequential execution, such that Tags.RANDOM_SEED gives the same results in all modes.
+        Elements that do not use numpy's global random state can return False to be run concurrently.
+
+        :return: True if the element may draw random numbers from numpy's global random state.
+        """
+        return True
+
+    def get_telemetry_wavelength(self):
+        """
+        :return: the wavelength under which the runs of the pipeline element are recorded in the telemetry or None.
+        """
+        if Tags.WAVELENGTH in self.global_settings:
+            return self.global_settings[Tags.WAVELENGTH]
+        return None
@@ -0,0 +1,296 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Optional, Set
+
+import numpy as np
+
+from simpa.core.pipeline_element_base import PipelineElementBase
+from simpa.core.device_digital_twins import DigitalDeviceTwinBase
+from simpa.core.processing_components.multispectral import MultispectralProcessingAlgorithm
+from simpa.utils import Tags, Settings
+from simpa.utils.dict_path_manager import generate_dict_path
+from simpa.log import Logger
+
+
+def resolve_data_field_paths(data_fields: Optional[list], wavelength) -> Optional[Set[str]]:
+    """
+    Translates the data fields declared by a pipeline element into the paths they occupy in the HDF5 file.
+    Two data fields refer to the same data if and only if they are resolved to the same path.
+
+    :param data_fields: list of data field tags or (data_field, wavelength) tuples. Can be None.
+    :param wavelength: the wavelength that is used for data field tags without an explicit wavelength.
+    :return: set of HDF5 paths or None if data_fields is None.
+    """
+    if data_fields is None:
+        return None
+    paths = set()
+    for data_field in data_fields:
+        field_wavelength = wavelength
+        if isinstance(data_field, tuple):
+            data_field, field_wavelength = data_field
+        try:
+            paths.add(generate_dict_path(data_field, wavelength=field_wavelength))
+        except ValueError:
+            # data fields that do not follow the SIMPA naming convention are identified by their name
+            paths.add(str(data_field))
+    return paths
+
+
+def create_wavelength_settings(settings: Settings, wavelength) -> Settings:
+    """
+    Creates a shallow copy of the given settings in which Tags.WAVELENGTH is set to the given wavelength.
+    This allows pipeline elements to be run for several wavelengths at the same time.
+
+    :param settings: the global settings of the simulation.
+    :param wavelength: the wavelength of the copy.
+    :return: Settings
+    """
+    wavelength_settings = Settings.from_trusted(settings, verbose=settings.verbose)
+    wavelength_settings[Tags.WAVELENGTH] = wavelength
+    return wavelength_settings
+
+
+def create_wavelength_element(pipeline_element: PipelineElementBase,
+                              wavelength_settings: Settings) -> PipelineElementBase:
+    """
+    Creates a shallow copy of a pipeline element that uses the given wavelength-specific settings.
+
+    :param pipeline_element: the pipeline element to copy.
+    :param wavelength_settings: the settings created by create_wavelength_settings.
+    :return: PipelineElementBase
+    """
+    wavelength_element = copy.copy(pipeline_element)
+    wavelength_element.global_settings = wavelength_settings
+    return wavelength_element
+
+
+# numpy's global random state is shared between all threads, see run_with_random_state
+_random_state_lock = threading.RLock()
+
+
+def get_initial_random_state(settings: Settings) -> tuple:
+    """
+    Returns numpy's random state at the beginning of every wavelength of the sequential execution, i.e. after
+    seeding it with Tags.RANDOM_SEED.
+
+    :param settings: the (wavelength-specific) settings of the simulation.
+    :return: the random state in the format of numpy.random.get_state
+    """
+    random_seed = None
+    if Tags.RANDOM_SEED in settings:
+        random_seed = settings[Tags.RANDOM_SEED]
+    return np.random.RandomState(random_seed).get_state()
+
+
+def run_with_random_state(pipeline_element: PipelineElementBase, digital_device_twin: DigitalDeviceTwinBase,
+                          random_state: tuple) -> tuple:
+    """
+    Runs a pipeline element with numpy's global random state set to the given state. Pipeline elements that use
+    random numbers (see PipelineElementBase.uses_random_numbers) are run one at a time, such that concurrently
+    running elements cannot draw from the random state of each other. All other elements are run directly.
+
+    :param pipeline_element: the pipeline element to run.
+    :param digital_device_twin: the digital device twin that is passed to the pipeline element.
+    :param random_state: the random state of the sequential execution before the pipeline element.
+    :return: the random state of the sequential execution after the pipeline element.
+    """
+    if not pipeline_element.uses_random_numbers():
+        pipeline_element.run(digital_device_twin)
+        return random_state
+    with _random_state_lock:
+        np.random.set_state(random_state)
+        pipeline_element.run(digital_device_twin)
+        return np.random.get_state()
+
+
+class PipelineNode:
+    """
+    A single execution of a pipeline element within a PipelineGraph. Wavelength-dependent pipeline elements are
+    represented by one node per wavelength, multispectral processing algorithms by a single node.
+    """
+
+    def __init__(self, element_index: int, pipeline_element: PipelineElementBase, wavelength=None):
+        """
+        :param element_index: the index of the pipeline element in the simulation pipeline.
+        :param pipeline_element: the pipeline element that is run by this node. For wavelength-dependent nodes, this
+            is a copy of the original pipeline element that uses the settings of the respective wavelength.
+        :param wavelength: the wavelength of this node or None if the node is run once for all wavelengths.
+        """
+        self.element_index = element_index
+        self.pipeline_element = pipeline_element
+        self.wavelength = wavelength
+        self.uses_random_numbers = pipeline_element.uses_random_numbers()
+        # the random state of the sequential execution is passed from one node that uses random numbers to the next
+        self.initial_random_state = None
+        self.previous_random_node = None
+        self.random_state = None
+        self.inputs = resolve_data_field_paths(pipeline_element.get_input_data_fields(), wavelength)
+        self.outputs = resolve_data_field_paths(pipeline_element.get_output_data_fields(), wavelength)
+        self.is_barrier = self.inputs is None or self.outputs is None
+        self.dependencies = set()
+
+    def run(self, digital_device_twin: DigitalDeviceTwinBase):
+        random_state = self.initial_random_state
+        if self.previous_random_node is not None:
+            random_state = self.previous_random_node.random_state
+        self.random_state = run_with_random_state(self.pipeline_element, digital_device_twin, random_state)
+
+    def __repr__(self):
+        return f"{type(self.pipeline_element).__name__}({self.wavelength})"
+
+
+class PipelineGraph:
+    """
+    Schedules the elements of a simulation pipeline as a directed acyclic graph.
+
+    Every pipeline element declares the data fields it reads and writes (see PipelineElementBase). Based on this
+    information, a node depends on
+
+    - the last previous node that writes a data field it reads,
+    - all previous nodes that read a data field it writes since that field was last written,
+    - the last previous node that writes a data field it writes, and
+    - the node of the same pipeline element for the previous wavelength.
+
+    Nodes that do not declare their data fields act as barriers. Multispectral processing algorithms are run
+    after the wavelength-dependent nodes that create their input data. All remaining nodes, such as noise models
+    applied to different data fields or the reconstruction of one wavelength and the optical forward model of the
+    next wavelength, are run concurrently on a thread pool.
+
+    Each wavelength works on its own shallow copy of the global settings, such that Tags.WAVELENGTH can be set
+    independently. Values that pipeline elements write into the settings are merged back into the global settings
+    after all nodes have been run.
+
+    Pipeline elements that use numpy's global random state are run one at a time and in the order of the
+    sequential execution. Every such node continues the random state of the previous one of its wavelength, which
+    starts from Tags.RANDOM_SEED, so the results are independent of the number of workers.
+    """
+
+    def __init__(self, simulation_pipeline: List[PipelineElementBase], settings: Settings):
+        self.logger = Logger()
+        self.settings = settings
+        self.wavelength_settings = []
+        self.nodes = []
+        self.initial_random_state = get_initial_random_state(settings)
+        self.last_random_node = None
+
+        for wavelength in settings[Tags.WAVELENGTHS]:
+            wavelength_settings = create_wavelength_settings(settings, wavelength)
+            self.wavelength_settings.append(wavelength_settings)
+            # the sequential execution seeds the random state at the beginning of every wavelength
+            self.initial_random_state = get_initial_random_state(wavelength_settings)
+            self.last_random_node = None
+
+            for element_index, pipeline_element in enumerate(simulation_pipeline):
+                if isinstance(pipeline_element, MultispectralProcessingAlgorithm):
+                    continue
+                wavelength_element = create_wavelength_element(pipeline_element, wavelength_settings)
+                self._add_node(PipelineNode(element_index, wavelength_element, wavelength))
+
+        for element_index, pipeline_element in enumerate(simulation_pipeline):
+            if isinstance(pipeline_element, MultispectralProcessingAlgorithm):
+                self._add_node(PipelineNode(element_index, pipeline_element))
+
+        self._add_dependencies()
+
+    def _add_node(self, node: PipelineNode):
+        if node.uses_random_numbers:
+            node.initial_random_state = self.initial_random_state
+            node.previous_random_node = self.last_random_node
+            self.last_random_node = node
+        self.nodes.append(node)
+
+    def _add_dependencies(self):
+        last_writer = dict()
+        readers_since_last_write = dict()
+        last_barrier = None
+        nodes_since_last_barrier = []
+        last_node_of_element = dict()
+
+        for node in self.nodes:
+            dependencies = set()
+            if last_barrier is not None:
+                dependencies.add(last_barrier)
+            if node.is_barrier:
+                dependencies.update(nodes_since_last_barrier)
+            else:
+                for path in node.inputs:
+                    if path in last_writer:
+                        dependencies.add(last_writer[path])
+                for path in node.outputs:
+                    if path in last_writer:
+                        dependencies.add(last_writer[path])
+                    dependencies.update(readers_since_last_write.get(path, []))
+
+            if node.element_index in last_node_of_element:
+                dependencies.add(last_node_of_element[node.element_index])
+            if node.previous_random_node is not None:
+                dependencies.add(node.previous_random_node)
+            last_node_of_element[node.element_index] = node
+
+            dependencies.discard(node)
+            node.dependencies = dependencies
+
+            if node.is_barrier:
+                last_barrier = node
+                nodes_since_last_barrier = []
+                last_writer = dict()
+                readers_since_last_write = dict()
+            else:
+                nodes_since_last_barrier.append(node)
+                for path in node.inputs:
+                    readers_since_last_write.setdefault(path, []).append(node)
+                for path in node.outputs:
+                    last_writer[path] = node
+                    readers_since_last_write[path] = []
+
+    def run(self, digital_device_twin: DigitalDeviceTwinBase, max_workers: int = 2):
+        """
+        Runs all nodes of the graph such that every node is started only after all of its dependencies have
+        finished. The nodes are started in the order of the sequential execution whenever possible.
+
+        :param digital_device_twin: the digital device twin that is passed to every pipeline element.
+        :param max_workers: the maximum number of nodes that are run concurrently.
+        """
+        if max_workers < 1:
+            raise ValueError(f"The number of workers must be at least 1 but was {max_workers}.")
+
+        pending = list(self.nodes)
+        finished = set()
+        running = dict()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for node in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if node.dependencies <= finished:
+                        pending.remove(node)
+                        self.logger.debug(f"Running {type(node.pipeline_element)} for wavelength {node.wavelength}")
+                        running[executor.submit(node.run, digital_device_twin)] = node
+
+                if not running:
+                    raise RuntimeError(f"The pipeline graph contains unsatisfiable dependencies: {pending}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        for queued_future in running:
+                            queued_future.cancel()
+                        raise
+                    finished.add(node)
+
+        for wavelength_settings in self.wavelength_settings:
+            dict.update(self.settings, wavelength_settings)
+        # leaves numpy's random state as after the sequential execution
+        if self.last_random_node is not None:
+            np.random.set_state(self.last_random_node.random_state)
+        else:
+            np.random.set_state(self.initial_random_state)
@@ -0,0 +1,164 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import logging
+import queue
+import threading
+from typing import List
+
+import numpy as np
+
+from simpa.core.pipeline_element_base import PipelineElementBase
+from simpa.core.pipeline_graph import create_wavelength_settings, create_wavelength_element, \
+    get_initial_random_state, run_with_random_state
+from simpa.core.device_digital_twins import DigitalDeviceTwinBase
+from simpa.utils import Tags, Settings
+from simpa.log import Logger
+
+
+class _OrderedLogBuffer(logging.Filter):
+    """
+    Holds back all log records that are created by a pipeline stage, such that they can be emitted in the
+    order of the sequential execution afterwards.
+    """
+
+    def __init__(self):
+        super(_OrderedLogBuffer, self).__init__()
+        self._current_item = threading.local()
+        self._records = dict()
+        self._lock = threading.Lock()
+
+    def set_current_item(self, item):
+        self._current_item.value = item
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        item = getattr(self._current_item, "value", None)
+        if item is None:
+            return True
+        with self._lock:
+            self._records.setdefault(item, []).append(record)
+        return False
+
+    def pop_records(self, item) -> list:
+        with self._lock:
+            return self._records.pop(item, [])
+
+
+class StagedPipeline:
+    """
+    Runs the wavelength-dependent elements of a simulation pipeline as stages of an assembly line.
+
+    Every pipeline element is run by its own worker thread, which processes the wavelengths one after another.
+    The stages are connected by bounded queues, so that the optical forward model of wavelength i+1 can be run
+    while the acoustic forward model and the reconstruction of wavelength i are still running, e.g. to overlap
+    GPU-bound and CPU-bound stages. At most Tags.PIPELINE_QUEUE_SIZE wavelengths wait between two stages.
+
+    As each stage processes the wavelengths in order and stages never work on the same wavelength concurrently,
+    the results are identical to the sequential execution. Every wavelength uses its own shallow copy of the
+    settings and its own random state, which starts from Tags.RANDOM_SEED and is passed from stage to stage.
+    Stages that use numpy's global random state (see PipelineElementBase.uses_random_numbers) are run one at a
+    time with the random state of their wavelength. Log records of the stages are held back and emitted in the
+    order of the sequential execution.
+    """
+
+    def __init__(self, simulation_pipeline: List[PipelineElementBase], settings: Settings, queue_size: int = 1):
+        """
+        :param simulation_pipeline: the wavelength-dependent pipeline elements.
+        :param settings: the global settings of the simulation.
+        :param queue_size: the maximum number of wavelengths that wait between two stages.
+        """
+        if queue_size < 1:
+            raise ValueError(f"The queue size must be at least 1 but was {queue_size}.")
+        self.logger = Logger()
+        self.settings = settings
+        self.simulation_pipeline = simulation_pipeline
+        self.queue_size = queue_size
+        self.wavelengths = list(settings[Tags.WAVELENGTHS])
+        self.wavelength_settings = [create_wavelength_settings(settings, wavelength)
+                                    for wavelength in self.wavelengths]
+        self.stage_elements = [[create_wavelength_element(pipeline_element, wavelength_settings)
+                                for wavelength_settings in self.wavelength_settings]
+                               for pipeline_element in simulation_pipeline]
+        self.random_states = [get_initial_random_state(wavelength_settings)
+                              for wavelength_settings in self.wavelength_settings]
+
+        self._log_buffer = _OrderedLogBuffer()
+        self._finished = {(wavelength_index, stage_index): threading.Event()
+                          for wavelength_index in range(len(self.wavelengths))
+                          for stage_index in range(len(simulation_pipeline))}
+        self._exceptions = dict()
+        self._abort = threading.Event()
+
+    def _run_stage(self, stage_index: int, input_queue: queue.Queue, output_queue: queue.Queue,
+                   digital_device_twin: DigitalDeviceTwinBase):
+        while True:
+            wavelength_index = input_queue.get()
+            if wavelength_index is None:
+                output_queue.put(None)
+                return
+
+            if not self._abort.is_set():
+                pipeline_element = self.stage_elements[stage_index][wavelength_index]
+                self._log_buffer.set_current_item((wavelength_index, stage_index))
+                try:
+                    self.random_states[wavelength_index] = run_with_random_state(
+                        pipeline_element, digital_device_twin, self.random_states[wavelength_index])
+                except Exception as e:
+                    self._exceptions[(wavelength_index, stage_index)] = e
+                    self._abort.set()
+                finally:
+                    self._log_buffer.set_current_item(None)
+
+            self._finished[(wavelength_index, stage_index)].set()
+            output_queue.put(wavelength_index)
+
+    def run(self, digital_device_twin: DigitalDeviceTwinBase):
+        """
+        Runs all stages for all wavelengths and emits the log records of the stages in sequential order.
+
+        :param digital_device_twin: the digital device twin that is passed to every pipeline element.
+        """
+        if len(self.simulation_pipeline) == 0:
+            return
+
+        wavelength_queue = queue.Queue()
+        for wavelength_index in range(len(self.wavelengths)):
+            wavelength_queue.put(wavelength_index)
+        wavelength_queue.put(None)
+
+        queues = [wavelength_queue] + [queue.Queue(maxsize=self.queue_size)
+                                       for _ in range(len(self.simulation_pipeline) - 1)] + [queue.Queue()]
+        workers = [threading.Thread(target=self._run_stage,
+                                    args=(stage_index, queues[stage_index], queues[stage_index + 1],
+                                          digital_device_twin),
+                                    name=f"SIMPA pipeline stage {stage_index}")
+                   for stage_index in range(len(self.simulation_pipeline))]
+
+        self.logger.add_filter(self._log_buffer)
+        try:
+            for worker in workers:
+                worker.start()
+
+            for wavelength_index, wavelength in enumerate(self.wavelengths):
+                self.logger.debug(f"Running pipeline for wavelength {wavelength}nm...")
+                for stage_index, pipeline_element in enumerate(self.simulation_pipeline):
+                    self._finished[(wavelength_index, stage_index)].wait()
+                    self.logger.debug(f"Running {type(pipeline_element)}")
+                    for record in self._log_buffer.pop_records((wavelength_index, stage_index)):
+                        self.logger.handle(record)
+                    if (wavelength_index, stage_index) in self._exceptions:
+                        raise self._exceptions[(wavelength_index, stage_index)]
+                self.logger.debug(f"Running pipeline for wavelength {wavelength}nm... [Done]")
+        finally:
+            # makes the workers skip all remaining wavelengths in case the main thread was interrupted
+            self._abort.set()
+            for worker in workers:
+                worker.join()
+            self.logger.remove_filter(self._log_buffer)
+
+        for wavelength_settings in self.wavelength_settings:
+            dict.update(self.settings, wavelength_settings)
+        # leaves numpy's random state as after the sequential execution
+        if self.random_states:
+            np.random.set_state(self.random_states[-1])
@@ -5,12 +5,58 @@
 from simpa.core.simulation_modules.reconstruction_module.reconstruction_utils import compute_image_dimensions
 from simpa.utils import Tags, Settings, round_x5_away_from_zero
 from simpa.utils.constants import property_tags, wavelength_independent_properties, toolkit_tags
-from simpa.io_handling import load_data_field, save_data_field
+from simpa.io_handling import load_data_field, save_data_field, open_data_field, HDF5FileSession
 from simpa.core.processing_components import ProcessingComponentBase
 from simpa.core.device_digital_twins import DigitalDeviceTwinBase, PhotoacousticDevice
+from simpa.log import Logger
 import numpy as np
 
 
+def get_field_of_view_voxels(device: DigitalDeviceTwinBase, spacing_mm: float, logger: Logger = None) -> list:
+    """
+    Computes the field of view of a device in voxels.
+
+    :param device: the digital device twin.
+    :param spacing_mm: the spacing of the simulation volume in mm.
+    :param logger: logger for debugging purposes.
+    :returns: the field of view as list of the start and end voxels of the first, second and third axis of the
+        volume.
+    """
+    logger = Logger() if logger is None else logger
+    if isinstance(device, PhotoacousticDevice):
+        field_of_view_mm = device.detection_geometry.get_field_of_view_mm()
+    else:
+        field_of_view_mm = device.get_field_of_view_mm()
+    logger.debug(f"FOV (mm): {field_of_view_mm}")
+    _, _, _, xdim_start, xdim_end,  ydim_start, ydim_end, zdim_start, zdim_end = compute_image_dimensions(
+        field_of_view_mm, spacing_mm, logger)
+    field_of_view_voxels = [xdim_start, xdim_end, zdim_start, zdim_end, ydim_start, ydim_end]  # change ordering
+    field_of_view_voxels = [int(dim) for dim in field_of_view_voxels]  # cast to int
+    logger.debug(f"FOV (voxels): {field_of_view_voxels}")
+    return field_of_view_voxels
+
+
+def get_field_of_view_region(field_of_view_voxels: list, ndim: int = 3) -> tuple:
+    """
+    Returns the index expression that crops a data field to the field of view. Two-dimensional data fields are
+    assumed to lie in the plane of the first and the third axis of the volume.
+
+    :param field_of_view_voxels: the field of view as returned by get_field_of_view_voxels.
+    :param ndim: the number of dimensions of the data field, i.e. 2 or 3.
+    :returns: tuple of slices
+    """
+    # In case it should be cropped from A to A, then crop from A to A+1
+    x_offset_correct = 1 if (field_of_view_voxels[1] - field_of_view_voxels[0]) < 1 else 0
+    y_offset_correct = 1 if (field_of_view_voxels[3] - field_of_view_voxels[2]) < 1 else 0
+    z_offset_correct = 1 if (field_of_view_voxels[5] - field_of_view_voxels[4]) < 1 else 0
+    x_region = slice(field_of_view_voxels[0], field_of_view_voxels[1] + x_offset_correct)
+    y_region = slice(field_of_view_voxels[2], field_of_view_voxels[3] + y_offset_correct)
+    z_region = slice(field_of_view_voxels[4], field_of_view_voxels[5] + z_offset_correct)
+    if ndim == 2:
+        return x_region, z_region
+    return x_region, y_region, z_region
+
+
 class FieldOfViewCropping(ProcessingComponentBase):
 
     def __init__(self, global_settings, settings_key=None):
@@ -20,7 +66,8 @@ class FieldOfViewCropping(ProcessingComponentBase):
                 + [Tags.DATA_FIELD_FLUENCE, Tags.DATA_FIELD_INITIAL_PRESSURE]})
         super(FieldOfViewCropping, self).__init__(global_settings, "FieldOfViewCropping")
     """
-    Crops all specified data fields to the field of view of the given device.
+    Crops all specified data fields to the field of view of the given device. Only the field of view region of every
+    data field is read from the file, and the cropped data field replaces the complete one.
     """
 
     def run(self, device: DigitalDeviceTwinBase):
@@ -38,70 +85,58 @@ class FieldOfViewCropping(ProcessingComponentBase):
 
         data_fields = self.component_settings[Tags.DATA_FIELD]
 
-        if isinstance(device, PhotoacousticDevice):
-            field_of_view_mm = device.detection_geometry.get_field_of_view_mm()
-        else:
-            field_of_view_mm = device.get_field_of_view_mm()
-        self.logger.debug(f"FOV (mm): {field_of_view_mm}")
-        _, _, _, xdim_start, xdim_end,  ydim_start, ydim_end, zdim_start, zdim_end = compute_image_dimensions(
-            field_of_view_mm, self.global_settings[Tags.SPACING_MM], self.logger)
-        field_of_view_voxels = [xdim_start, xdim_end, zdim_start, zdim_end, ydim_start, ydim_end]  # change ordering
-        field_of_view_voxels = [int(dim) for dim in field_of_view_voxels]  # cast to int
-        self.logger.debug(f"FOV (voxels): {field_of_view_voxels}")
-
-        # In case it should be cropped from A to A, then crop from A to A+1
-        x_offset_correct = 1 if (field_of_view_voxels[1] - field_of_view_voxels[0]) < 1 else 0
-        y_offset_correct = 1 if (field_of_view_voxels[3] - field_of_view_voxels[2]) < 1 else 0
-        z_offset_correct = 1 if (field_of_view_voxels[5] - field_of_view_voxels[4]) < 1 else 0
-
+        field_of_view_voxels = get_field_of_view_voxels(device, self.global_settings[Tags.SPACING_MM], self.logger)
         self.logger.debug(f"field of view to crop: {field_of_view_voxels}")
 
         wavelength = self.global_settings[Tags.WAVELENGTH]
-
-        for data_field in data_fields:
-            # Crop wavelength-independent properties only in the last wavelength run
-            if (data_field in wavelength_independent_properties
-                    and wavelength != self.global_settings[Tags.WAVELENGTHS][-1]):
-                continue
-            try:
-                self.logger.debug(f"Cropping data field {data_field}...")
-                data_array = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
-
-                self.logger.debug(f"data array shape before cropping: {np.shape(data_array)}")
-                self.logger.debug(f"data array shape len: {len(np.shape(data_array))}")
-            except KeyError:
-                continue
-
-            # input validation
-            if not isinstance(data_array, np.ndarray):
-                self.logger.warning(f"The data field {data_field} was not of type np.ndarray. Skipping...")
-                continue
-            data_field_shape = np.shape(data_array)
-            if len(data_field_shape) == 3:
-                if ((np.array([field_of_view_voxels[1] - field_of_view_voxels[0],
-                              field_of_view_voxels[3] - field_of_view_voxels[2],
-                              field_of_view_voxels[5] - field_of_view_voxels[4]]) - data_field_shape) == 0).all():
-                    self.logger.warning(f"The data field {data_field} is already cropped. Skipping...")
+        file_path = self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+
+        # the file is opened once for all data fields
+        with HDF5FileSession(file_path):
+            for data_field in data_fields:
+                # Crop wavelength-independent properties only in the last wavelength run
+                if (data_field in wavelength_independent_properties
+                        and wavelength != self.global_settings[Tags.WAVELENGTHS][-1]):
                     continue
-
-                # crop
-                data_array = np.squeeze(data_array[field_of_view_voxels[0]:field_of_view_voxels[1] + x_offset_correct,
-                                        field_of_view_voxels[2]:field_of_view_voxels[3] + y_offset_correct,
-                                        field_of_view_voxels[4]:field_of_view_voxels[5] + z_offset_correct])
-
-            elif len(data_field_shape) == 2:
-                # Assumption that the data field is already in 2D shape in the y-plane
-                if (np.array([field_of_view_voxels[1] - field_of_view_voxels[0],
-                              field_of_view_voxels[5] - field_of_view_voxels[4]]) - data_field_shape == 0).all():
-                    self.logger.warning(f"The data field {data_field} is already cropped. Skipping...")
+                try:
+                    # only the shape is read, the data is loaded after it is known which region to crop
+                    with open_data_field(file_path, data_field, wavelength) as data_array:
+                        data_field_shape = tuple(data_array.shape) if hasattr(data_array, "shape") else None
+                except KeyError:
                     continue
 
-                # crop
-                data_array = np.squeeze(data_array[field_of_view_voxels[0]:field_of_view_voxels[1] + x_offset_correct,
-                                        field_of_view_voxels[4]:field_of_view_voxels[5] + z_offset_correct])
+                # input validation
+                if data_field_shape is None:
+                    self.logger.warning(f"The data field {data_field} is not an array. Skipping...")
+                    continue
+                self.logger.debug(f"Cropping data field {data_field}...")
+                self.logger.debug(f"data array shape before cropping: {data_field_shape}")
+
+                if len(data_field_shape) == 3:
+                    if ((np.array([field_of_view_voxels[1] - field_of_view_voxels[0],
+                                  field_of_view_voxels[3] - field_of_view_voxels[2],
+                                  field_of_view_voxels[5] - field_of_view_voxels[4]]) - data_field_shape) == 0).all():
+                        self.logger.warning(f"The data field {data_field} is already cropped. Skipping...")
+                        continue
+                    region = get_field_of_view_region(field_of_view_voxels, 3)
+
+                elif len(data_field_shape) == 2:
+                    # Assumption that the data field is already in 2D shape in the y-plane
+                    if (np.array([field_of_view_voxels[1] - field_of_view_voxels[0],
+                                  field_of_view_voxels[5] - field_of_view_voxels[4]]) - data_field_shape == 0).all():
+                        self.logger.warning(f"The data field {data_field} is already cropped. Skipping...")
+                        continue
+                    region = get_field_of_view_region(field_of_view_voxels, 2)
+
+                else:
+                    self.logger.warning(f"The data field {data_field} has {len(data_field_shape)} dimensions "
+                                        f"and is not cropped. Skipping...")
+                    continue
 
-            self.logger.debug(f"data array shape after cropping: {np.shape(data_array)}")
-            # save
-            save_data_field(data_array, self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
+                # crop while reading, such that the voxels outside of the field of view are never loaded
+                data_array = np.squeeze(load_data_field(file_path, data_field, wavelength, region=region))
+                self.logger.debug(f"data array shape after cropping: {np.shape(data_array)}")
+                # save
+                save_data_field(data_array, file_path, data_field, wavelength)
 
         self.logger.info("Cropping field of view...[Done]")
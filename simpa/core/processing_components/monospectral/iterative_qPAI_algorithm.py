@@ -3,16 +3,20 @@
 # SPDX-License-Identifier: MIT
 
 import numpy as np
+import torch
 from scipy.ndimage import zoom
 from skimage.restoration import estimate_sigma
 import time
-from typing import Tuple
+from typing import Optional, Tuple, Union
 from simpa.utils import Tags
+from simpa.utils.data_precision import get_data_precision
 from simpa.utils.libraries.literature_values import OpticalTissueProperties, StandardProperties
 from simpa.utils.libraries.molecule_library import MolecularComposition
 from simpa.utils.calculate import calculate_gruneisen_parameter_from_temperature
 from simpa.core.simulation_modules.optical_module.mcx_adapter import \
     MCXAdapter
+from simpa.core.simulation_modules.optical_module.fluence_solver import FluenceSolverBase, \
+    OpticalAdapterFluenceSolver
 from simpa.utils import Settings
 from simpa.io_handling import save_data_field, load_data_field
 from simpa.utils import TISSUE_LIBRARY
@@ -37,17 +41,26 @@ class IterativeqPAI(ProcessingComponentBase):
     Tags.ITERATIVE_RECONSTRUCTION_REGULARIZATION_SIGMA (default: 0.01)
     Tags.ITERATIVE_RECONSTRUCTION_SAVE_INTERMEDIATE_RESULTS (default: False)
     Tags.ITERATIVE_RECONSTRUCTION_STOPPING_LEVEL (default: 0.03)
+    Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION (default: 1)
+    Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR (default: 2)
     global_settings (required)
     component_settings_key (required)
+    fluence_solver (default: solver of the optical adapter given by Tags.OPTICAL_MODEL)
+
+    The fluence solver is created once per reconstruction and keeps the medium and the optical adapter in memory
+    between the iterations. If Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION is smaller than 1, the first
+    iterations simulate the fluence with fewer photons, and the number of photons grows until the full
+    Tags.OPTICAL_MODEL_NUMBER_PHOTONS is reached.
 
     [1] B. T. Cox et al. 2006, "Two-dimensional quantitative photoacoustic image reconstruction of absorption
     distributions in scattering media by use of a simple iterative method", https://doi.org/10.1364/ao.45.001866
     """
 
-    def __init__(self, global_settings, component_settings_key: str):
+    def __init__(self, global_settings, component_settings_key: str, fluence_solver: FluenceSolverBase = None):
         super(ProcessingComponentBase, self).__init__(global_settings=global_settings)
 
         self.global_settings = global_settings
+        self.fluence_solver = fluence_solver
         self.optical_settings = global_settings.get_optical_settings()
         self.iterative_method_settings = Settings(global_settings[component_settings_key])
 
@@ -58,6 +71,14 @@ class IterativeqPAI(ProcessingComponentBase):
         else:
             self.downscale_factor = 0.73
 
+    def get_input_data_fields(self) -> list:
+        # The reconstruction temporarily changes Tags.SPACING_MM in the global settings and can
+        # therefore not safely run concurrently with other pipeline elements.
+        return None
+
+    def get_output_data_fields(self) -> list:
+        return None
+
     def run(self, pa_device):
         self.logger.info("Reconstructing absorption using iterative qPAI method...")
 
@@ -163,9 +184,17 @@ class IterativeqPAI(ProcessingComponentBase):
         # regularization parameter sigma
         sigma = self.regularization_sigma(target_intial_pressure, stacked_to_volume)
 
+        # the iteration state is kept on the processing device, only the fluence solver works on host arrays
+        dtype = torch.float64 if get_data_precision(self.global_settings, default_dtype=np.float64) == np.float64 \
+            else torch.float32
+        target_intial_pressure = torch.as_tensor(target_intial_pressure, dtype=dtype, device=self.torch_device)
+        if isinstance(sigma, np.ndarray):
+            sigma = torch.as_tensor(sigma, dtype=dtype, device=self.torch_device)
+
         # initialization
-        absorption = 1e-16 * np.ones(np.shape(target_intial_pressure))
-        y_pos = int(np.shape(absorption)[1] / 2)  # to extract middle slice
+        absorption = torch.full(target_intial_pressure.shape, 1e-16, dtype=dtype, device=self.torch_device)
+        fluence_on_device = torch.empty_like(absorption)
+        y_pos = int(absorption.shape[1] / 2)  # to extract middle slice
         list_of_intermediate_absorptions = []  # if intentional all intermediate iteration updates can be returned
         error_list = []
 
@@ -175,32 +204,51 @@ class IterativeqPAI(ProcessingComponentBase):
                 raise AssertionError("Tags.MAX_NUMBER_ITERATIVE_RECONSTRUCTION tag is invalid (equals zero).")
             nmax = int(self.iterative_method_settings[Tags.ITERATIVE_RECONSTRUCTION_MAX_ITERATION_NUMBER])
 
+        # the solver is created after the resampling, such that it simulates with the resampled spacing
+        fluence_solver = self.fluence_solver if self.fluence_solver is not None else self.create_fluence_solver()
+        fluence_solver.set_medium(scattering, anisotropy, pa_device)
+
         # run algorithm
         start_time = time.time()
 
+        fluence = None
+        first_full_photon_iteration = None
         i = 0
-        while i < nmax:
-            print("Iteration: ", i)
-            # core method
-            fluence = self.forward_model_fluence(absorption, scattering, anisotropy, pa_device)
-            error_list.append(self.log_sum_squared_error(target_intial_pressure, absorption, fluence, sigma))
-            absorption = self.update_absorption_estimate(target_intial_pressure, fluence, sigma)
-
-            est_p0 = absorption * fluence
-
-            # only store middle slice (2-d image instead of 3-d volume) in iteration list for better performance
-            list_of_intermediate_absorptions.append(absorption[:, y_pos, :])
-
-            # check if current error did not change significantly in comparison to preceding error
-            if self.convergence_stopping_criterion(error_list, iteration=i):
-                if Tags.ITERATIVE_RECONSTRUCTION_SAVE_LAST_FLUENCE:
-                    dst = self.global_settings[Tags.SIMULATION_PATH] + "/last_fluence" + "_"
-                    np.save(dst + self.global_settings[Tags.VOLUME_NAME] + ".npy", fluence)
-                break
-            i += 1
+        try:
+            while i < nmax:
+                print("Iteration: ", i)
+                # core method
+                number_of_photons = self.number_of_photons_for_iteration(i, nmax)
+                if first_full_photon_iteration is None and not self.is_reduced_photon_iteration(number_of_photons):
+                    first_full_photon_iteration = i
+                fluence = fluence_solver.solve(absorption.cpu().numpy(), number_of_photons=number_of_photons,
+                                               initial_fluence=fluence)
+                fluence_on_device.copy_(torch.from_numpy(np.asarray(fluence)))
+                error_list.append(self.log_sum_squared_error(target_intial_pressure, absorption, fluence_on_device,
+                                                             sigma))
+                self.update_absorption_estimate(target_intial_pressure, fluence_on_device, sigma, out=absorption)
+
+                # only store middle slice (2-d image instead of 3-d volume) in iteration list for better performance
+                list_of_intermediate_absorptions.append(absorption[:, y_pos, :].clone())
+
+                # check if current error did not change significantly in comparison to preceding error
+                # errors of fluences with fewer photons are too noisy to decide on convergence
+                if (first_full_photon_iteration is not None and i > first_full_photon_iteration and
+                        self.convergence_stopping_criterion(error_list, iteration=i)):
+                    if Tags.ITERATIVE_RECONSTRUCTION_SAVE_LAST_FLUENCE:
+                        dst = self.global_settings[Tags.SIMULATION_PATH] + "/last_fluence" + "_"
+                        np.save(dst + self.global_settings[Tags.VOLUME_NAME] + ".npy", fluence)
+                    break
+                i += 1
+        finally:
+            fluence_solver.close()
 
         print("--- %s seconds/iteration ---" % round((time.time() - start_time) / (i + 1), 2))
 
+        absorption = absorption.cpu().numpy()
+        list_of_intermediate_absorptions = [intermediate_absorption.cpu().numpy()
+                                            for intermediate_absorption in list_of_intermediate_absorptions]
+
         # extracting field of view if input initial pressure was passed as a 2-d array
         if stacked_to_volume:
             absorption = absorption[:, y_pos, :]
@@ -385,17 +433,11 @@ class IterativeqPAI(ProcessingComponentBase):
 
         return optical_properties
 
-    def forward_model_fluence(self, absorption: np.ndarray,
-                              scattering: np.ndarray, anisotropy: np.ndarray,
-                              pa_device) -> np.ndarray:
+    def create_fluence_solver(self) -> FluenceSolverBase:
         """
-        Simulates photon propagation in 3-d volume and returns simulated fluence map in units of J/cm^2.
+        Creates the fluence solver of the optical model given by Tags.OPTICAL_MODEL.
 
-        :param absorption: Volume of absorption coefficients in 1/cm for Monte Carlo Simulation.
-        :param scattering: Volume of scattering coefficients in 1/cm for Monte Carlo Simulation.
-        :param anisotropy: Volume of anisotropy data for Monte Carlo Simulation.
-        :param pa_device: The simulation device.
-        :return: Fluence map.
+        :return: Fluence solver.
         :raises: AssertionError: if Tags.OPTICAL_MODEL tag was not or incorrectly defined in settings.
         """
 
@@ -403,69 +445,125 @@ class IterativeqPAI(ProcessingComponentBase):
             raise AssertionError("Tags.OPTICAL_MODEL tag was not specified in the settings.")
         model = self.optical_settings[Tags.OPTICAL_MODEL]
 
-        self.global_settings.get_optical_settings()[Tags.MCX_ASSUMED_ANISOTROPY] = np.mean(anisotropy)
-
         if model == Tags.OPTICAL_MODEL_MCX:
-            forward_model_implementation = MCXAdapter(self.global_settings)
+            return OpticalAdapterFluenceSolver(MCXAdapter(self.global_settings))
         else:
             raise AssertionError("Tags.OPTICAL_MODEL tag must be Tags.OPTICAL_MODEL_MCX.")
 
-        _device = pa_device.get_illumination_geometry()
-
-        if isinstance(_device, list):
-            # per convention this list has at least two elements
-            results = forward_model_implementation.forward_model(absorption_cm=absorption,
-                                                                 scattering_cm=scattering,
-                                                                 anisotropy=anisotropy,
-                                                                 illumination_geometry=_device[0])
-            fluence = results[Tags.DATA_FIELD_FLUENCE]
-            for idx in range(1, len(_device)):
-                # we already looked at the 0th element, so go from 1 to n-1
-                results = forward_model_implementation.forward_model(absorption_cm=absorption,
-                                                                     scattering_cm=scattering,
-                                                                     anisotropy=anisotropy,
-                                                                     illumination_geometry=_device[idx + 1])
-                fluence += results[Tags.DATA_FIELD_FLUENCE]
-
-            fluence = fluence / len(_device)
+    def number_of_photons_for_iteration(self, iteration: int, max_iterations: int) -> Optional[int]:
+        """
+        Number of photons for the fluence simulation of an iteration. The first iteration uses
+        Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION of Tags.OPTICAL_MODEL_NUMBER_PHOTONS, and the number
+        grows by Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR per iteration. The last iteration always uses the
+        full number of photons.
 
-        else:
-            results = forward_model_implementation.forward_model(absorption_cm=absorption,
-                                                                 scattering_cm=scattering,
-                                                                 anisotropy=anisotropy,
-                                                                 illumination_geometry=_device)
-            fluence = results[Tags.DATA_FIELD_FLUENCE]
+        :param iteration: Iteration number.
+        :param max_iterations: Maximum number of iterations.
+        :return: Number of photons or None if the number of photons of the optical settings should be used.
+        :raises: AssertionError: if the initial photon fraction is not in (0, 1] or the growth factor is not
+                 greater than one
+        """
+        if Tags.OPTICAL_MODEL_NUMBER_PHOTONS not in self.optical_settings:
+            return None
+        full_number_of_photons = self.optical_settings[Tags.OPTICAL_MODEL_NUMBER_PHOTONS]
+
+        initial_fraction = 1
+        if Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION in self.iterative_method_settings:
+            initial_fraction = self.iterative_method_settings[Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION]
+            if not 0 < initial_fraction <= 1:
+                raise AssertionError("Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION must be in (0, 1].")
+        growth_factor = 2
+        if Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR in self.iterative_method_settings:
+            growth_factor = self.iterative_method_settings[Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR]
+            if growth_factor <= 1:
+                raise AssertionError("Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR must be greater than one.")
+
+        if iteration >= max_iterations - 1:
+            return int(full_number_of_photons)
+        fraction = min(initial_fraction * growth_factor ** iteration, 1)
+        return max(int(full_number_of_photons * fraction), 1)
+
+    def is_reduced_photon_iteration(self, number_of_photons: Optional[int]) -> bool:
+        """
+        :param number_of_photons: Number of photons of an iteration, see number_of_photons_for_iteration.
+        :return: if the fluence of the iteration is simulated with fewer photons than Tags.OPTICAL_MODEL_NUMBER_PHOTONS.
+        """
+        if number_of_photons is None:
+            return False
+        return number_of_photons < int(self.optical_settings[Tags.OPTICAL_MODEL_NUMBER_PHOTONS])
+
+    def forward_model_fluence(self, absorption: np.ndarray,
+                              scattering: np.ndarray, anisotropy: np.ndarray,
+                              pa_device) -> np.ndarray:
+        """
+        Simulates photon propagation in 3-d volume and returns simulated fluence map in units of J/cm^2.
+        The iterative reconstruction keeps one fluence solver for all iterations instead, this method solves once.
+
+        :param absorption: Volume of absorption coefficients in 1/cm for Monte Carlo Simulation.
+        :param scattering: Volume of scattering coefficients in 1/cm for Monte Carlo Simulation.
+        :param anisotropy: Volume of anisotropy data for Monte Carlo Simulation.
+        :param pa_device: The simulation device.
+        :return: Fluence map.
+        :raises: AssertionError: if Tags.OPTICAL_MODEL tag was not or incorrectly defined in settings.
+        """
+
+        fluence_solver = self.fluence_solver if self.fluence_solver is not None else self.create_fluence_solver()
+        fluence_solver.set_medium(scattering, anisotropy, pa_device)
+        try:
+            fluence = fluence_solver.solve(absorption)
+        finally:
+            fluence_solver.close()
 
         print("Simulating the optical forward process...[Done]")
 
         return fluence
 
-    def update_absorption_estimate(self, image_data: np.ndarray, fluence: np.ndarray,
-                                   sigma: [np.ndarray, int, float]) -> np.ndarray:
+    def pressure_scaling_factor(self) -> float:
         """
-        Reconstructs map of absorption coefficients in 1/cm given measured data and simulated fluence.
+        Factor between the product of absorption and fluence and the initial pressure, i.e. the Grüneisen parameter
+        times the laser pulse energy if Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE is given and one otherwise.
 
-        :param image_data: Measured image data (initial pressure) used for reconstruction.
-        :param fluence: Simulated fluence map in J/cm^2.
-        :param sigma: Regularization factor to avoid instability if the fluence is low.
-        :return: Reconstructed absorption.
+        :return: Pressure scaling factor.
         """
 
         if Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE in self.optical_settings:
             if Tags.DATA_FIELD_GRUNEISEN_PARAMETER in self.global_settings:
-                gamma = self.global_settings[Tags.DATA_FIELD_GRUNEISEN_PARAMETER] * np.ones(np.shape(image_data))
+                gamma = float(self.global_settings[Tags.DATA_FIELD_GRUNEISEN_PARAMETER])
             else:
                 gamma = calculate_gruneisen_parameter_from_temperature(StandardProperties.BODY_TEMPERATURE_CELCIUS)
-                gamma = gamma * np.ones(np.shape(image_data))
             factor = (self.optical_settings[Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE] / 1000) * 1e6
-            absorption = np.array(image_data / ((fluence + sigma) * gamma * factor))
-        else:
-            absorption = image_data / (fluence + sigma)
+            return gamma * factor
+        return 1
 
-        return absorption
+    def update_absorption_estimate(self, image_data: Union[np.ndarray, torch.Tensor],
+                                   fluence: Union[np.ndarray, torch.Tensor],
+                                   sigma: Union[np.ndarray, torch.Tensor, int, float],
+                                   out: torch.Tensor = None) -> Union[np.ndarray, torch.Tensor]:
+        """
+        Reconstructs map of absorption coefficients in 1/cm given measured data and simulated fluence.
+
+        :param image_data: Measured image data (initial pressure) used for reconstruction.
+        :param fluence: Simulated fluence map in J/cm^2.
+        :param sigma: Regularization factor to avoid instability if the fluence is low.
+        :param out: Tensor in which the absorption is computed in place, such that no temporary volumes are allocated.
+        :return: Reconstructed absorption.
+        """
 
-    def log_sum_squared_error(self, image_data: np.ndarray, absorption: np.ndarray, fluence: np.ndarray,
-                              sigma: [np.ndarray, int, float]) -> float:
+        scaling_factor = self.pressure_scaling_factor()
+        if out is None:
+            if scaling_factor == 1:
+                return image_data / (fluence + sigma)
+            return image_data / ((fluence + sigma) * scaling_factor)
+
+        torch.add(fluence, sigma, out=out)
+        if scaling_factor != 1:
+            out.mul_(scaling_factor)
+        return torch.div(image_data, out, out=out)
+
+    def log_sum_squared_error(self, image_data: Union[np.ndarray, torch.Tensor],
+                              absorption: Union[np.ndarray, torch.Tensor],
+                              fluence: Union[np.ndarray, torch.Tensor],
+                              sigma: Union[np.ndarray, torch.Tensor, int, float]) -> float:
         """
         Computes log (base 10) of the sum of squared error between image and reconstructed pressure map in middle slice.
 
@@ -476,19 +574,15 @@ class IterativeqPAI(ProcessingComponentBase):
         :return: sse error.
         """
 
-        if Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE in self.optical_settings:
-            if Tags.DATA_FIELD_GRUNEISEN_PARAMETER in self.global_settings:
-                gamma = self.global_settings[Tags.DATA_FIELD_GRUNEISEN_PARAMETER] * np.ones(np.shape(image_data))
-            else:
-                gamma = calculate_gruneisen_parameter_from_temperature(StandardProperties.BODY_TEMPERATURE_CELCIUS)
-                gamma = gamma * np.ones(np.shape(image_data))
-            factor = (self.optical_settings[Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE] / 1000) * 1e6
-            predicted_pressure = absorption * (fluence + sigma) * gamma * factor
-        else:
-            predicted_pressure = absorption * (fluence + sigma)
-
+        # only the middle slice is compared, so the predicted pressure is not computed for the whole volume
         y_pos = int(image_data.shape[1] / 2)
-        sse = np.sum(np.square(image_data[:, y_pos, :] - predicted_pressure[:, y_pos, :]))
+        if isinstance(sigma, (np.ndarray, torch.Tensor)):
+            sigma = sigma[:, y_pos, :]
+        predicted_pressure = absorption[:, y_pos, :] * (fluence[:, y_pos, :] + sigma)
+        scaling_factor = self.pressure_scaling_factor()
+        if scaling_factor != 1:
+            predicted_pressure = predicted_pressure * scaling_factor
+        sse = float(((image_data[:, y_pos, :] - predicted_pressure) ** 2).sum())
 
         return np.log10(sse)
 
@@ -2,8 +2,10 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
+from .noise_model_base import NoiseModelBase
 from .gaussian_noise import GaussianNoise
 from .gamma_noise import GammaNoise
 from .poisson_noise import PoissonNoise
 from .salt_and_pepper_noise import SaltAndPepperNoise
 from .uniform_noise import UniformNoise
+from .composite_noise import CompositeNoise
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from typing import List
+
+import numpy as np
+import torch
+
+from simpa.core.processing_components import ProcessingComponentBase
+from simpa.core.processing_components.monospectral.noise.noise_model_base import NoiseModelBase
+from simpa.io_handling import load_data_field, save_data_field
+from simpa.utils import Tags, Settings
+from simpa.utils.data_precision import cast_to_data_precision
+from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
+
+
+class CompositeNoise(ProcessingComponentBase):
+    """
+    Applies several noise models in a single pass. Every data field that the noise models are applied to is loaded
+    once, all noise models of the data field are applied in the given order on the processing device and the noisy
+    data field is saved once, instead of loading and saving it once per noise model::
+
+        pipeline = [..., CompositeNoise(settings, [GaussianNoise(settings, "time_series_gaussian_noise"),
+                                                   PoissonNoise(settings, "time_series_poisson_noise")]), ...]
+
+    The noise models use their own component settings, including Tags.DATA_FIELD. All noise is drawn from a single
+    torch random number generator, which is seeded with Tags.RANDOM_SEED of the component settings or the
+    global settings and the index of the current wavelength, such that the noise is reproducible.
+
+    Component Settings::
+
+       Tags.RANDOM_SEED (default: Tags.RANDOM_SEED of the global settings)
+    """
+
+    def __init__(self, global_settings, noise_models: List[NoiseModelBase], settings_key=None):
+        """
+        :param global_settings: The SIMPA settings dictionary
+        :param noise_models: the noise models in the order in which they are applied.
+        :param settings_key: The key where the component settings are stored in. If None, empty component settings
+            are used.
+        """
+        if settings_key is None:
+            # the empty component settings are not stored in the global settings, such that they neither overwrite
+            # settings of the user nor are shared between several instances
+            super(ProcessingComponentBase, self).__init__(global_settings=global_settings)
+            self.component_settings = Settings()
+        else:
+            super(CompositeNoise, self).__init__(global_settings, settings_key)
+        for noise_model in noise_models:
+            if not isinstance(noise_model, NoiseModelBase):
+                msg = f"The CompositeNoise can only apply noise models, but got {type(noise_model)}."
+                self.logger.critical(msg)
+                raise TypeError(msg)
+        self.noise_models = list(noise_models)
+
+    def get_input_data_fields(self) -> list:
+        data_fields = []
+        for noise_model in self.noise_models:
+            if noise_model.get_data_field() not in data_fields:
+                data_fields.append(noise_model.get_data_field())
+        return data_fields
+
+    def create_generator(self) -> torch.Generator:
+        """
+        :return: the random number generator for the current wavelength.
+        """
+        generator = torch.Generator(device=self.torch_device)
+        if Tags.RANDOM_SEED in self.component_settings:
+            seed = self.component_settings[Tags.RANDOM_SEED]
+        elif Tags.RANDOM_SEED in self.global_settings:
+            seed = self.global_settings[Tags.RANDOM_SEED]
+        else:
+            generator.seed()
+            return generator
+        wavelength_index = 0
+        if Tags.WAVELENGTHS in self.global_settings and \
+                self.global_settings[Tags.WAVELENGTH] in list(self.global_settings[Tags.WAVELENGTHS]):
+            wavelength_index = list(self.global_settings[Tags.WAVELENGTHS]).index(self.global_settings[Tags.WAVELENGTH])
+        generator.manual_seed(int(seed) + wavelength_index)
+        return generator
+
+    def run(self, device):
+        self.logger.info("Applying Composite Noise Model...")
+
+        generator = self.create_generator()
+        wavelength = self.global_settings[Tags.WAVELENGTH]
+        for data_field in self.get_input_data_fields():
+            data_array = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
+            data_tensor = torch.as_tensor(data_array, dtype=torch.float32, device=self.torch_device)
+
+            for noise_model in self.noise_models:
+                if noise_model.get_data_field() == data_field:
+                    self.logger.debug(f"Applying {noise_model.noise_model_name} to {data_field}")
+                    data_tensor = noise_model.apply_noise(data_tensor, generator)
+
+            if not (Tags.IGNORE_QA_ASSERTIONS in self.global_settings and Tags.IGNORE_QA_ASSERTIONS):
+                assert_array_well_defined(data_tensor)
+
+            save_data_field(cast_to_data_precision(data_tensor, self.global_settings, np.float64),
+                            self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
+
+        self.logger.info("Applying Composite Noise Model...[Done]")
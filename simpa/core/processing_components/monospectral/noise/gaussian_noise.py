@@ -4,14 +4,11 @@
 
 from simpa.utils import Tags
 from simpa.utils import EPS
-from simpa.io_handling import load_data_field, save_data_field
-from simpa.core.processing_components import ProcessingComponentBase
-from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
-import numpy as np
+from simpa.core.processing_components.monospectral.noise.noise_model_base import NoiseModelBase, apply_noise_mode
 import torch
 
 
-class GaussianNoise(ProcessingComponentBase):
+class GaussianNoise(NoiseModelBase):
     """
     Applies Gaussian noise to the defined data field.
     The noise will be applied to all wavelengths.
@@ -24,20 +21,14 @@ class GaussianNoise(ProcessingComponentBase):
        Tags.DATA_FIELD (required)
     """
 
-    def run(self, device):
-        self.logger.info("Applying Gaussian Noise Model...")
+    noise_model_name = "Gaussian Noise Model"
+
+    def apply_noise(self, data_tensor, generator=None):
         mean = 0
         std = 1
         mode = Tags.NOISE_MODE_ADDITIVE
         non_negative = False
 
-        if Tags.DATA_FIELD not in self.component_settings.keys():
-            msg = f"The field {Tags.DATA_FIELD} must be set in order to use the gaussian_noise field."
-            self.logger.critical(msg)
-            raise KeyError(msg)
-
-        data_field = self.component_settings[Tags.DATA_FIELD]
-
         if Tags.NOISE_MEAN in self.component_settings.keys():
             mean = self.component_settings[Tags.NOISE_MEAN]
 
@@ -55,23 +46,15 @@ class GaussianNoise(ProcessingComponentBase):
         self.logger.debug(f"Noise model std: {std}")
         self.logger.debug(f"Noise model non-negative: {non_negative}")
 
-        wavelength = self.global_settings[Tags.WAVELENGTH]
-        data_array = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
-        data_tensor = torch.as_tensor(data_array, dtype=torch.float32, device=self.torch_device)
-        dist = torch.distributions.normal.Normal(torch.tensor(mean, dtype=torch.float32, device=self.torch_device),
-                                                 torch.tensor(std, dtype=torch.float32, device=self.torch_device))
-
-        if mode == Tags.NOISE_MODE_ADDITIVE:
-            data_tensor += dist.sample(data_tensor.shape)
-        elif mode == Tags.NOISE_MODE_MULTIPLICATIVE:
-            data_tensor *= dist.sample(data_tensor.shape)
-
-        if not (Tags.IGNORE_QA_ASSERTIONS in self.global_settings and Tags.IGNORE_QA_ASSERTIONS):
-            assert_array_well_defined(data_tensor)
+        mean = torch.tensor(mean, dtype=torch.float32, device=data_tensor.device)
+        std = torch.tensor(std, dtype=torch.float32, device=data_tensor.device)
+        if std <= 0:
+            msg = f"The standard deviation of the Gaussian noise must be positive but was {std.item()}."
+            self.logger.critical(msg)
+            raise ValueError(msg)
+        noise = torch.normal(mean.expand(data_tensor.shape), std.expand(data_tensor.shape), generator=generator)
+        data_tensor = apply_noise_mode(data_tensor, noise, mode)
 
         if non_negative:
             data_tensor[data_tensor < EPS] = EPS
-        save_data_field(data_tensor.cpu().numpy().astype(np.float64, copy=False),
-                        self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
-
-        self.logger.info("Applying Gaussian Noise Model...[Done]")
+        return data_tensor
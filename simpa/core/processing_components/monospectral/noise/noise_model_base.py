@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from abc import abstractmethod
+from typing import Optional
+
+import numpy as np
+import torch
+
+from simpa.core.processing_components import ProcessingComponentBase
+from simpa.io_handling import load_data_field, save_data_field
+from simpa.utils import Tags
+from simpa.utils.data_precision import cast_to_data_precision
+from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
+
+
+class NoiseModelBase(ProcessingComponentBase):
+    """
+    Base class of the noise models, which apply noise to the data field defined by Tags.DATA_FIELD. The noise is
+    computed on the processing device in single precision. Several noise models can be applied in a single pass with
+    the CompositeNoise.
+    """
+
+    #: Name of the noise model in the log messages.
+    noise_model_name = "Noise Model"
+
+    def get_data_field(self) -> str:
+        """
+        :return: the data field that the noise is applied to.
+        """
+        if Tags.DATA_FIELD not in self.component_settings.keys():
+            msg = f"The field {Tags.DATA_FIELD} must be set in order to use the {type(self).__name__} component."
+            self.logger.critical(msg)
+            raise KeyError(msg)
+        return self.component_settings[Tags.DATA_FIELD]
+
+    @abstractmethod
+    def apply_noise(self, data_tensor: torch.Tensor, generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """
+        Applies the noise to a data field. The tensor may be modified in place.
+
+        :param data_tensor: the data field as float32 tensor on the processing device.
+        :param generator: the random number generator. Per default, the global random number generator of torch is
+            used.
+        :return: the noisy data field.
+        """
+        pass
+
+    def run(self, device):
+        self.logger.info(f"Applying {self.noise_model_name}...")
+
+        data_field = self.get_data_field()
+        wavelength = self.global_settings[Tags.WAVELENGTH]
+        data_array = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
+        data_tensor = torch.as_tensor(data_array, dtype=torch.float32, device=self.torch_device)
+
+        data_tensor = self.apply_noise(data_tensor)
+
+        if not (Tags.IGNORE_QA_ASSERTIONS in self.global_settings and Tags.IGNORE_QA_ASSERTIONS):
+            assert_array_well_defined(data_tensor)
+
+        save_data_field(cast_to_data_precision(data_tensor, self.global_settings, np.float64),
+                        self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
+
+        self.logger.info(f"Applying {self.noise_model_name}...[Done]")
+
+
+def apply_noise_mode(data_tensor: torch.Tensor, noise: torch.Tensor, mode: str) -> torch.Tensor:
+    """
+    Adds the noise to or multiplies it with the data field depending on Tags.NOISE_MODE.
+    """
+    if mode == Tags.NOISE_MODE_ADDITIVE:
+        data_tensor += noise
+    elif mode == Tags.NOISE_MODE_MULTIPLICATIVE:
+        data_tensor *= noise
+    return data_tensor
+
+
+def sample_uniform(low: float, high: float, data_tensor: torch.Tensor,
+                   generator: Optional[torch.Generator] = None) -> torch.Tensor:
+    """
+    Samples uniformly distributed noise in [low, high[ of the shape of the data field like
+    torch.distributions.Uniform but with an optional random number generator.
+    """
+    low = torch.tensor(low, dtype=torch.float32, device=data_tensor.device)
+    high = torch.tensor(high, dtype=torch.float32, device=data_tensor.device)
+    return low + torch.rand(data_tensor.shape, generator=generator, dtype=torch.float32,
+                            device=data_tensor.device) * (high - low)
+
+
+def sample_gamma(shape: float, scale: float, data_tensor: torch.Tensor,
+                 generator: Optional[torch.Generator] = None) -> torch.Tensor:
+    """
+    Samples gamma distributed noise of the shape of the data field like torch.distributions.Gamma but with an
+    optional random number generator. The values are sampled with the rejection method of Marsaglia and Tsang
+    (ACM Transactions on Mathematical Software 26(3), 2000), which only needs normally and uniformly distributed
+    random numbers, such that neither the global random number generator of torch nor its state is used.
+
+    :param shape: the shape parameter of the gamma distribution.
+    :param scale: the scale parameter of the gamma distribution.
+    """
+    device = data_tensor.device
+    number_of_samples = data_tensor.numel()
+    boost = None
+    if shape < 1:
+        # gamma(shape) is distributed like gamma(shape + 1) * U^(1 / shape)
+        boost = torch.rand(number_of_samples, generator=generator, dtype=torch.float32,
+                           device=device) ** (1.0 / shape)
+        shape = shape + 1
+    d = shape - 1.0 / 3.0
+    c = 1.0 / np.sqrt(9.0 * d)
+
+    samples = torch.empty(number_of_samples, dtype=torch.float32, device=device)
+    remaining = torch.arange(number_of_samples, device=device)
+    while remaining.numel() > 0:
+        x = torch.randn(remaining.numel(), generator=generator, dtype=torch.float32, device=device)
+        u = torch.rand(remaining.numel(), generator=generator, dtype=torch.float32, device=device)
+        v = (1 + c * x) ** 3
+        accepted = (v > 0) & (torch.log(u) < 0.5 * x * x + d - d * v + d * torch.log(v))
+        samples[remaining[accepted]] = d * v[accepted]
+        remaining = remaining[~accepted]
+
+    if boost is not None:
+        samples *= boost
+    return (samples * scale).reshape(data_tensor.shape)
@@ -3,14 +3,11 @@
 # SPDX-License-Identifier: MIT
 
 from simpa.utils import Tags
-from simpa.io_handling import load_data_field, save_data_field
-from simpa.core.processing_components import ProcessingComponentBase
-from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
-import numpy as np
-import torch
+from simpa.core.processing_components.monospectral.noise.noise_model_base import NoiseModelBase, apply_noise_mode, \
+    sample_uniform
 
 
-class UniformNoise(ProcessingComponentBase):
+class UniformNoise(NoiseModelBase):
     """
     Applies uniform noise to the defined data field.
     The noise will be applied to all wavelengths.
@@ -25,19 +22,13 @@ class UniformNoise(ProcessingComponentBase):
        Tags.DATA_FIELD (required)
     """
 
-    def run(self, device):
-        self.logger.info("Applying Uniform Noise Model...")
+    noise_model_name = "Uniform Noise Model"
+
+    def apply_noise(self, data_tensor, generator=None):
         min_noise = 0
         max_noise = 1
         mode = Tags.NOISE_MODE_ADDITIVE
 
-        if Tags.DATA_FIELD not in self.component_settings.keys():
-            msg = f"The field {Tags.DATA_FIELD} must be set in order to use the uniform_noise component."
-            self.logger.critical(msg)
-            raise KeyError(msg)
-
-        data_field = self.component_settings[Tags.DATA_FIELD]
-
         if Tags.NOISE_MIN in self.component_settings.keys():
             min_noise = self.component_settings[Tags.NOISE_MIN]
 
@@ -51,21 +42,5 @@ class UniformNoise(ProcessingComponentBase):
         self.logger.debug(f"Noise model min: {min_noise}")
         self.logger.debug(f"Noise model max: {max_noise}")
 
-        wavelength = self.global_settings[Tags.WAVELENGTH]
-        data_array = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
-        data_tensor = torch.as_tensor(data_array, dtype=torch.float32, device=self.torch_device)
-        dist = torch.distributions.uniform.Uniform(torch.tensor(min_noise, dtype=torch.float32, device=self.torch_device),
-                                                   torch.tensor(max_noise, dtype=torch.float32, device=self.torch_device))
-
-        if mode == Tags.NOISE_MODE_ADDITIVE:
-            data_tensor += dist.sample(data_tensor.shape)
-        elif mode == Tags.NOISE_MODE_MULTIPLICATIVE:
-            data_tensor *= dist.sample(data_tensor.shape)
-
-        if not (Tags.IGNORE_QA_ASSERTIONS in self.global_settings and Tags.IGNORE_QA_ASSERTIONS):
-            assert_array_well_defined(data_tensor)
-
-        save_data_field(data_tensor.cpu().numpy().astype(np.float64, copy=False),
-                        self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, wavelength)
-
-        self.logger.info("Applying Uniform Noise Model...[Done]")
+        noise = sample_uniform(min_noise, max_noise, data_tensor, generator)
+        return apply_noise_mode(data_tensor, noise, mode)
@@ -3,12 +3,146 @@
 # SPDX-License-Identifier: MIT
 
 from simpa.utils import Tags
-from simpa.io_handling import save_data_field
+from simpa.io_handling import save_data_field, save_hdf5, HDF5FileSession
+from simpa.io_handling.io_hdf5 import save_hdf5_region
+from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.core.processing_components.multispectral import MultispectralProcessingAlgorithm
 from simpa.utils.libraries.spectrum_library import Spectrum
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
 import numpy as np
 import scipy.linalg as linalg
+import torch
 from scipy.optimize import nnls
+from simpa.log import Logger
+
+# Up to this number of endmembers, the non-negative least squares problems are solved exactly by enumerating all
+# active sets. For more endmembers, scipy.optimize.nnls is used for every pixel.
+MAX_ENUMERATED_ENDMEMBERS = 10
+
+# Endmember matrices and pseudo inverses of all LinearUnmixing instances of the process, such that they are only
+# computed once for a series of simulations with the same spectra and wavelengths. The least recently used entries
+# are removed once the cache holds more than UNMIXING_CACHE_SIZE entries.
+UNMIXING_CACHE_SIZE = 64
+_unmixing_cache = OrderedDict()
+_unmixing_cache_lock = threading.Lock()
+
+
+def _get_cached(key, compute):
+    """
+    Returns the cached value for the key or computes and caches it. Cached arrays are read-only.
+    """
+    with _unmixing_cache_lock:
+        if key in _unmixing_cache:
+            _unmixing_cache.move_to_end(key)
+            return _unmixing_cache[key]
+    value = compute()
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    with _unmixing_cache_lock:
+        _unmixing_cache[key] = value
+        while len(_unmixing_cache) > UNMIXING_CACHE_SIZE:
+            _unmixing_cache.popitem(last=False)
+    return value
+
+
+def clear_unmixing_cache():
+    """
+    Removes all cached endmember matrices and pseudo inverses.
+    """
+    with _unmixing_cache_lock:
+        _unmixing_cache.clear()
+
+
+def _get_matrix_key(matrix: np.ndarray) -> tuple:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    return matrix.shape, matrix.tobytes()
+
+
+def get_spectra_key(spectra: list, wavelengths: list) -> tuple:
+    """
+    :param spectra: the spectra of the endmembers.
+    :param wavelengths: the wavelengths at which the spectra are evaluated.
+    :return: the key of the endmember matrix in the cache, which consists of the names of the spectra, a hash of
+        their values and the wavelengths.
+    """
+    spectra_hashes = tuple(hashlib.sha1(np.ascontiguousarray(spectrum.values_interp, dtype=np.float64).tobytes() +
+                                        str(spectrum.min_wavelength).encode()).hexdigest() for spectrum in spectra)
+    return (tuple(spectrum.spectrum_name for spectrum in spectra), spectra_hashes,
+            tuple(float(wavelength) for wavelength in wavelengths))
+
+
+def get_pseudo_inverse(absorption_matrix: np.ndarray) -> np.ndarray:
+    """
+    :param absorption_matrix: the endmember matrix of shape [#wavelengths, #endmembers].
+    :return: the cached pseudo inverse of the endmember matrix.
+    """
+    return _get_cached(("pseudo_inverse",) + _get_matrix_key(absorption_matrix),
+                       lambda: linalg.pinv(np.asarray(absorption_matrix, dtype=np.float64)))
+
+
+def batched_nnls(absorption_matrix: np.ndarray, data: np.ndarray, torch_device: torch.device = None,
+                 chunk_size: int = 2 ** 18) -> np.ndarray:
+    """
+    Solves the non-negative least squares problems min ||absorption_matrix @ x - b||, x >= 0, for all columns b of
+    data at once.
+
+    The solution of a non-negative least squares problem is the unconstrained least squares solution on its set of
+    non-zero components. For few endmembers, all 2^#endmembers candidate sets are therefore enumerated and for every
+    pixel the feasible candidate with the smallest residual is chosen. This requires one pseudo inverse per
+    candidate set and vectorised matrix products over all pixels instead of one call of scipy.optimize.nnls per
+    pixel, and yields the same solutions up to rounding errors.
+
+    :param absorption_matrix: the endmember matrix of shape [#wavelengths, #endmembers].
+    :param data: the measurements of shape [#wavelengths, #pixels].
+    :param torch_device: the device on which the solutions are computed. Per default, the CPU is used.
+    :param chunk_size: the number of pixels that are processed at once.
+    :return: the solutions of shape [#endmembers, #pixels].
+    """
+    absorption_matrix = np.asarray(absorption_matrix, dtype=np.float64)
+    data = np.asarray(data, dtype=np.float64)
+    number_of_endmembers = absorption_matrix.shape[1]
+    if number_of_endmembers > MAX_ENUMERATED_ENDMEMBERS:
+        Logger().warning(f"Non-negative linear unmixing of {number_of_endmembers} endmembers is solved for every "
+                         f"pixel separately, which is slow for large images.")
+        return np.stack([nnls(absorption_matrix, data[:, pixel])[0] for pixel in range(data.shape[1])], axis=1)
+
+    torch_device = torch.device("cpu") if torch_device is None else torch_device
+    # the pseudo inverses of all candidate sets of non-zero components
+    candidate_sets = [list(candidate_set) for size in range(1, number_of_endmembers + 1)
+                      for candidate_set in itertools.combinations(range(number_of_endmembers), size)]
+    candidate_pseudo_inverses = _get_cached(
+        ("candidate_pseudo_inverses",) + _get_matrix_key(absorption_matrix),
+        lambda: [linalg.pinv(absorption_matrix[:, candidate_set]) for candidate_set in candidate_sets])
+    pseudo_inverses = [torch.as_tensor(pseudo_inverse, device=torch_device)
+                       for pseudo_inverse in candidate_pseudo_inverses]
+    endmember_matrices = [torch.as_tensor(absorption_matrix[:, candidate_set], device=torch_device)
+                          for candidate_set in candidate_sets]
+    scale = np.abs(absorption_matrix).max() if absorption_matrix.size > 0 else 1.0
+
+    solutions = np.zeros((number_of_endmembers, data.shape[1]))
+    for chunk_start in range(0, data.shape[1], chunk_size):
+        measurements = torch.as_tensor(data[:, chunk_start:chunk_start + chunk_size], device=torch_device)
+        # x = 0 is always feasible
+        best_solutions = torch.zeros((number_of_endmembers, measurements.shape[1]), dtype=torch.float64,
+                                     device=torch_device)
+        best_residuals = torch.sum(measurements ** 2, dim=0)
+        tolerance = 1e-12 * (1 + torch.max(torch.abs(measurements)).item() / scale)
+        for candidate_set, pseudo_inverse, endmember_matrix in zip(candidate_sets, pseudo_inverses,
+                                                                   endmember_matrices):
+            candidate_solutions = pseudo_inverse @ measurements
+            feasible = torch.all(candidate_solutions >= -tolerance, dim=0)
+            candidate_solutions = torch.clamp(candidate_solutions, min=0)
+            residuals = torch.sum((endmember_matrix @ candidate_solutions - measurements) ** 2, dim=0)
+            better = feasible & (residuals < best_residuals)
+            best_residuals = torch.where(better, residuals, best_residuals)
+            full_solutions = torch.zeros_like(best_solutions)
+            full_solutions[candidate_set] = candidate_solutions
+            best_solutions = torch.where(better[None, :], full_solutions, best_solutions)
+        solutions[:, chunk_start:chunk_start + chunk_size] = best_solutions.cpu().numpy()
+    return solutions
 
 
 class LinearUnmixing(MultispectralProcessingAlgorithm):
@@ -22,6 +156,10 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
     This component saves a dictionary containing the chromophore concentrations and corresponding wavelengths for
     each chromophore. If the tag LINEAR_UNMIXING_COMPUTE_SO2 is set True the blood oxygen saturation
     is saved as well, however, this is only possible if the chromophores oxy- and deoxyhemoglobin are specified.
+
+    If Tags.MULTISPECTRAL_BLOCK_SIZE is set, the data field is unmixed block by block and the results are written to
+    the output file block by block instead of being kept in self.chromophore_concentrations_dict, such that volumes
+    that do not fit into memory for all wavelengths can be unmixed.
     IMPORTANT:
     Linear unmixing should only be performed with at least two wavelengths:
     e.g. Tags.WAVELENGTHS: [750, 800]
@@ -32,6 +170,8 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
     Tags.WAVELENGTHS (default: None, if None, then settings[Tags.WAVELENGTHS] will be used.)
     Tags.LINEAR_UNMIXING_COMPUTE_SO2 (default: False)
     Tags.LINEAR_UNMIXING_NON_NEGATIVE (default: False)
+    Tags.SIGNAL_THRESHOLD (default: None)
+    Tags.MULTISPECTRAL_BLOCK_SIZE (default: None, if None, the complete data field is unmixed at once.)
     global_settings (required)
     component_settings_key (required)
     """
@@ -43,12 +183,15 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
         self.chromophore_spectra_dict = {}  # dictionary containing the spectrum for each chromophore and wavelength
         self.absorption_matrix = []  # endmember matrix needed in LU
         self.pseudo_inverse_absorption_matrix = []
+        self.spectra_key = None  # key of the spectra dictionary and the absorption matrix in the cache
 
         self.chromophore_concentrations = []  # list of LU results
         self.chromophore_concentrations_dict = {}  # dictionary of LU results
-        self.wavelengths = []  # list of wavelengths
 
-    def run(self):
+    def get_output_data_fields(self) -> list:
+        return [Tags.LINEAR_UNMIXING_RESULT]
+
+    def run(self, device=None):
 
         self.logger.info("Performing linear spectral unmixing...")
 
@@ -79,13 +222,25 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
         # check if non-negative contraint should be used for linear unmixing
         non_negative = False
         if Tags.LINEAR_UNMIXING_NON_NEGATIVE in self.component_settings:
-            non_negative = Tags.LINEAR_UNMIXING_NON_NEGATIVE
+            non_negative = self.component_settings[Tags.LINEAR_UNMIXING_NON_NEGATIVE]
 
         # create the absorption matrix needed by FLUPAI
         # the matrix should have the shape [#global wavelengths, #chromophores]
         self.absorption_matrix = self.create_absorption_matrix()
         self.logger.debug(f"The absorption matrix has shape {np.shape(self.absorption_matrix)}.")
 
+        compute_so2 = False
+        if Tags.LINEAR_UNMIXING_COMPUTE_SO2 in self.component_settings:
+            compute_so2 = self.component_settings[Tags.LINEAR_UNMIXING_COMPUTE_SO2]
+
+        if Tags.MULTISPECTRAL_BLOCK_SIZE in self.component_settings and \
+                self.component_settings[Tags.MULTISPECTRAL_BLOCK_SIZE] is not None:
+            self.unmix_blockwise(self.component_settings[Tags.MULTISPECTRAL_BLOCK_SIZE], non_negative, compute_so2)
+            self.logger.info("Performing linear spectral unmixing......[Done]")
+            return
+
+        self.load_data()
+
         # perform fast linear unmixing FLUPAI
         # the result saved in self.chromophore_concentrations is a list with the unmixed images
         # containing the chromophore concentration
@@ -103,10 +258,9 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
             "chromophore_concentrations": self.chromophore_concentrations_dict,
             "wavelengths": self.wavelengths
         }
-        if Tags.LINEAR_UNMIXING_COMPUTE_SO2 in self.component_settings:
-            if self.component_settings[Tags.LINEAR_UNMIXING_COMPUTE_SO2]:
-                self.logger.info("Blood oxygen saturation is calculated and saved.")
-                save_dict["sO2"] = self.calculate_sO2()
+        if compute_so2:
+            self.logger.info("Blood oxygen saturation is calculated and saved.")
+            save_dict["sO2"] = self.calculate_sO2()
 
         # save linear unmixing result in hdf5
         save_data_field(save_dict, self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH],
@@ -114,6 +268,39 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
 
         self.logger.info("Performing linear spectral unmixing......[Done]")
 
+    def unmix_blockwise(self, block_size: int, non_negative: bool = False, compute_so2: bool = False):
+        """
+        Unmixes the data field block by block and writes the chromophore concentrations and the blood oxygen
+        saturation of every block directly to the output file. Only the data of a single block is held in memory
+        at a time.
+
+        :param block_size: number of slices along the first axis of the data field per block.
+        :param non_negative: if True, non-negative linear unmixing is performed.
+        :param compute_so2: if True, the blood oxygen saturation is calculated and saved.
+        """
+        file_path = self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+        result_path = generate_dict_path(Tags.LINEAR_UNMIXING_RESULT)
+        shape, _ = self.get_data_field_shape()
+        chromophores = list(self.chromophore_spectra_dict.keys())
+
+        with HDF5FileSession(file_path):
+            for region, self.data in self.iterate_data_blocks(block_size):
+                self.chromophore_concentrations = self.flupai(non_negative=non_negative)
+                self.chromophore_concentrations_dict = dict(zip(chromophores, self.chromophore_concentrations))
+                for chromophore, concentration in self.chromophore_concentrations_dict.items():
+                    save_hdf5_region(concentration, file_path,
+                                     result_path + "chromophore_concentrations/" + chromophore + "/", region, shape,
+                                     np.float64)
+                if compute_so2:
+                    save_hdf5_region(self.calculate_sO2(), file_path, result_path + "sO2/", region, shape, np.float64)
+            save_hdf5({"wavelengths": self.wavelengths}, file_path, result_path)
+
+        self.data = None
+        self.chromophore_concentrations = []
+        self.chromophore_concentrations_dict = {}
+        self.logger.info(f"The chromophore concentration was computed block by block for chromophores: "
+                         f"{chromophores}")
+
     def build_chromophore_spectra_dict(self):
         """
         This function builds the absorption spectra dictionary for each chromophore using SIMPAs spectral library
@@ -125,8 +312,16 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
             spectra = self.component_settings[Tags.LINEAR_UNMIXING_SPECTRA]
             if len(spectra) < 2:
                 raise AssertionError(f"Need at least two endmembers for unmixing! You provided {len(spectra)}.")
-            for spectrum in spectra:
-                self.create_chromophore_spectra_entry(spectrum)
+
+            def create_chromophore_spectra_dict():
+                for spectrum in spectra:
+                    self.create_chromophore_spectra_entry(spectrum)
+                return dict(self.chromophore_spectra_dict)
+
+            self.chromophore_spectra_dict = {}
+            self.spectra_key = get_spectra_key(spectra, self.wavelengths)
+            self.chromophore_spectra_dict = dict(_get_cached(("chromophore_spectra",) + self.spectra_key,
+                                                             create_chromophore_spectra_dict))
         else:
             raise AssertionError("Tried to unmix without spectra definitions. Make sure that the"
                                  " Tags.LINEAR_UNMIXING_SPECTRA tag is set in the linear unmixing settings.")
@@ -143,10 +338,16 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
 
     def create_absorption_matrix(self) -> np.ndarray:
         """
-        Method that returns the absorption (endmember) matrix needed for linear unmixing.
+        Method that returns the absorption (endmember) matrix needed for linear unmixing. The matrix is cached for
+        the spectra and wavelengths of build_chromophore_spectra_dict and is therefore read-only.
 
         :return: absorption matrix
         """
+        if self.spectra_key is not None:
+            return _get_cached(("absorption_matrix",) + self.spectra_key, self._create_absorption_matrix)
+        return self._create_absorption_matrix()
+
+    def _create_absorption_matrix(self) -> np.ndarray:
 
         numberWavelengths = len(self.wavelengths)
         numberChromophores = len(self.chromophore_spectra_dict.keys())
@@ -186,14 +387,9 @@ class LinearUnmixing(MultispectralProcessingAlgorithm):
         # else non-negative least squares is performed.
         try:
             if non_negative:
-                output = []
-                for i in range(np.shape(reshapedData)[1]):
-                    foo, ris = nnls(np.array(self.absorption_matrix), reshapedData[:, i])
-                    output.append(foo)
-
-                output = np.swapaxes(output, axis1=0, axis2=1)
+                output = batched_nnls(np.array(self.absorption_matrix), reshapedData, self.torch_device)
             else:
-                self.pseudo_inverse_absorption_matrix = linalg.pinv(self.absorption_matrix)
+                self.pseudo_inverse_absorption_matrix = get_pseudo_inverse(self.absorption_matrix)
                 output = np.matmul(self.pseudo_inverse_absorption_matrix, reshapedData)
 
         except Exception as e:
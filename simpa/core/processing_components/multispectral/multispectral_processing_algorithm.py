@@ -1,31 +1,34 @@
 # SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
-from simpa.io_handling import load_data_field
+from simpa.io_handling import load_data_field, open_data_field
 from simpa.utils import Tags
-from simpa.log import Logger
+from simpa.core.processing_components import ProcessingComponentBase
 import numpy as np
-from abc import ABC, abstractmethod
+from abc import abstractmethod
 
 
-class MultispectralProcessingAlgorithm(ABC):
+class MultispectralProcessingAlgorithm(ProcessingComponentBase):
     """
     A MultispectralProcessingAlgorithm class represents an algorithm that works with multispectral input data.
+    Multispectral algorithms can be part of the simulation pipeline. In this case, they are executed once
+    after the wavelength-dependent pipeline elements have been run for all wavelengths.
     """
 
     def __init__(self, global_settings, component_settings_key: str):
         """
         Instantiates a multispectral processing algorithm.
 
-        Per default, this methods loads all data from a certain
-        Tags.DATA_FIELD into a data array for all
-        Tags.WAVELENGTHS.
+        Per default, the data from a certain Tags.DATA_FIELD for all
+        Tags.WAVELENGTHS is loaded into a data array by the load_data method
+        when self.data is accessed for the first time.
 
         """
         if component_settings_key is None:
             raise KeyError("The component settings must be set for a multispectral"
                            "processing algorithm!")
-        self.component_settings = global_settings[component_settings_key]
+        super(MultispectralProcessingAlgorithm, self).__init__(global_settings=global_settings,
+                                                               component_settings_key=component_settings_key)
 
         if Tags.WAVELENGTHS not in self.component_settings:
             raise KeyError("Tags.WAVELENGTHS must be in the component_settings of a multispectral processing algorithm")
@@ -33,25 +36,95 @@ class MultispectralProcessingAlgorithm(ABC):
         if Tags.DATA_FIELD not in self.component_settings:
             raise KeyError("Tags.DATA_FIELD must be in the component_settings of a multispectral processing algorithm")
 
-        self.logger = Logger()
-        self.global_settings = global_settings
         self.wavelengths = self.component_settings[Tags.WAVELENGTHS]
         self.data_field = self.component_settings[Tags.DATA_FIELD]
+        self._data = None
 
-        self.data = list()
+    @property
+    def data(self) -> np.ndarray:
+        """
+        The data field for all wavelengths. It is loaded by load_data on the first access, such that the algorithm
+        can be instantiated before the simulation pipeline has created the data.
+        """
+        if self._data is None:
+            self.load_data()
+        return self._data
+
+    @data.setter
+    def data(self, data: np.ndarray):
+        self._data = data
+
+    def get_telemetry_wavelength(self):
+        # multispectral algorithms process all wavelengths at once
+        return None
+
+    def load_data(self):
+        """
+        Loads the data field for all wavelengths into self.data. This is done on the first access of self.data,
+        such that the algorithm can be instantiated before the simulation pipeline has created the data.
+        """
+        shape, dtype = self.get_data_field_shape()
+        self.data = np.empty((len(self.wavelengths),) + shape, dtype=dtype)
         for i in range(len(self.wavelengths)):
-            self.data.append(load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH],
-                                             self.data_field,
-                                             self.wavelengths[i]))
+            self.data[i] = load_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH],
+                                           self.data_field,
+                                           self.wavelengths[i])
 
-        self.data = np.asarray(self.data)
         if Tags.SIGNAL_THRESHOLD in self.component_settings:
             self.data[self.data < self.component_settings[Tags.SIGNAL_THRESHOLD]*np.max(self.data)] = 0
 
+    def get_data_field_shape(self) -> tuple:
+        """
+        :return: the shape and the type of the data field of a single wavelength, read without loading the data.
+        """
+        with open_data_field(self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], self.data_field,
+                             self.wavelengths[0]) as data_field:
+            return tuple(data_field.shape), data_field.dtype
+
+    def iterate_data_blocks(self, block_size: int):
+        """
+        Loads the data field for all wavelengths block by block instead of loading it completely like load_data.
+        Each block contains block_size slices along the first axis of the data field. If Tags.SIGNAL_THRESHOLD is
+        set, the maximum of the data is determined in a first pass over the blocks.
+
+        :param block_size: number of slices along the first axis of the data field per block.
+        :return: generator of the regions of the blocks within the data field of a single wavelength, e.g.
+            np.s_[0:10], and the blocks of shape [#wavelengths, block_size, ...].
+        """
+        file_path = self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+        shape, dtype = self.get_data_field_shape()
+        block_size = max(int(block_size), 1)
+        regions = [np.s_[start:min(start + block_size, shape[0])] for start in range(0, shape[0], block_size)]
+
+        def load_block(region):
+            block = np.empty((len(self.wavelengths), region.stop - region.start) + shape[1:], dtype=dtype)
+            for i in range(len(self.wavelengths)):
+                block[i] = load_data_field(file_path, self.data_field, self.wavelengths[i], region=region)
+            return block
+
+        threshold = None
+        if Tags.SIGNAL_THRESHOLD in self.component_settings:
+            threshold = self.component_settings[Tags.SIGNAL_THRESHOLD] * max(np.max(load_block(region))
+                                                                             for region in regions)
+        for region in regions:
+            block = load_block(region)
+            if threshold is not None:
+                block[block < threshold] = 0
+            yield region, block
+
+    def get_input_data_fields(self) -> list:
+        return [(self.data_field, wavelength) for wavelength in self.wavelengths]
+
+    def get_output_data_fields(self) -> list:
+        return None
+
     @abstractmethod
-    def run(self):
+    def run(self, device=None):
         """
         This method must be implemented by the multispectral algorithm, such that
         any multispectral algorithm can be executed by invoking the run method.
+
+        :param device: The digital device twin. It is not needed by most multispectral algorithms,
+            but allows the algorithm to be part of the simulation pipeline.
         """
         pass
@@ -4,6 +4,7 @@
 
 from abc import ABC
 from simpa.core import PipelineElementBase
+from simpa.utils import Tags
 
 
 class ProcessingComponentBase(PipelineElementBase, ABC):
@@ -19,3 +20,22 @@ class ProcessingComponentBase(PipelineElementBase, ABC):
         """
         super(ProcessingComponentBase, self).__init__(global_settings=global_settings)
         self.component_settings = global_settings[component_settings_key]
+
+    def get_input_data_fields(self) -> list:
+        """
+        Per default, a processing component reads the data field(s) defined by Tags.DATA_FIELD
+        in its component settings.
+        """
+        if Tags.DATA_FIELD not in self.component_settings:
+            return None
+        data_fields = self.component_settings[Tags.DATA_FIELD]
+        if isinstance(data_fields, str):
+            return [data_fields]
+        return list(data_fields)
+
+    def get_output_data_fields(self) -> list:
+        """
+        Per default, a processing component overwrites the data field(s) defined by Tags.DATA_FIELD
+        in its component settings.
+        """
+        return self.get_input_data_fields()
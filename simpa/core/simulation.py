@@ -5,15 +5,22 @@
 from simpa.utils import Tags
 from simpa import __version__
 
-from simpa.io_handling.io_hdf5 import save_hdf5, load_hdf5, save_data_field, load_data_field
+from simpa.io_handling.io_hdf5 import save_hdf5, save_data_field, load_data_field, delete_hdf5_entries, \
+    repack_hdf5, HDF5FileSession
 from simpa.io_handling.ipasc import export_to_ipasc
+from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.utils.settings import Settings
+from simpa.utils.telemetry import Telemetry, measure, save_telemetry
 from simpa.log import Logger
 from .device_digital_twins import DigitalDeviceTwinBase
+from .pipeline_graph import PipelineGraph
+from .pipeline_stages import StagedPipeline
+from .processing_components.multispectral import MultispectralProcessingAlgorithm
 
 import numpy as np
 import os
 import time
+from contextlib import nullcontext
 
 
 def simulate(simulation_pipeline: list, settings: Settings, digital_device_twin: DigitalDeviceTwinBase):
@@ -21,6 +28,16 @@ def simulate(simulation_pipeline: list, settings: Settings, digital_device_twin:
     This method constitutes the staring point for the simulation pipeline
     of the SIMPA toolkit.
 
+    Per default, the pipeline elements are executed sequentially for every wavelength. Multispectral processing
+    algorithms are executed once after all wavelengths have been simulated. If Tags.PIPELINE_EXECUTION_MODE is set
+    to Tags.PIPELINE_EXECUTION_MODE_GRAPH, the pipeline is scheduled as a dependency graph instead, and independent
+    pipeline elements are executed concurrently (see simpa.core.pipeline_graph.PipelineGraph). If it is set to
+    Tags.PIPELINE_EXECUTION_MODE_PIPELINED, every pipeline element runs as a stage of an assembly line that processes
+    the wavelengths one after another (see simpa.core.pipeline_stages.StagedPipeline).
+
+    If Tags.RECORD_TELEMETRY is set, the wall time, CPU time and peak memory of every pipeline element and of its
+    sub-steps are recorded for every wavelength and stored in the output file (see simpa.utils.telemetry).
+
     :param simulation_pipeline: a list of callable functions
     :param settings: settings dictionary containing the simulation instructions
     :param digital_device_twin: a digital device twin of an imaging device as specified by the DigitalDeviceTwinBase
@@ -55,65 +72,140 @@ def simulate(simulation_pipeline: list, settings: Settings, digital_device_twin:
     else:
         simpa_output_path = path + settings[Tags.VOLUME_NAME]
 
-    settings[Tags.SIMPA_OUTPUT_FILE_PATH] = simpa_output_path + ".hdf5"
+    storage_backend = Tags.STORAGE_BACKEND_HDF5
+    if Tags.STORAGE_BACKEND in settings:
+        storage_backend = settings[Tags.STORAGE_BACKEND]
+    settings[Tags.SIMPA_OUTPUT_FILE_PATH] = simpa_output_path + "." + storage_backend
 
     simpa_output[Tags.SIMPA_VERSION] = __version__
     simpa_output[Tags.SETTINGS] = settings
     simpa_output[Tags.DIGITAL_DEVICE] = digital_device_twin
     simpa_output[Tags.SIMULATION_PIPELINE] = [type(x).__name__ for x in simulation_pipeline]
 
-    logger.debug("Saving settings dictionary...")
+    do_file_compression = not (Tags.DO_FILE_COMPRESSION in settings and not settings[Tags.DO_FILE_COMPRESSION])
+    file_compression = None
+    if do_file_compression:
+        file_compression = "gzip"
+        if Tags.FILE_COMPRESSION_FILTER in settings:
+            file_compression = settings[Tags.FILE_COMPRESSION_FILTER]
+    chunk_shapes = None
+    if Tags.DATA_CHUNK_SHAPES in settings:
+        chunk_shapes = dict(settings[Tags.DATA_CHUNK_SHAPES])
+
+    telemetry = None
+    if (Tags.RECORD_TELEMETRY in settings and settings[Tags.RECORD_TELEMETRY]) or \
+            Tags.TELEMETRY_JSON_LINES_FILE in settings:
+        json_lines_path = None
+        if Tags.TELEMETRY_JSON_LINES_FILE in settings:
+            json_lines_path = settings[Tags.TELEMETRY_JSON_LINES_FILE]
+        telemetry = Telemetry(json_lines_path, metadata={"output_name": os.path.basename(simpa_output_path)})
+
+    with telemetry if telemetry is not None else nullcontext(), measure("simulate"):
+        logger.debug("Saving settings dictionary...")
+
+        # In case of continuation, the simulation script doesn't overwrite the existing file.
+
+        if Tags.CONTINUE_SIMULATION in settings and settings[Tags.CONTINUE_SIMULATION]:
+            try:
+                old_pipe = load_data_field(settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.SIMULATION_PIPELINE)
+            except KeyError as e:
+                old_pipe = list()
+            simpa_output[Tags.SIMULATION_PIPELINE] = old_pipe + simpa_output[Tags.SIMULATION_PIPELINE]
+            previous_settings = load_data_field(settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.SETTINGS)
+            previous_settings.update(settings)
+            simpa_output[Tags.SETTINGS] = previous_settings
+
+            for i in [Tags.SETTINGS, Tags.DIGITAL_DEVICE, Tags.SIMULATION_PIPELINE]:
+                save_data_field(simpa_output[i], settings[Tags.SIMPA_OUTPUT_FILE_PATH], i)
+        else:
+            save_hdf5(simpa_output, settings[Tags.SIMPA_OUTPUT_FILE_PATH], file_compression=file_compression,
+                      chunk_shapes=chunk_shapes)
+        logger.debug("Saving settings dictionary...[Done]")
+
+        # All pipeline elements access the output file through the same file handle.
+        with HDF5FileSession(settings[Tags.SIMPA_OUTPUT_FILE_PATH]) as hdf5_session:
+            _run_pipeline(simulation_pipeline, settings, digital_device_twin, hdf5_session)
+
+        # The arrays are compressed when they are written to the file. If the dimensions of the simulation results
+        # are changed after calling the respective module adapter / processing components, the space that was
+        # allocated for the previous results is reused by the file where possible. Any space that remains unused
+        # is released by repacking the file without loading the data into memory. Active by default.
+        if do_file_compression:
+            delete_hdf5_entries(settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.INPUT_SEGMENTATION_VOLUME[0],
+                                generate_dict_path(Tags.SETTINGS),
+                                parent_key=Tags.VOLUME_CREATION_MODEL_SETTINGS[0])
+            repack_hdf5(settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+
+        # Export simulation result to the IPASC format.
+        if Tags.DO_IPASC_EXPORT in settings and settings[Tags.DO_IPASC_EXPORT]:
+            logger.info("Exporting to IPASC....")
+            export_to_ipasc(settings[Tags.SIMPA_OUTPUT_FILE_PATH], device=digital_device_twin)
+
+    if telemetry is not None:
+        save_telemetry(settings[Tags.SIMPA_OUTPUT_FILE_PATH], telemetry.records)
 
-    # In case of continuation, the simulation script doesn't overwrite the existing file.
+    logger.info(f"The entire simulation pipeline required {time.time() - start_time} seconds.")
 
-    if Tags.CONTINUE_SIMULATION in settings and settings[Tags.CONTINUE_SIMULATION]:
-        try:
-            old_pipe = load_data_field(settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.SIMULATION_PIPELINE)
-        except KeyError as e:
-            old_pipe = list()
-        simpa_output[Tags.SIMULATION_PIPELINE] = old_pipe + simpa_output[Tags.SIMULATION_PIPELINE]
-        previous_settings = load_data_field(settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.SETTINGS)
-        previous_settings.update(settings)
-        simpa_output[Tags.SETTINGS] = previous_settings
 
-        for i in [Tags.SETTINGS, Tags.DIGITAL_DEVICE, Tags.SIMULATION_PIPELINE]:
-            save_data_field(simpa_output[i], settings[Tags.SIMPA_OUTPUT_FILE_PATH], i)
-    else:
-        save_hdf5(simpa_output, settings[Tags.SIMPA_OUTPUT_FILE_PATH])
-    logger.debug("Saving settings dictionary...[Done]")
+def _run_pipeline(simulation_pipeline: list, settings: Settings, digital_device_twin: DigitalDeviceTwinBase,
+                  hdf5_session: HDF5FileSession):
+    """
+    Runs the pipeline elements for all wavelengths according to Tags.PIPELINE_EXECUTION_MODE and flushes the
+    output file after every pipeline stage.
+    """
+    logger = Logger()
+    execution_mode = Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL
+    if Tags.PIPELINE_EXECUTION_MODE in settings:
+        execution_mode = settings[Tags.PIPELINE_EXECUTION_MODE]
+
+    multispectral_elements = [element for element in simulation_pipeline
+                              if isinstance(element, MultispectralProcessingAlgorithm)]
+
+    if execution_mode == Tags.PIPELINE_EXECUTION_MODE_GRAPH:
+        max_workers = 2
+        if Tags.PIPELINE_MAX_WORKERS in settings:
+            max_workers = settings[Tags.PIPELINE_MAX_WORKERS]
+        logger.debug(f"Running pipeline graph with {max_workers} workers...")
+        PipelineGraph(simulation_pipeline, settings).run(digital_device_twin, max_workers=max_workers)
+        hdf5_session.flush()
+        logger.debug(f"Running pipeline graph with {max_workers} workers... [Done]")
+    elif execution_mode == Tags.PIPELINE_EXECUTION_MODE_PIPELINED:
+        queue_size = 1
+        if Tags.PIPELINE_QUEUE_SIZE in settings:
+            queue_size = settings[Tags.PIPELINE_QUEUE_SIZE]
+        StagedPipeline([element for element in simulation_pipeline if element not in multispectral_elements],
+                       settings, queue_size=queue_size).run(digital_device_twin)
+        hdf5_session.flush()
+
+        for pipeline_element in multispectral_elements:
+            logger.debug(f"Running {type(pipeline_element)}")
+            pipeline_element.run(digital_device_twin)
+            hdf5_session.flush()
+    elif execution_mode == Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL:
+        for wavelength in settings[Tags.WAVELENGTHS]:
+            logger.debug(f"Running pipeline for wavelength {wavelength}nm...")
 
-    for wavelength in settings[Tags.WAVELENGTHS]:
-        logger.debug(f"Running pipeline for wavelength {wavelength}nm...")
+            if settings[Tags.RANDOM_SEED] is not None:
+                np.random.seed(settings[Tags.RANDOM_SEED])
+            else:
+                np.random.seed(None)
 
-        if settings[Tags.RANDOM_SEED] is not None:
-            np.random.seed(settings[Tags.RANDOM_SEED])
-        else:
-            np.random.seed(None)
+            settings[Tags.WAVELENGTH] = wavelength
 
-        settings[Tags.WAVELENGTH] = wavelength
+            for pipeline_element in simulation_pipeline:
+                if pipeline_element in multispectral_elements:
+                    continue
+                logger.debug(f"Running {type(pipeline_element)}")
+                pipeline_element.run(digital_device_twin)
+                hdf5_session.flush()
 
-        for pipeline_element in simulation_pipeline:
+            logger.debug(f"Running pipeline for wavelength {wavelength}nm... [Done]")
+
+        for pipeline_element in multispectral_elements:
             logger.debug(f"Running {type(pipeline_element)}")
             pipeline_element.run(digital_device_twin)
-
-        logger.debug(f"Running pipeline for wavelength {wavelength}nm... [Done]")
-
-    # If the dimensions of the simulation results are changed after calling the respective module
-    # adapter / processing components, the amount of space on the hard drive that is allocated by the HDF5
-    # code does not dynamically change. This can be remedied by re-writing the file after the simulation
-    # terminates. As it might have a negative impact on simulation performance, it must be activated
-    # by the user manually. Active by default.
-    if not (Tags.DO_FILE_COMPRESSION in settings and
-            not settings[Tags.DO_FILE_COMPRESSION]):
-        all_data = load_hdf5(settings[Tags.SIMPA_OUTPUT_FILE_PATH])
-        if Tags.VOLUME_CREATION_MODEL_SETTINGS in all_data[Tags.SETTINGS] and \
-                Tags.INPUT_SEGMENTATION_VOLUME in all_data[Tags.SETTINGS][Tags.VOLUME_CREATION_MODEL_SETTINGS]:
-            del all_data[Tags.SETTINGS][Tags.VOLUME_CREATION_MODEL_SETTINGS][Tags.INPUT_SEGMENTATION_VOLUME]
-        save_hdf5(all_data, settings[Tags.SIMPA_OUTPUT_FILE_PATH], file_compression="gzip")
-
-    # Export simulation result to the IPASC format.
-    if Tags.DO_IPASC_EXPORT in settings and settings[Tags.DO_IPASC_EXPORT]:
-        logger.info("Exporting to IPASC....")
-        export_to_ipasc(settings[Tags.SIMPA_OUTPUT_FILE_PATH], device=digital_device_twin)
-
-    logger.info(f"The entire simulation pipeline required {time.time() - start_time} seconds.")
+            hdf5_session.flush()
+    else:
+        msg = f"The pipeline execution mode {execution_mode} is not supported."
+        logger.critical(msg)
+        raise ValueError(msg)
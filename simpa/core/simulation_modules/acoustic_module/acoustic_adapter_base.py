@@ -7,6 +7,7 @@ import numpy as np
 from simpa.core.simulation_modules import SimulationModuleBase
 from simpa.utils import Tags, Settings
 from simpa.io_handling.io_hdf5 import save_hdf5
+from simpa.utils.data_precision import cast_to_data_precision
 from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.core.device_digital_twins import PhotoacousticDevice, DetectionGeometryBase
 from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
@@ -41,6 +42,13 @@ class AcousticAdapterBase(SimulationModuleBase):
         """
         return self.global_settings.get_acoustic_settings()
 
+    def get_input_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_SPEED_OF_SOUND, Tags.DATA_FIELD_DENSITY,
+                Tags.DATA_FIELD_ALPHA_COEFF]
+
+    def get_output_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_TIME_SERIES_DATA]
+
     @abstractmethod
     def forward_model(self, detection_geometry) -> np.ndarray:
         """
@@ -79,6 +87,7 @@ class AcousticAdapterBase(SimulationModuleBase):
         acoustic_output_path = generate_dict_path(
             Tags.DATA_FIELD_TIME_SERIES_DATA, wavelength=self.global_settings[Tags.WAVELENGTH])
 
-        save_hdf5(time_series_data, self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], acoustic_output_path)
+        save_hdf5(cast_to_data_precision(time_series_data, self.global_settings),
+                  self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], acoustic_output_path)
 
         self.logger.info("Simulating the acoustic forward process...[Done]")
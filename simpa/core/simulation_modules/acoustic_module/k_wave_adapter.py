@@ -21,6 +21,7 @@ from simpa.utils.calculate import rotation_matrix_between_vectors
 from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.utils.path_manager import PathManager
 from simpa.utils.settings import Settings
+from simpa.utils.telemetry import measure
 
 
 class KWaveAdapter(AcousticAdapterBase):
@@ -66,6 +67,14 @@ class KWaveAdapter(AcousticAdapterBase):
 
     """
 
+    def uses_random_numbers(self) -> bool:
+        # k-Wave is run in a separate MATLAB process and does not use numpy's random state
+        return False
+
+    def get_output_data_fields(self) -> list:
+        # the k-Wave specific time stepping is written back into the settings of the output file
+        return super(KWaveAdapter, self).get_output_data_fields() + [Tags.SETTINGS]
+
     def forward_model(self, detection_geometry: DetectionGeometryBase) -> np.ndarray:
         """
         Runs the acoustic forward model and performs reading parameters and values from an hdf5 file
@@ -243,7 +252,8 @@ class KWaveAdapter(AcousticAdapterBase):
 
         cur_dir = os.getcwd()
         self.logger.info(cmd)
-        subprocess.run(cmd)
+        with measure("matlab_subprocess"):
+            subprocess.run(cmd)
 
         raw_time_series_data = sio.loadmat(optical_path)[Tags.DATA_FIELD_TIME_SERIES_DATA]
         time_grid = sio.loadmat(optical_path + "dt.mat")
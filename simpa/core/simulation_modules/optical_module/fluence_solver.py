@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, Union
+
+import numpy as np
+
+from simpa.core.device_digital_twins import IlluminationGeometryBase, PhotoacousticDevice
+from simpa.core.simulation_modules.optical_module.optical_adapter_base import OpticalAdapterBase
+from simpa.log import Logger
+from simpa.utils import Tags
+
+
+class FluenceSolverBase(ABC):
+    """
+    Base class of the fluence solvers that are used by iterative algorithms, e.g. the iterative qPAI reconstruction,
+    which compute the fluence of the same medium with a changing absorption many times. A fluence solver keeps its
+    state, e.g. the scattering, the illumination and the instance of the optical model, in memory between the solves::
+
+        solver = OpticalAdapterFluenceSolver(MCXAdapter(settings))
+        solver.set_medium(scattering, anisotropy, device)
+        for iteration in range(10):
+            fluence = solver.solve(absorption, number_of_photons=..., initial_fluence=fluence)
+            absorption = ...
+        solver.close()
+    """
+
+    def __init__(self):
+        self.logger = Logger()
+        self.scattering = None
+        self.anisotropy = None
+        self.illumination_geometries = None
+
+    def set_medium(self, scattering_cm: np.ndarray, anisotropy: np.ndarray,
+                   device: Union[IlluminationGeometryBase, PhotoacousticDevice, List[IlluminationGeometryBase]]):
+        """
+        Sets the parts of the medium that do not change between the solves.
+
+        :param scattering_cm: scattering in units of per centimeter.
+        :param anisotropy: dimensionless scattering anisotropy.
+        :param device: the illumination geometry, a list of illumination geometries whose fluences are averaged or a
+            photoacoustic device.
+        """
+        if isinstance(device, PhotoacousticDevice):
+            device = device.get_illumination_geometry()
+        if isinstance(device, IlluminationGeometryBase):
+            device = [device]
+        if not isinstance(device, list) or len(device) == 0:
+            msg = f"The fluence solver does not support devices of type {type(device)}."
+            self.logger.critical(msg)
+            raise TypeError(msg)
+        self.scattering = scattering_cm
+        self.anisotropy = anisotropy
+        self.illumination_geometries = device
+
+    @abstractmethod
+    def solve(self, absorption_cm: np.ndarray, number_of_photons: Optional[int] = None,
+              initial_fluence: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Computes the fluence for the given absorption and the medium given to set_medium.
+
+        :param absorption_cm: absorption in units of per centimeter. The caller may change the array after the solve,
+            solvers that keep it must copy it.
+        :param number_of_photons: the number of photons of Monte Carlo solvers. Per default,
+            Tags.OPTICAL_MODEL_NUMBER_PHOTONS of the optical settings is used.
+        :param initial_fluence: the fluence of the previous solve, e.g. of the previous iteration, which solvers can
+            use as a warm start. Solvers without a warm start ignore it.
+        :return: the fluence, averaged over all illumination geometries.
+        """
+        pass
+
+    def close(self):
+        """
+        Releases the resources of the solver and restores the settings that were changed by the solver.
+        """
+        pass
+
+
+class OpticalAdapterFluenceSolver(FluenceSolverBase):
+    """
+    Computes the fluence with an optical adapter, e.g. the MCXAdapter. The adapter is created once and reused for
+    all solves instead of creating a new adapter for every solve. The number of photons of every solve can be set,
+    such that iterative algorithms can use fewer photons in their first iterations.
+
+    During the solves, Tags.MCX_ASSUMED_ANISOTROPY of the optical settings is set to the mean anisotropy of the
+    medium and Tags.OPTICAL_MODEL_NUMBER_PHOTONS to the requested number of photons. Both are restored by close.
+    """
+
+    def __init__(self, optical_adapter: OpticalAdapterBase):
+        """
+        :param optical_adapter: the optical adapter that computes the fluence.
+        """
+        super(OpticalAdapterFluenceSolver, self).__init__()
+        if not isinstance(optical_adapter, OpticalAdapterBase):
+            msg = f"The optical adapter must be an OpticalAdapterBase, but got {type(optical_adapter)}."
+            self.logger.critical(msg)
+            raise TypeError(msg)
+        self.optical_adapter = optical_adapter
+        self._original_settings = dict()
+
+    def _set_component_setting(self, key, value):
+        component_settings = self.optical_adapter.component_settings
+        if key not in self._original_settings:
+            self._original_settings[key] = component_settings[key] if key in component_settings else None
+        component_settings[key] = value
+
+    def set_medium(self, scattering_cm: np.ndarray, anisotropy: np.ndarray,
+                   device: Union[IlluminationGeometryBase, PhotoacousticDevice, List[IlluminationGeometryBase]]):
+        super(OpticalAdapterFluenceSolver, self).set_medium(scattering_cm, anisotropy, device)
+        self._set_component_setting(Tags.MCX_ASSUMED_ANISOTROPY, float(np.mean(anisotropy)))
+
+    def solve(self, absorption_cm: np.ndarray, number_of_photons: Optional[int] = None,
+              initial_fluence: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.illumination_geometries is None:
+            msg = "The medium must be set with set_medium before the fluence can be solved."
+            self.logger.critical(msg)
+            raise RuntimeError(msg)
+        if number_of_photons is not None:
+            self._set_component_setting(Tags.OPTICAL_MODEL_NUMBER_PHOTONS, int(number_of_photons))
+
+        fluence = None
+        for illumination_geometry in self.illumination_geometries:
+            results = self.optical_adapter.forward_model(absorption_cm=absorption_cm,
+                                                         scattering_cm=self.scattering,
+                                                         anisotropy=self.anisotropy,
+                                                         illumination_geometry=illumination_geometry)
+            if fluence is None:
+                fluence = np.array(results[Tags.DATA_FIELD_FLUENCE], dtype=np.float64)
+            else:
+                fluence += results[Tags.DATA_FIELD_FLUENCE]
+        return fluence / len(self.illumination_geometries)
+
+    def close(self):
+        component_settings = self.optical_adapter.component_settings
+        for key, value in self._original_settings.items():
+            if value is None:
+                if key in component_settings:
+                    del component_settings[key]
+            else:
+                component_settings[key] = value
+        self._original_settings.clear()
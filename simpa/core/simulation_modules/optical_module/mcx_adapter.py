@@ -5,6 +5,7 @@
 import numpy as np
 import subprocess
 from simpa.utils import Tags, Settings
+from simpa.utils.telemetry import measure
 from simpa.core.simulation_modules.optical_module import OpticalAdapterBase
 from simpa.core.device_digital_twins.illumination_geometries import IlluminationGeometryBase
 import json
@@ -38,6 +39,10 @@ class MCXAdapter(OpticalAdapterBase):
         self.frames = None
         self.mcx_output_suffixes = {'mcx_volumetric_data_file': '.jnii'}
 
+    def uses_random_numbers(self) -> bool:
+        # MCX draws its random numbers in a separate process that is seeded with Tags.RANDOM_SEED
+        return False
+
     def forward_model(self,
                       absorption_cm: np.ndarray,
                       scattering_cm: np.ndarray,
@@ -199,7 +204,8 @@ class MCXAdapter(OpticalAdapterBase):
         """
         results = None
         try:
-            results = subprocess.run(cmd)
+            with measure("mcx_subprocess"):
+                results = subprocess.run(cmd)
         except:
             raise RuntimeError(f"MCX failed to run: {cmd}, results: {results}")
 
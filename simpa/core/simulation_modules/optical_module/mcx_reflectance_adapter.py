@@ -41,6 +41,11 @@ class MCXReflectanceAdapter(MCXAdapter):
         self.mcx_output_suffixes = {'mcx_volumetric_data_file': '.jnii',
                                     'mcx_photon_data_file': '_detp.jdat'}
 
+    def get_output_data_fields(self) -> list:
+        return super(MCXReflectanceAdapter, self).get_output_data_fields() + [
+            Tags.DATA_FIELD_DIFFUSE_REFLECTANCE, Tags.DATA_FIELD_DIFFUSE_REFLECTANCE_POS,
+            Tags.DATA_FIELD_PHOTON_EXIT_POS, Tags.DATA_FIELD_PHOTON_EXIT_DIR]
+
     def forward_model(self,
                       absorption_cm: np.ndarray,
                       scattering_cm: np.ndarray,
@@ -10,6 +10,7 @@ from simpa.core.simulation_modules import SimulationModuleBase
 from simpa.core.device_digital_twins import (IlluminationGeometryBase,
                                              PhotoacousticDevice)
 from simpa.io_handling.io_hdf5 import load_data_field, save_hdf5
+from simpa.utils.data_precision import cast_to_data_precision
 from simpa.utils import Settings, Tags
 from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.utils.quality_assurance.data_sanity_testing import \
@@ -37,6 +38,13 @@ class OpticalAdapterBase(SimulationModuleBase):
         """
         return self.global_settings.get_optical_settings()
 
+    def get_input_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_ABSORPTION_PER_CM, Tags.DATA_FIELD_SCATTERING_PER_CM, Tags.DATA_FIELD_ANISOTROPY,
+                Tags.DATA_FIELD_GRUNEISEN_PARAMETER]
+
+    def get_output_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_FLUENCE, Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.OPTICAL_MODEL_UNITS]
+
     @abstractmethod
     def forward_model(self,
                       absorption_cm: np.ndarray,
@@ -116,9 +124,9 @@ class OpticalAdapterBase(SimulationModuleBase):
         if not (Tags.IGNORE_QA_ASSERTIONS in self.global_settings and Tags.IGNORE_QA_ASSERTIONS):
             assert_array_well_defined(initial_pressure, assume_non_negativity=True, array_name="initial_pressure")
 
-        results[Tags.DATA_FIELD_FLUENCE] = fluence
+        results[Tags.DATA_FIELD_FLUENCE] = cast_to_data_precision(fluence, self.global_settings)
         results[Tags.OPTICAL_MODEL_UNITS] = units
-        results[Tags.DATA_FIELD_INITIAL_PRESSURE] = initial_pressure
+        results[Tags.DATA_FIELD_INITIAL_PRESSURE] = cast_to_data_precision(initial_pressure, self.global_settings)
         optical_output = {}
         for k, item in results.items():
             optical_output[k] = {self.global_settings[Tags.WAVELENGTH]: item}
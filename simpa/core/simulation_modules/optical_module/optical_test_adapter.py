@@ -11,6 +11,9 @@ class OpticalTestAdapter(OpticalAdapterBase):
     This Adapter was created for testing purposes and only
     """
 
+    def uses_random_numbers(self) -> bool:
+        return False
+
     def forward_model(self, absorption_cm, scattering_cm, anisotropy, illumination_geometry):
         results = {Tags.DATA_FIELD_FLUENCE: absorption_cm / ((1 - anisotropy) * scattering_cm)}
         return results
@@ -14,6 +14,9 @@ from simpa.core.simulation_modules.reconstruction_module import create_reconstru
 
 class DelayAndSumAdapter(ReconstructionAdapterBase):
 
+    def uses_random_numbers(self) -> bool:
+        return False
+
     def reconstruction_algorithm(self, time_series_sensor_data, detection_geometry: DetectionGeometryBase):
         """
         Applies the Delay and Sum beamforming algorithm [1] to the time series sensor data (2D numpy array where the
@@ -10,8 +10,10 @@ from abc import abstractmethod
 from simpa.core.simulation_modules import SimulationModuleBase
 from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.io_handling.io_hdf5 import save_hdf5
+from simpa.utils.data_precision import cast_to_data_precision
 import numpy as np
 from simpa.utils import Settings
+from simpa.utils.telemetry import measure
 from simpa.core.simulation_modules.reconstruction_module.reconstruction_utils import bandpass_filter_with_settings, apply_b_mode
 from simpa.utils.quality_assurance.data_sanity_testing import assert_array_well_defined
 
@@ -33,6 +35,12 @@ class ReconstructionAdapterBase(SimulationModuleBase):
         """
         return self.global_settings.get_reconstruction_settings()
 
+    def get_input_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_TIME_SERIES_DATA, Tags.DATA_FIELD_SPEED_OF_SOUND]
+
+    def get_output_data_fields(self) -> list:
+        return [Tags.DATA_FIELD_RECONSTRUCTED_DATA]
+
     @abstractmethod
     def reconstruction_algorithm(self, time_series_sensor_data,
                                  detection_geometry: DetectionGeometryBase) -> np.ndarray:
@@ -74,7 +82,8 @@ class ReconstructionAdapterBase(SimulationModuleBase):
             time_series_sensor_data = apply_b_mode(
                 time_series_sensor_data, method=self.component_settings[Tags.RECONSTRUCTION_BMODE_METHOD])
 
-        reconstruction = self.reconstruction_algorithm(time_series_sensor_data, _device)
+        with measure("reconstruction_algorithm"):
+            reconstruction = self.reconstruction_algorithm(time_series_sensor_data, _device)
 
         # check for B-mode methods and perform envelope detection on time series data if specified
         if Tags.RECONSTRUCTION_BMODE_AFTER_RECONSTRUCTION in self.component_settings \
@@ -89,7 +98,7 @@ class ReconstructionAdapterBase(SimulationModuleBase):
         reconstruction_output_path = generate_dict_path(
             Tags.DATA_FIELD_RECONSTRUCTED_DATA, self.global_settings[Tags.WAVELENGTH])
 
-        save_hdf5(reconstruction, self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH],
-                  reconstruction_output_path)
+        save_hdf5(cast_to_data_precision(reconstruction, self.global_settings),
+                  self.global_settings[Tags.SIMPA_OUTPUT_FILE_PATH], reconstruction_output_path)
 
         self.logger.info("Performing reconstruction...[Done]")
@@ -7,5 +7,8 @@ from simpa.core.simulation_modules.reconstruction_module import ReconstructionAd
 
 class ReconstructionTestAdapter(ReconstructionAdapterBase):
 
+    def uses_random_numbers(self) -> bool:
+        return False
+
     def reconstruction_algorithm(self, time_series_sensor_data, detection_geometry):
         return time_series_sensor_data / 10 + 5
@@ -6,6 +6,7 @@ from simpa.core.simulation_modules.reconstruction_module.reconstruction_utils im
 from simpa.utils import Tags, round_x5_away_from_zero
 from simpa.utils.matlab import generate_matlab_cmd
 from simpa.utils.settings import Settings
+from simpa.utils.telemetry import measure
 from simpa.core.simulation_modules.reconstruction_module import ReconstructionAdapterBase
 from simpa.core.device_digital_twins import LinearArrayDetectionGeometry
 import numpy as np
@@ -29,6 +30,10 @@ class TimeReversalAdapter(ReconstructionAdapterBase):
 
     """
 
+    def uses_random_numbers(self) -> bool:
+        # the time reversal is run in a separate MATLAB process and does not use numpy's random state
+        return False
+
     def get_acoustic_properties(self, input_data: dict, detection_geometry):
         """
         This method extracts the acoustic tissue properties from the settings dictionary and
@@ -176,7 +181,8 @@ class TimeReversalAdapter(ReconstructionAdapterBase):
         cur_dir = os.getcwd()
         os.chdir(self.global_settings[Tags.SIMULATION_PATH])
         self.logger.info(cmd)
-        subprocess.run(cmd)
+        with measure("matlab_subprocess"):
+            subprocess.run(cmd)
 
         reconstructed_data = sio.loadmat(acoustic_path + "tr.mat")[Tags.DATA_FIELD_RECONSTRUCTED_DATA]
 
@@ -5,6 +5,7 @@
 from simpa.core.simulation_modules.volume_creation_module import VolumeCreationAdapterBase
 from simpa.utils.libraries.structure_library import priority_sorted_structures
 from simpa.utils import Tags
+from simpa.utils.data_precision import cast_to_data_precision
 import numpy as np
 from simpa.utils import create_deformation_settings
 import torch
@@ -112,6 +113,6 @@ class ModelBasedAdapter(VolumeCreationAdapterBase):
 
         # convert volumes back to CPU
         for key in volumes.keys():
-            volumes[key] = volumes[key].cpu().numpy().astype(np.float64, copy=False)
+            volumes[key] = cast_to_data_precision(volumes[key], self.global_settings, np.float64)
 
         return volumes
@@ -4,6 +4,7 @@
 
 from simpa.core.simulation_modules.volume_creation_module import VolumeCreationAdapterBase
 from simpa.utils import Tags
+from simpa.utils.data_precision import cast_to_data_precision
 import numpy as np
 import torch
 
@@ -57,6 +58,6 @@ class SegmentationBasedAdapter(VolumeCreationAdapterBase):
 
         # convert volumes back to CPU
         for key in volumes.keys():
-            volumes[key] = volumes[key].numpy().astype(np.float64, copy=False)
+            volumes[key] = cast_to_data_precision(volumes[key], self.global_settings, np.float64)
 
         return volumes
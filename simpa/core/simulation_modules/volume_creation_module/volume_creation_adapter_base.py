@@ -5,7 +5,7 @@
 from abc import abstractmethod
 from simpa.utils.settings import Settings
 from simpa.utils import Tags
-from simpa.utils.constants import wavelength_independent_properties, property_tags
+from simpa.utils.constants import wavelength_independent_properties, wavelength_dependent_properties, property_tags
 import torch
 from simpa.core.simulation_modules import SimulationModuleBase
 from simpa.io_handling import save_data_field
@@ -28,6 +28,15 @@ class VolumeCreationAdapterBase(SimulationModuleBase):
         """
         return self.global_settings.get_volume_creation_settings()
 
+    def get_input_data_fields(self) -> list:
+        return []
+
+    def get_output_data_fields(self) -> list:
+        # Wavelength-independent properties are only created in the first wavelength run
+        if self.global_settings[Tags.WAVELENGTH] != self.global_settings[Tags.WAVELENGTHS][0]:
+            return list(wavelength_dependent_properties)
+        return list(property_tags)
+
     def create_empty_volumes(self):
         volumes = dict()
         voxel_spacing = self.global_settings[Tags.SPACING_MM]
@@ -6,3 +6,10 @@ from simpa.io_handling.io_hdf5 import load_hdf5
 from simpa.io_handling.io_hdf5 import save_hdf5
 from simpa.io_handling.io_hdf5 import load_data_field
 from simpa.io_handling.io_hdf5 import save_data_field
+from simpa.io_handling.io_hdf5 import open_data_field
+from simpa.io_handling.io_hdf5 import memory_map_data_field
+from simpa.io_handling.io_hdf5 import HDF5FileSession
+from simpa.io_handling.hdf5_index import index_hdf5
+from simpa.io_handling.sharded_dataset import ShardedDatasetWriter, ShardedDatasetReader
+from simpa.io_handling.torch_dataset import SimulationDataset, create_data_loader
+from simpa.io_handling.storage_backend import StorageBackendBase, ZarrStorageBackend, register_storage_backend
@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import h5py
+from simpa.io_handling.io_hdf5 import _hdf5_file
+from simpa.io_handling.storage_backend import get_storage_backend
+from simpa.utils import Tags
+
+# Groups of the SIMPA output format that contain data fields, from the most to the least specific one.
+DATA_FIELD_GROUPS = ["/" + Tags.SIMULATIONS + "/" + Tags.SIMULATION_PROPERTIES + "/",
+                     "/" + Tags.SIMULATIONS + "/" + Tags.OPTICAL_MODEL_OUTPUT_NAME + "/",
+                     "/" + Tags.SIMULATIONS + "/",
+                     "/" + Tags.IMAGE_PROCESSING + "/"]
+
+
+def _parse_wavelength(name: str):
+    """
+    Returns the wavelength encoded in the name of a group or None if the name is not a wavelength.
+    """
+    try:
+        wavelength = float(name)
+    except ValueError:
+        return None
+    if wavelength.is_integer():
+        return int(wavelength)
+    return wavelength
+
+
+def _get_dataset_info(dataset: h5py.Dataset) -> dict:
+    return {
+        "shape": dataset.shape,
+        "dtype": str(dataset.dtype),
+        "nbytes": dataset.size * dataset.dtype.itemsize,
+        "storage_size": dataset.id.get_storage_size(),
+        "compression": dataset.compression,
+        "chunks": dataset.chunks
+    }
+
+
+def _create_index(simpa_version, array_infos: dict) -> dict:
+    """
+    Assigns the arrays of a SIMPA output file to their data fields and wavelengths, see index_hdf5.
+
+    :param simpa_version: the SIMPA version that created the file or None.
+    :param array_infos: dictionary that maps the path of every array in the file to its metadata.
+    """
+    data_fields = dict()
+    datasets = dict()
+
+    for path, array_info in array_infos.items():
+        for group in DATA_FIELD_GROUPS:
+            if path.startswith(group):
+                break
+        else:
+            continue
+        relative_path = path[len(group):].split("/")
+        data_field = relative_path[0]
+        wavelengths = data_fields.setdefault(data_field, set())
+        if len(relative_path) > 1:
+            wavelength = _parse_wavelength(relative_path[1])
+            if wavelength is not None:
+                wavelengths.add(wavelength)
+        datasets[path] = array_info
+
+    data_fields = {data_field: sorted(wavelengths) for data_field, wavelengths in sorted(data_fields.items())}
+    all_wavelengths = set()
+    for wavelengths in data_fields.values():
+        all_wavelengths.update(wavelengths)
+
+    return {
+        "simpa_version": simpa_version,
+        "wavelengths": sorted(all_wavelengths),
+        "data_fields": data_fields,
+        "datasets": datasets
+    }
+
+
+def index_hdf5(file_path: str) -> dict:
+    """
+    Creates an index of the data fields in a SIMPA output file. Only the metadata of the HDF5 objects is read,
+    i.e. neither the contents of the datasets nor the settings are loaded, such that large numbers of files can
+    be scanned quickly. The returned dictionary contains
+
+    - "simpa_version": the SIMPA version that created the file or None,
+    - "wavelengths": the sorted list of all wavelengths for which data fields are stored,
+    - "data_fields": a dictionary that maps every data field to the sorted list of its wavelengths. The list is
+      empty for wavelength-independent data fields,
+    - "datasets": a dictionary that maps the path of every dataset that belongs to a data field to its
+      "shape", "dtype", size in memory ("nbytes"), size in the file ("storage_size"), "compression" and "chunks".
+
+    Files of other storage backends, e.g. Zarr stores, are indexed with StorageBackendBase.get_array_infos.
+
+    :param file_path: Path of the hdf5 file or of the store of another storage backend.
+    :returns: Dictionary
+    """
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        try:
+            simpa_version = storage_backend.load(file_path, "/" + Tags.SIMPA_VERSION + "/")
+        except KeyError:
+            simpa_version = None
+        return _create_index(simpa_version, storage_backend.get_array_infos(file_path))
+
+    array_infos = dict()
+
+    def visit(name, item):
+        if isinstance(item, h5py.Dataset):
+            array_infos["/" + name] = _get_dataset_info(item)
+
+    with _hdf5_file(file_path, "r") as h5file:
+        simpa_version = None
+        if Tags.SIMPA_VERSION in h5file and isinstance(h5file[Tags.SIMPA_VERSION], h5py.Dataset):
+            simpa_version = h5file[Tags.SIMPA_VERSION][()]
+            if isinstance(simpa_version, bytes):
+                simpa_version = simpa_version.decode("utf-8")
+        for root_group in [Tags.SIMULATIONS, Tags.IMAGE_PROCESSING]:
+            if root_group in h5file:
+                h5file[root_group].visititems(lambda name, item: visit(root_group + "/" + name, item))
+
+    return _create_index(simpa_version, array_infos)
+
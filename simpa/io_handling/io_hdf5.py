@@ -2,17 +2,153 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
+import json
+import os
+import threading
+from contextlib import contextmanager
 import h5py
-from simpa.io_handling.serialization import SERIALIZATION_MAP
+from simpa.io_handling.serialization import SERIALIZATION_MAP, serialize_to_json, deserialize_from_json, \
+    remove_key_from_json
+from simpa.io_handling.storage_backend import get_storage_backend, get_chunk_shape, COMPRESSION_ATTRIBUTE, \
+    CHUNK_SHAPES_ATTRIBUTE, SERIALIZATION_ATTRIBUTE, JSON_SERIALIZATION
 from simpa.utils.dict_path_manager import generate_dict_path
 import numpy as np
 from simpa.log import Logger
 from simpa.utils.serializer import SerializableSIMPAClass
+from simpa.utils.telemetry import measured
 
 logger = Logger()
 
+# HDF5 files must not be opened concurrently by several threads, e.g. when pipeline elements are
+# run in parallel. All file accesses are therefore serialised with this lock.
+_hdf5_file_lock = threading.RLock()
 
-def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_compression: str = None):
+# Groups that contain compactly serialised metadata are marked with SERIALIZATION_ATTRIBUTE. They contain the
+# serialised object as JSON document in JSON_DATASET and the arrays referenced by the document as separate datasets.
+JSON_DATASET = "json"
+
+
+def _open_hdf5_file(file_path: str, mode: str) -> h5py.File:
+    """
+    Opens an hdf5 file. New files track the space that is freed when datasets are deleted or resized across
+    sessions, such that it can be reused by datasets that are written later on instead of growing the file.
+    """
+    if mode == "w" or (mode == "a" and not os.path.exists(file_path)):
+        return h5py.File(file_path, "w", fs_strategy="fsm", fs_persist=True)
+    return h5py.File(file_path, mode)
+
+
+# Open file handles of the active HDF5FileSessions by absolute file path. Each entry holds the handle and the
+# number of sessions that currently use it.
+_open_sessions = dict()
+
+
+class HDF5FileSession:
+    """
+    Keeps a single handle of an hdf5 file open while the session is active. All calls to the functions of this
+    module that access the file within the session reuse this handle instead of opening and closing the file on
+    every call, which requires parsing the superblock and the metadata of the file each time::
+
+        with HDF5FileSession(settings[Tags.SIMPA_OUTPUT_FILE_PATH]) as session:
+            save_data_field(data, settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.DATA_FIELD_FLUENCE, 800)
+            session.flush()
+
+    The file is opened for reading and writing. Sessions of the same file can be nested and share the handle,
+    which is closed when the outermost session ends. As long as a session is active, the file must not be written
+    by other processes. Sessions of files that are stored by another storage backend have no effect.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: Path of the hdf5 file. The file is created if it does not exist.
+        """
+        self.file_path = os.path.abspath(file_path)
+        self.is_hdf5_file = get_storage_backend(file_path) is None
+
+    def __enter__(self):
+        if not self.is_hdf5_file:
+            return self
+        with _hdf5_file_lock:
+            if self.file_path in _open_sessions:
+                _open_sessions[self.file_path][1] += 1
+            else:
+                _open_sessions[self.file_path] = [_open_hdf5_file(self.file_path, "a"), 1]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.is_hdf5_file:
+            return
+        with _hdf5_file_lock:
+            session = _open_sessions[self.file_path]
+            session[1] -= 1
+            if session[1] == 0:
+                del _open_sessions[self.file_path]
+                session[0].close()
+
+    def flush(self):
+        """
+        Writes all buffered changes to the file, e.g. at the end of a pipeline stage.
+        """
+        with _hdf5_file_lock:
+            if self.file_path in _open_sessions:
+                _open_sessions[self.file_path][0].flush()
+
+
+@contextmanager
+def _hdf5_file(file_path: str, mode: str):
+    """
+    Provides the handle of an hdf5 file for the duration of a single access. The handle of an active HDF5FileSession
+    is reused if there is one for the file, otherwise the file is opened with the given mode and closed afterwards.
+    The accesses of all threads are serialised.
+    """
+    with _hdf5_file_lock:
+        session = _open_sessions.get(os.path.abspath(file_path))
+        if session is None:
+            with _open_hdf5_file(file_path, mode) as h5file:
+                yield h5file
+        else:
+            h5file = session[0]
+            if mode == "w":
+                for key in list(h5file.keys()):
+                    del h5file[key]
+                for key in list(h5file.attrs.keys()):
+                    del h5file.attrs[key]
+            yield h5file
+
+
+def _is_compact_node(item) -> bool:
+    return isinstance(item, h5py.Group) and item.attrs.get(SERIALIZATION_ATTRIBUTE) == JSON_SERIALIZATION
+
+
+def _save_compact_node(h5file: h5py.File, node_path: str, item, compression: str = None):
+    """
+    Stores an object and everything it contains in a single group: a JSON document with the structure and the
+    values of the object as well as one dataset per large array. Compared to one dataset per value, this
+    reduces the number of HDF5 objects of settings and device trees from thousands to a few.
+    """
+    document, arrays = serialize_to_json(item)
+    if node_path in h5file:
+        del h5file[node_path]
+    group = h5file.create_group(node_path)
+    group.attrs[SERIALIZATION_ATTRIBUTE] = JSON_SERIALIZATION
+    group[JSON_DATASET] = document
+    for array_name, array in arrays.items():
+        group.create_dataset(array_name, data=array, compression=compression if array.ndim > 0 else None)
+
+
+def _load_compact_node(group: h5py.Group):
+    """
+    Restores the object that was stored by _save_compact_node.
+    """
+    document = group[JSON_DATASET][()]
+    if isinstance(document, bytes):
+        document = document.decode("utf-8")
+    return deserialize_from_json(document, lambda array_name: group[array_name][()])
+
+
+@measured("hdf5_save")
+def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_compression: str = None,
+              chunk_shapes: dict = None, compact_metadata: bool = True):
     """
     Saves a dictionary with arbitrary content or an item of any kind to an hdf5-file with given filepath.
 
@@ -20,10 +156,24 @@ def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_c
     :param file_path: Path of the file to save the dictionary in.
     :param file_dictionary_path: Path in dictionary structure of existing hdf5 file to store the dictionary in.
     :param file_compression: possible file compression for the hdf5 output file. Values are: gzip, lzf and szip.
+        Arrays are written as chunked, compressed datasets. If a new file is created, the compression is stored in
+        the file and used for all arrays that are written to it later on without an explicit file_compression.
+    :param chunk_shapes: dictionary that maps group or dataset names, e.g. data fields, to the chunk shapes of the
+        arrays stored below them. Entries of None span the full axis, such that e.g. [None, None, 1] stores a volume
+        in z-slabs. If a new file is created, the chunk shapes are stored in the file and used for all arrays that
+        are written to it later on without explicit chunk_shapes. Arrays without a chunk shape are chunked
+        automatically if they are compressed and stored contiguously otherwise.
+    :param compact_metadata: if True, serializable SIMPA objects such as settings and devices are stored as a
+        single JSON document with the arrays they contain as separate datasets. Otherwise, every value is stored as
+        a dataset of its own. Both layouts can be loaded by load_hdf5.
     :returns: :mod:`Null`
     """
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        storage_backend.save(save_item, file_path, file_dictionary_path, file_compression, chunk_shapes)
+        return
 
-    def data_grabber(file, path, data_dictionary, compression: str = None):
+    def data_grabber(file, path, data_dictionary, compression: str = None, chunks: dict = None):
         """
         Helper function which recursively grabs data from dictionaries in order to store them into hdf5 groups.
 
@@ -31,14 +181,20 @@ def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_c
         :param path: Current group path in hdf5 file group structure.
         :param data_dictionary: Dictionary to save.
         :param compression: possible file compression for the corresponding dataset. Values are: gzip, lzf and szip.
+        :param chunks: chunk shapes of the datasets as described for save_hdf5.
         """
 
         for key, item in data_dictionary.items():
             key = str(key)
             if isinstance(item, SerializableSIMPAClass):
+                if compact_metadata:
+                    _save_compact_node(h5file, path + key, item, compression)
+                    continue
+                if _is_compact_node(h5file.get(path + key)):
+                    del h5file[path + key]
                 serialized_item = item.serialize()
 
-                data_grabber(file, path + key + "/", serialized_item, file_compression)
+                data_grabber(file, path + key + "/", serialized_item, compression, chunks)
             elif not isinstance(item, (list, dict, type(None))):
 
                 if isinstance(item, (bytes, int, np.int64, float, str, bool, np.bool_)):
@@ -49,15 +205,25 @@ def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_c
                         h5file[path + key] = item
                 else:
                     c = None
-                    if isinstance(item, np.ndarray):
+                    chunk_shape = None
+                    if isinstance(item, np.ndarray) and item.ndim > 0:
                         c = compression
+                        chunk_shape = get_chunk_shape(chunks, path + key, item.shape)
+                        if chunk_shape is True and c is None:
+                            chunk_shape = None
+                        existing_item = h5file.get(path + key)
+                        if isinstance(existing_item, h5py.Dataset) and existing_item.shape == item.shape and \
+                                existing_item.dtype == item.dtype:
+                            # overwrite the data in place instead of allocating a new dataset
+                            existing_item[...] = item
+                            continue
 
                     try:
-                        h5file.create_dataset(path + key, data=item, compression=c)
+                        h5file.create_dataset(path + key, data=item, compression=c, chunks=chunk_shape)
                     except (OSError, RuntimeError, ValueError):
                         del h5file[path + key]
                         try:
-                            h5file.create_dataset(path + key, data=item, compression=c)
+                            h5file.create_dataset(path + key, data=item, compression=c, chunks=chunk_shape)
                         except RuntimeError as e:
                             logger.critical("item " + str(item) + " of type " + str(type(item)) +
                                             " was not serializable! Full exception: " + str(e))
@@ -77,41 +243,68 @@ def save_hdf5(save_item, file_path: str, file_dictionary_path: str = "/", file_c
                 for i, list_item in enumerate(item):
                     list_dict[str(i)] = list_item
                 try:
-                    data_grabber(file, path + key + "/list/", list_dict, file_compression)
+                    data_grabber(file, path + key + "/list/", list_dict, compression, chunks)
                 except TypeError as e:
                     logger.critical("The key " + str(key) + " was not of the correct typing for HDF5 handling."
                                     "Make sure this key is not a tuple.")
                     raise e
             else:
-                data_grabber(file, path + key + "/", item, file_compression)
+                if _is_compact_node(h5file.get(path + key)):
+                    del h5file[path + key]
+                data_grabber(file, path + key + "/", item, compression, chunks)
+
+    def file_level_compression(h5file):
+        if file_compression is not None:
+            if writing_mode == "w":
+                h5file.attrs[COMPRESSION_ATTRIBUTE] = file_compression
+            return file_compression
+        return h5file.attrs.get(COMPRESSION_ATTRIBUTE, None)
+
+    def file_level_chunk_shapes(h5file):
+        if chunk_shapes is not None:
+            if writing_mode == "w":
+                h5file.attrs[CHUNK_SHAPES_ATTRIBUTE] = json.dumps(chunk_shapes, default=int)
+            return chunk_shapes
+        if CHUNK_SHAPES_ATTRIBUTE in h5file.attrs:
+            return json.loads(h5file.attrs[CHUNK_SHAPES_ATTRIBUTE])
+        return None
 
     if file_dictionary_path == "/":
         writing_mode = "w"
     else:
         writing_mode = "a"
 
-    if isinstance(save_item, SerializableSIMPAClass):
+    if isinstance(save_item, SerializableSIMPAClass) and (file_dictionary_path == "/" or not compact_metadata):
         save_item = save_item.serialize()
-    if isinstance(save_item, dict):
-        with h5py.File(file_path, writing_mode) as h5file:
-            data_grabber(h5file, file_dictionary_path, save_item, file_compression)
+    if isinstance(save_item, dict) and not isinstance(save_item, SerializableSIMPAClass):
+        with _hdf5_file(file_path, writing_mode) as h5file:
+            data_grabber(h5file, file_dictionary_path, save_item, file_level_compression(h5file),
+                         file_level_chunk_shapes(h5file))
     else:
         save_key = file_dictionary_path.split("/")[-2]
         dictionary = {save_key: save_item}
         file_dictionary_path = "/".join(file_dictionary_path.split("/")[:-2]) + "/"
-        with h5py.File(file_path, writing_mode) as h5file:
-            data_grabber(h5file, file_dictionary_path, dictionary, file_compression)
+        with _hdf5_file(file_path, writing_mode) as h5file:
+            data_grabber(h5file, file_dictionary_path, dictionary, file_level_compression(h5file),
+                         file_level_chunk_shapes(h5file))
 
 
-def load_hdf5(file_path, file_dictionary_path="/"):
+@measured("hdf5_load")
+def load_hdf5(file_path, file_dictionary_path="/", region=None):
     """
     Loads a dictionary from an hdf5 file.
 
     :param file_path: Path of the file to load the dictionary from.
     :param file_dictionary_path: Path in dictionary structure of hdf5 file to lo the dictionary in.
+    :param region: index expression, e.g. a slice or a tuple of slices, that selects the part of a dataset that is
+        loaded. Only the chunks that intersect the region are read from the file. Can only be used if
+        file_dictionary_path points to a dataset.
     :returns: Dictionary
     :rtype: dict
     """
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        return storage_backend.load(file_path, file_dictionary_path, region=region)
 
     def data_grabber(file, path):
         """
@@ -122,6 +315,9 @@ def load_hdf5(file_path, file_dictionary_path="/"):
         :returns: Dictionary or np.array
         """
 
+        if _is_compact_node(h5file[path]):
+            return _load_compact_node(h5file[path])
+
         if isinstance(h5file[path], h5py._hl.dataset.Dataset):
             if isinstance(h5file[path][()], bytes):
                 return h5file[path][()].decode("utf-8")
@@ -166,16 +362,225 @@ def load_hdf5(file_path, file_dictionary_path="/"):
                     dictionary[key] = data_grabber(file, path + key + "/")
         return dictionary
 
-    with h5py.File(file_path, "r") as h5file:
+    with _hdf5_file(file_path, "r") as h5file:
+        if region is not None:
+            if not isinstance(h5file[file_dictionary_path], h5py.Dataset):
+                msg = f"A region can only be loaded from a dataset, but {file_dictionary_path} is a group."
+                logger.critical(msg)
+                raise ValueError(msg)
+            return h5file[file_dictionary_path][region]
         return data_grabber(h5file, file_dictionary_path)
 
 
-def load_data_field(file_path, data_field, wavelength=None):
+def load_data_field(file_path, data_field, wavelength=None, region=None):
+    """
+    Loads a data field from an hdf5 file.
+
+    :param file_path: Path of the hdf5 file.
+    :param data_field: Data field to load.
+    :param wavelength: Wavelength of the data field.
+    :param region: index expression, e.g. np.s_[:, :, 10], that selects the part of the data field that is loaded.
+        Per default, the complete data field is loaded.
+    """
     path = generate_dict_path(data_field, wavelength=wavelength)
-    data = load_hdf5(file_path, path)
+    data = load_hdf5(file_path, path, region=region)
     return data
 
 
-def save_data_field(data, file_path, data_field, wavelength=None):
+def save_data_field(data, file_path, data_field, wavelength=None, chunk_shape=None):
+    """
+    Saves a data field to an hdf5 file.
+
+    :param data: Data to save.
+    :param file_path: Path of the hdf5 file.
+    :param data_field: Data field to save.
+    :param wavelength: Wavelength of the data field.
+    :param chunk_shape: chunk shape of the data field as described for save_hdf5. Per default, the chunk shape
+        that is stored in the file for the data field is used.
+    """
     dict_path = generate_dict_path(data_field, wavelength=wavelength)
-    save_hdf5(data, file_path, dict_path)
+    chunk_shapes = None if chunk_shape is None else {data_field: chunk_shape}
+    save_hdf5(data, file_path, dict_path, chunk_shapes=chunk_shapes)
+
+
+@measured("hdf5_save")
+def save_hdf5_region(data, file_path: str, file_dictionary_path: str, region, shape: tuple, dtype=None):
+    """
+    Writes an array into a part of the dataset at the given path of an hdf5 file, such that large arrays can be
+    written block by block without holding them in memory. If there is no dataset of the given shape and type at
+    the path yet, it is created and filled with zeros, using the compression and chunk shapes stored in the file.
+
+    :param data: the data of the region.
+    :param file_path: Path of the hdf5 file.
+    :param file_dictionary_path: Path of the dataset in the hdf5 file, e.g. generate_dict_path(data_field).
+    :param region: index expression, e.g. np.s_[10:20], that selects the part of the dataset that is written.
+    :param shape: shape of the complete dataset.
+    :param dtype: type of the complete dataset. Per default, the type of data is used.
+    :returns: :mod:`Null`
+    """
+    data = np.asarray(data)
+    shape = tuple(int(axis_length) for axis_length in shape)
+    dtype = data.dtype if dtype is None else np.dtype(dtype)
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        storage_backend.save_region(data, file_path, file_dictionary_path, region, shape, dtype)
+        return
+
+    path = file_dictionary_path.rstrip("/")
+    with _hdf5_file(file_path, "a") as h5file:
+        dataset = h5file.get(path)
+        if not (isinstance(dataset, h5py.Dataset) and dataset.shape == shape and dataset.dtype == dtype):
+            if dataset is not None:
+                del h5file[path]
+            compression = h5file.attrs.get(COMPRESSION_ATTRIBUTE, None)
+            chunk_shapes = json.loads(h5file.attrs[CHUNK_SHAPES_ATTRIBUTE]) \
+                if CHUNK_SHAPES_ATTRIBUTE in h5file.attrs else None
+            chunk_shape = get_chunk_shape(chunk_shapes, path, shape)
+            if chunk_shape is True and compression is None:
+                chunk_shape = None
+            dataset = h5file.create_dataset(path, shape=shape, dtype=dtype, compression=compression,
+                                            chunks=chunk_shape, fillvalue=0)
+        dataset[region] = data
+
+
+@contextmanager
+def open_data_field(file_path, data_field, wavelength=None):
+    """
+    Opens a data field of an hdf5 file without loading it. The returned h5py dataset (or the corresponding array of
+    another storage backend) can be sliced like a numpy array and only reads the requested parts from the file. It
+    is only valid within the context::
+
+        with open_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 800) as fluence:
+            central_slice = fluence[:, fluence.shape[1] // 2, :]
+
+    :param file_path: Path of the hdf5 file.
+    :param data_field: Data field to open.
+    :param wavelength: Wavelength of the data field.
+    :returns: h5py.Dataset
+    """
+    path = generate_dict_path(data_field, wavelength=wavelength)
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        yield storage_backend.open(file_path, path)
+        return
+    with _hdf5_file(file_path, "r") as h5file:
+        yield h5file[path]
+
+
+def memory_map_data_field(file_path, data_field, wavelength=None) -> np.memmap:
+    """
+    Maps a data field of an hdf5 file into memory. This is only possible for uncompressed data fields that are
+    stored contiguously, i.e. if Tags.DO_FILE_COMPRESSION was set to False and no chunk shape was given.
+
+    :param file_path: Path of the hdf5 file.
+    :param data_field: Data field to map.
+    :param wavelength: Wavelength of the data field.
+    :returns: read-only np.memmap
+    """
+    path = generate_dict_path(data_field, wavelength=wavelength)
+    if get_storage_backend(file_path) is not None:
+        msg = f"Only data fields of hdf5 files can be memory mapped, but {file_path} is not an hdf5 file."
+        logger.critical(msg)
+        raise ValueError(msg)
+    with _hdf5_file(file_path, "r") as h5file:
+        dataset = h5file[path]
+        h5file.flush()
+        offset = dataset.id.get_offset()
+        shape = dataset.shape
+        dtype = dataset.dtype
+        if dataset.chunks is not None or offset is None:
+            msg = f"The data field {path} is not stored contiguously and can therefore not be memory mapped."
+            logger.critical(msg)
+            raise ValueError(msg)
+    return np.memmap(file_path, mode="r", dtype=dtype, shape=shape, offset=offset)
+
+
+def delete_hdf5_entries(file_path: str, key: str, file_dictionary_path: str = "/", parent_key: str = None):
+    """
+    Deletes all datasets and groups with the given name below the given path of an hdf5 file without
+    loading any data into memory. Entries with the given name are removed from compactly stored metadata as well.
+
+    :param file_path: Path of the hdf5 file.
+    :param key: Name of the datasets and groups to delete.
+    :param file_dictionary_path: Path in dictionary structure of the hdf5 file to search for the key in.
+    :param parent_key: if given, only entries whose parent is named parent_key are deleted, e.g.
+        Tags.VOLUME_CREATION_MODEL_SETTINGS[0] to leave entries of the same name in other settings unchanged.
+    :returns: :mod:`Null`
+    """
+    storage_backend = get_storage_backend(file_path)
+    if storage_backend is not None:
+        storage_backend.delete_entries(file_path, key, file_dictionary_path, parent_key)
+        return
+
+    def remove_key_from_compact_node(node: h5py.Group):
+        document = node[JSON_DATASET][()]
+        if isinstance(document, bytes):
+            document = document.decode("utf-8")
+        document, removed_arrays = remove_key_from_json(document, key, parent_key, node.name.split("/")[-1])
+        if document is not None:
+            del node[JSON_DATASET]
+            node[JSON_DATASET] = document
+            for array_name in removed_arrays:
+                del node[array_name]
+
+    with _hdf5_file(file_path, "a") as h5file:
+        if file_dictionary_path not in h5file:
+            return
+        group = h5file[file_dictionary_path]
+        if _is_compact_node(group):
+            remove_key_from_compact_node(group)
+            return
+        matches = []
+        compact_nodes = []
+
+        def visit(name, item):
+            names = [group.name.split("/")[-1]] + name.split("/")
+            # groups of serialized SIMPA classes, e.g. "Settings", belong to the entry they are stored under
+            parent_names = [parent_name for parent_name in names[:-1] if parent_name not in SERIALIZATION_MAP]
+            if names[-1] == key and (parent_key is None or parent_names[-1:] == [parent_key]):
+                matches.append(name)
+            elif _is_compact_node(item):
+                compact_nodes.append(name)
+
+        group.visititems(visit)
+        for name in matches:
+            if name in group:
+                del group[name]
+        for name in compact_nodes:
+            if name in group:
+                remove_key_from_compact_node(group[name])
+
+
+def repack_hdf5(file_path: str, min_free_space_fraction: float = 0.05) -> bool:
+    """
+    Releases the space of deleted or resized datasets by copying the content of the given hdf5 file into a new
+    file. The objects are copied within HDF5 group by group, such that no data is loaded into memory and chunking
+    and compression of all datasets are kept. Files that do not track their free space, i.e. files that were not
+    created by SIMPA, are not repacked.
+
+    :param file_path: Path of the hdf5 file.
+    :param min_free_space_fraction: the file is only repacked if the fraction of free space in the file exceeds
+        this value.
+    :returns: True if the file was repacked.
+    """
+    if get_storage_backend(file_path) is not None:
+        return False
+    with _hdf5_file_lock:
+        if os.path.abspath(file_path) in _open_sessions:
+            msg = f"The file {file_path} cannot be repacked while an HDF5FileSession is active."
+            logger.critical(msg)
+            raise RuntimeError(msg)
+        with h5py.File(file_path, "r") as h5file:
+            free_space = h5file.id.get_freespace()
+        if free_space <= min_free_space_fraction * os.path.getsize(file_path):
+            return False
+
+        repacked_file_path = file_path + ".repack"
+        with h5py.File(file_path, "r") as source, _open_hdf5_file(repacked_file_path, "w") as target:
+            for key, value in source.attrs.items():
+                target.attrs[key] = value
+            for key in source.keys():
+                source.copy(source[key], target, name=key)
+        os.replace(repacked_file_path, file_path)
+        logger.debug(f"Repacked {file_path} to release {free_space} bytes.")
+        return True
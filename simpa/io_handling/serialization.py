@@ -4,13 +4,135 @@
 
 from simpa.log.file_logger import Logger
 from simpa.utils import Spectrum, Molecule, Settings
+from simpa.utils import serializer
 from simpa.utils.libraries.molecule_library import MolecularComposition
 from simpa.core.device_digital_twins import *
 
 import inspect
+import json
 import sys
+from typing import Callable, Tuple
+import numpy as np
 
 members = inspect.getmembers(sys.modules[__name__], inspect.isclass)
 SERIALIZATION_MAP = dict()
 for member in members:
     SERIALIZATION_MAP[member[0]] = member[1]
+
+# Arrays up to this size are stored within JSON documents, larger arrays are stored separately.
+MAX_INLINE_ARRAY_SIZE = 1024
+_INLINE_ARRAY_KEY = "__simpa_array__"
+_ARRAY_REFERENCE_KEY = "__simpa_array_dataset__"
+
+
+def serialize_to_json(item) -> Tuple[str, dict]:
+    """
+    Serializes an object, e.g. a Settings instance or a digital device twin, into a JSON document. Small numeric
+    arrays are contained in the document, larger arrays are returned separately and referenced by their name.
+
+    :param item: the object to serialize.
+    :returns: the JSON document and a dictionary that maps the names of the referenced arrays to the arrays.
+    :raises TypeError: if the object contains values that cannot be serialized.
+    """
+    arrays = dict()
+
+    def encode(value):
+        if isinstance(value, serializer.SerializableSIMPAClass):
+            return encode(value.serialize())
+        if isinstance(value, dict):
+            return {str(key): encode(dict_item) for key, dict_item in value.items()}
+        if isinstance(value, list):
+            return [encode(list_item) for list_item in value]
+        if isinstance(value, tuple) or (hasattr(value, "__array__") and not isinstance(value, np.generic)):
+            # e.g. torch tensors are stored as arrays like in the legacy layout
+            value = np.asarray(value)
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind in "biuf" and value.size <= MAX_INLINE_ARRAY_SIZE:
+                return {_INLINE_ARRAY_KEY: value.tolist(), "dtype": value.dtype.str, "shape": list(value.shape)}
+            array_name = f"array_{len(arrays)}"
+            arrays[array_name] = value
+            return {_ARRAY_REFERENCE_KEY: array_name}
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        if value is None:
+            # None is restored as "None" like in the legacy layout, which the deserializers rely on
+            return "None"
+        if isinstance(value, (str, int, float, bool)):
+            return value
+        msg = f"The value {value} of type {type(value)} is not serializable."
+        Logger().critical(msg)
+        raise TypeError(msg)
+
+    return json.dumps(encode(item)), arrays
+
+
+def deserialize_from_json(document: str, load_array: Callable[[str], np.ndarray]):
+    """
+    Restores an object that was serialized with serialize_to_json.
+
+    :param document: the JSON document.
+    :param load_array: function that loads a referenced array by its name.
+    :returns: the deserialized object.
+    """
+
+    def decode(value):
+        if isinstance(value, list):
+            return [decode(list_item) for list_item in value]
+        if not isinstance(value, dict):
+            return value
+        if _INLINE_ARRAY_KEY in value:
+            return np.asarray(value[_INLINE_ARRAY_KEY], dtype=value["dtype"]).reshape(value["shape"])
+        if _ARRAY_REFERENCE_KEY in value:
+            return load_array(value[_ARRAY_REFERENCE_KEY])
+        dictionary = {key: decode(dict_item) for key, dict_item in value.items()}
+        for key, dict_item in dictionary.items():
+            if key in SERIALIZATION_MAP and isinstance(dict_item, dict):
+                return SERIALIZATION_MAP[key].deserialize(dict_item)
+        return dictionary
+
+    return decode(json.loads(document))
+
+
+def remove_key_from_json(document: str, key: str, parent_key: str = None,
+                         root_key: str = None) -> Tuple[str, list]:
+    """
+    Removes all entries with the given key from a JSON document that was created by serialize_to_json.
+
+    :param document: the JSON document.
+    :param key: the key to remove.
+    :param parent_key: if given, the key is only removed from dictionaries that are stored under parent_key.
+    :param root_key: the name under which the document itself is stored, e.g. the name of the group.
+    :returns: the new document or None if the key was not found, and the names of the arrays that are no longer
+        referenced.
+    """
+    removed_arrays = []
+
+    def collect_arrays(value):
+        if isinstance(value, list):
+            for list_item in value:
+                collect_arrays(list_item)
+        elif isinstance(value, dict):
+            if _ARRAY_REFERENCE_KEY in value:
+                removed_arrays.append(value[_ARRAY_REFERENCE_KEY])
+            for dict_item in value.values():
+                collect_arrays(dict_item)
+
+    def remove_key(value, value_key) -> bool:
+        if isinstance(value, list):
+            return any([remove_key(list_item, value_key) for list_item in value])
+        if not isinstance(value, dict) or _INLINE_ARRAY_KEY in value or _ARRAY_REFERENCE_KEY in value:
+            return False
+        removed = False
+        if key in value and (parent_key is None or value_key == parent_key):
+            collect_arrays(value.pop(key))
+            removed = True
+        # serialized SIMPA classes, e.g. {"Settings": {...}}, belong to the key they are stored under
+        return any([remove_key(dict_item, value_key if dict_key in SERIALIZATION_MAP else dict_key)
+                    for dict_key, dict_item in value.items()]) or removed
+
+    tree = json.loads(document)
+    if not remove_key(tree, root_key):
+        return None, []
+    return json.dumps(tree), removed_arrays
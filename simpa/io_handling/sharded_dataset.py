@@ -0,0 +1,403 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import glob
+import hashlib
+import json
+import os
+from typing import List, Optional
+
+import h5py
+import numpy as np
+
+from simpa.io_handling.io_hdf5 import load_hdf5, load_data_field, _save_compact_node, _load_compact_node, \
+    _open_hdf5_file
+from simpa.io_handling.serialization import serialize_to_json
+from simpa.log import Logger
+from simpa.utils import Tags, Settings
+from simpa.utils.dict_path_manager import generate_dict_path
+
+# Name of the file that contains the index table and the deduplicated metadata of a sharded dataset.
+INDEX_FILE_NAME = "index.hdf5"
+# Group of the index file that contains the columns of the index table.
+INDEX_GROUP = "index"
+# Group of the index file that contains the metadata documents by their content hash.
+METADATA_GROUP = "metadata"
+# Name pattern of the shard files.
+SHARD_FILE_NAME = "shard_{:05d}.hdf5"
+
+
+def _get_dataset_path(data_field: str, wavelength) -> str:
+    """
+    Returns the path of a data field within a shard. Wavelength-independent data fields are stored once per sample.
+    """
+    return generate_dict_path(data_field, wavelength=wavelength).strip("/")
+
+
+def _is_wavelength_dependent(data_field: str) -> bool:
+    return generate_dict_path(data_field, wavelength=0) != generate_dict_path(data_field)
+
+
+def _hash_document(document: str, arrays: dict) -> str:
+    content_hash = hashlib.sha256(document.encode("utf-8"))
+    for array_name in sorted(arrays.keys()):
+        array = np.ascontiguousarray(arrays[array_name])
+        content_hash.update(array_name.encode("utf-8"))
+        content_hash.update(array.dtype.str.encode("utf-8"))
+        content_hash.update(str(array.shape).encode("utf-8"))
+        content_hash.update(array.tobytes())
+    return content_hash.hexdigest()
+
+
+class ShardedDatasetWriter:
+    """
+    Collects selected data fields of many simulations in a sharded dataset, e.g. to generate training data for
+    machine learning. The data fields of all samples are appended to shared arrays, whose first axis is the sample
+    axis, in shard files with at most samples_per_shard samples each. Every sample is a chunk of its own, such that
+    batches of consecutive samples can be read contiguously instead of opening one file per sample::
+
+        with ShardedDatasetWriter("training_data", [Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_FLUENCE],
+                                  wavelengths=[800], samples_per_shard=1000) as writer:
+            for simpa_output_path in simpa_output_paths:
+                writer.append(simpa_output_path)
+
+    The shards use the dictionary paths of the SIMPA output files, so that a sample can also be loaded with
+    load_data_field(shard_path, data_field, wavelength, region=position).
+
+    The settings and the digital device twin of the samples are split into components, i.e. the device, every
+    group of settings such as the acoustic model settings and the remaining global settings. Every distinct
+    component is stored only once in the index file together with an index table that maps every sample to its
+    shard, its position within the shard, its source file and its metadata. Only one writer must write to a
+    directory at a time.
+    """
+
+    def __init__(self, directory: str, data_fields: List[str], wavelengths: Optional[list] = None,
+                 samples_per_shard: int = 1000, file_compression: Optional[str] = "gzip"):
+        """
+        :param directory: directory of the dataset. It is created if it does not exist. An existing dataset in the
+            directory is continued.
+        :param data_fields: the data fields that are stored for every sample.
+        :param wavelengths: the wavelengths that are stored for wavelength-dependent data fields. Per default, the
+            wavelengths of the first sample are used.
+        :param samples_per_shard: the maximum number of samples per shard file.
+        :param file_compression: compression filter of the shards, e.g. gzip or lzf, or None.
+        """
+        self.logger = Logger()
+        if samples_per_shard < 1:
+            msg = f"The number of samples per shard must be at least 1 but was {samples_per_shard}."
+            self.logger.critical(msg)
+            raise ValueError(msg)
+        self.directory = directory
+        self.data_fields = list(data_fields)
+        self.wavelengths = None if wavelengths is None else list(wavelengths)
+        self.samples_per_shard = samples_per_shard
+        self.file_compression = file_compression
+        self.index_path = os.path.join(directory, INDEX_FILE_NAME)
+
+        self._index = {"source": [], "shard": [], "position": [], "metadata": []}
+        self._metadata_hashes = set()
+        self._shard_file = None
+        self._shard_index = 0
+        self._shard_size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            self._continue_dataset()
+
+    def _continue_dataset(self):
+        with h5py.File(self.index_path, "r") as index_file:
+            if json.loads(index_file.attrs["data_fields"]) != self.data_fields:
+                msg = f"The dataset in {self.directory} contains the data fields " \
+                      f"{json.loads(index_file.attrs['data_fields'])} instead of {self.data_fields}."
+                self.logger.critical(msg)
+                raise ValueError(msg)
+            self.wavelengths = json.loads(index_file.attrs["wavelengths"])
+            for column in self._index:
+                values = index_file[INDEX_GROUP][column][()]
+                self._index[column] = [value.decode("utf-8") if isinstance(value, bytes) else int(value)
+                                       for value in values]
+            self._metadata_hashes = set(index_file[METADATA_GROUP].keys())
+        if len(self._index["shard"]) > 0:
+            self._shard_index = max(self._index["shard"])
+            self._shard_size = self._index["shard"].count(self._shard_index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._index["source"])
+
+    def _get_shard_file(self) -> h5py.File:
+        if self._shard_size >= self.samples_per_shard:
+            self._close_shard()
+            self._shard_index += 1
+            self._shard_size = 0
+        if self._shard_file is None:
+            self._shard_file = _open_hdf5_file(os.path.join(self.directory,
+                                                            SHARD_FILE_NAME.format(self._shard_index)), "a")
+        return self._shard_file
+
+    def _close_shard(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+            self._write_index()
+
+    def _append_to_shard(self, shard_file: h5py.File, dataset_path: str, data: np.ndarray):
+        if dataset_path not in shard_file:
+            # the arrays are allocated for the full shard, such that they are not resized for every sample
+            shard_file.create_dataset(dataset_path, shape=(self.samples_per_shard,) + data.shape, dtype=data.dtype,
+                                      chunks=(1,) + data.shape, maxshape=(None,) + data.shape,
+                                      compression=self.file_compression)
+        dataset = shard_file[dataset_path]
+        if dataset.shape[1:] != data.shape:
+            msg = f"All samples must have the same shape, but {dataset_path} has the shape {data.shape} instead " \
+                  f"of {dataset.shape[1:]}."
+            self.logger.critical(msg)
+            raise ValueError(msg)
+        if dataset.shape[0] <= self._shard_size:
+            dataset.resize(self.samples_per_shard, axis=0)
+        dataset[self._shard_size] = data
+
+    def _store_metadata(self, item) -> str:
+        document, arrays = serialize_to_json(item)
+        metadata_hash = _hash_document(document, arrays)
+        if metadata_hash not in self._metadata_hashes:
+            with _open_hdf5_file(self.index_path, "a") as index_file:
+                _save_compact_node(index_file, METADATA_GROUP + "/" + metadata_hash, item, self.file_compression)
+            self._metadata_hashes.add(metadata_hash)
+        return metadata_hash
+
+    def append_sample(self, data: dict, settings: Optional[dict] = None, device=None, source: str = ""):
+        """
+        Appends a sample to the dataset.
+
+        :param data: dictionary that maps the data fields to the data, or for wavelength-dependent data fields to
+            a dictionary that maps the wavelengths to the data.
+        :param settings: the settings of the simulation of the sample.
+        :param device: the digital device twin of the simulation of the sample.
+        :param source: the file the sample originates from.
+        """
+        samples = dict()
+        for data_field in self.data_fields:
+            if data_field not in data:
+                msg = f"The data field {data_field} is missing in the sample {source}."
+                self.logger.critical(msg)
+                raise KeyError(msg)
+            if _is_wavelength_dependent(data_field):
+                for wavelength in self.wavelengths:
+                    samples[_get_dataset_path(data_field, wavelength)] = np.asarray(data[data_field][wavelength])
+            else:
+                samples[_get_dataset_path(data_field, None)] = np.asarray(data[data_field])
+
+        metadata_components = dict()
+        if settings is not None:
+            global_settings = dict()
+            for key, value in settings.items():
+                if isinstance(value, dict):
+                    metadata_components[Tags.SETTINGS + "/" + key] = self._store_metadata(value)
+                else:
+                    global_settings[key] = value
+            metadata_components[Tags.SETTINGS] = self._store_metadata(global_settings)
+        if device is not None:
+            metadata_components[Tags.DIGITAL_DEVICE] = self._store_metadata(device)
+        metadata_hash = self._store_metadata(metadata_components)
+
+        shard_file = self._get_shard_file()
+        for dataset_path, sample in samples.items():
+            self._append_to_shard(shard_file, dataset_path, sample)
+
+        self._index["source"].append(str(source))
+        self._index["shard"].append(self._shard_index)
+        self._index["position"].append(self._shard_size)
+        self._index["metadata"].append(metadata_hash)
+        self._shard_size += 1
+
+    def append(self, file_path: str):
+        """
+        Appends the selected data fields, the settings and the digital device twin of a SIMPA output file to
+        the dataset.
+
+        :param file_path: Path of the SIMPA output file.
+        """
+        settings = load_hdf5(file_path, generate_dict_path(Tags.SETTINGS))
+        if self.wavelengths is None:
+            self.wavelengths = list(settings[Tags.WAVELENGTHS])
+        device = None
+        try:
+            device = load_hdf5(file_path, generate_dict_path(Tags.DIGITAL_DEVICE))
+        except KeyError:
+            self.logger.warning(f"The file {file_path} does not contain a digital device twin.")
+
+        data = dict()
+        for data_field in self.data_fields:
+            if _is_wavelength_dependent(data_field):
+                data[data_field] = {wavelength: load_data_field(file_path, data_field, wavelength)
+                                    for wavelength in self.wavelengths}
+            else:
+                data[data_field] = load_data_field(file_path, data_field)
+        self.append_sample(data, settings, device, source=file_path)
+
+    def _write_index(self):
+        with _open_hdf5_file(self.index_path, "a") as index_file:
+            index_file.attrs["data_fields"] = json.dumps(self.data_fields)
+            index_file.attrs["wavelengths"] = json.dumps(self.wavelengths, default=float)
+            index_file.attrs["samples_per_shard"] = self.samples_per_shard
+            index_file.require_group(METADATA_GROUP)
+            if INDEX_GROUP in index_file:
+                del index_file[INDEX_GROUP]
+            index_group = index_file.create_group(INDEX_GROUP)
+            for column in ["source", "metadata"]:
+                index_group.create_dataset(column, data=np.asarray(self._index[column], dtype=object),
+                                           dtype=h5py.string_dtype())
+            for column in ["shard", "position"]:
+                index_group.create_dataset(column, data=np.asarray(self._index[column], dtype=np.int64))
+
+    def close(self):
+        """
+        Closes the current shard and writes the index table. The arrays of the last shard are truncated to the
+        number of samples it contains.
+        """
+        if self._shard_file is not None:
+            for dataset_path in _list_datasets(self._shard_file):
+                dataset = self._shard_file[dataset_path]
+                if dataset.shape[0] > self._shard_size:
+                    # only the unused chunks are released, as every sample is a chunk of its own
+                    dataset.resize(self._shard_size, axis=0)
+        self._close_shard()
+        if len(self) == 0 and not os.path.exists(self.index_path):
+            return
+        self._write_index()
+
+
+def _list_datasets(h5file: h5py.File) -> list:
+    datasets = []
+    h5file.visititems(lambda name, item: datasets.append(name) if isinstance(item, h5py.Dataset) else None)
+    return datasets
+
+
+class ShardedDatasetReader:
+    """
+    Reads the samples of a dataset that was written by the ShardedDatasetWriter.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: directory of the dataset.
+        """
+        self.logger = Logger()
+        self.directory = directory
+        index_path = os.path.join(directory, INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            msg = f"The directory {directory} does not contain a sharded dataset."
+            self.logger.critical(msg)
+            raise FileNotFoundError(msg)
+        self.index_path = index_path
+        with h5py.File(index_path, "r") as index_file:
+            self.data_fields = json.loads(index_file.attrs["data_fields"])
+            self.wavelengths = json.loads(index_file.attrs["wavelengths"])
+            self.samples_per_shard = int(index_file.attrs["samples_per_shard"])
+            self.sources = [source.decode("utf-8") if isinstance(source, bytes) else source
+                            for source in index_file[INDEX_GROUP]["source"][()]]
+            self.metadata_hashes = [metadata_hash.decode("utf-8") if isinstance(metadata_hash, bytes)
+                                    else metadata_hash for metadata_hash in index_file[INDEX_GROUP]["metadata"][()]]
+            self.shards = index_file[INDEX_GROUP]["shard"][()]
+            self.positions = index_file[INDEX_GROUP]["position"][()]
+        # the metadata components of the samples by the hash of their metadata
+        self._metadata_components = dict()
+
+    def __len__(self):
+        return len(self.sources)
+
+    @property
+    def shard_paths(self) -> list:
+        """
+        The paths of all shard files of the dataset.
+        """
+        return sorted(glob.glob(os.path.join(self.directory, SHARD_FILE_NAME.replace("{:05d}", "*"))))
+
+    def locate(self, index: int) -> tuple:
+        """
+        Returns the path of the shard that contains a sample and the position of the sample within the shard.
+
+        :param index: index of the sample.
+        :returns: tuple of the shard path and the position
+        """
+        return (os.path.join(self.directory, SHARD_FILE_NAME.format(int(self.shards[index]))),
+                int(self.positions[index]))
+
+    def load_sample(self, index: int, data_fields: Optional[list] = None, wavelengths: Optional[list] = None) -> dict:
+        """
+        Loads the data fields of a sample.
+
+        :param index: index of the sample.
+        :param data_fields: the data fields to load. Per default, all data fields are loaded.
+        :param wavelengths: the wavelengths to load. Per default, all wavelengths are loaded.
+        :returns: dictionary that maps the data fields to the data, or for wavelength-dependent data fields to a
+            dictionary that maps the wavelengths to the data.
+        """
+        data_fields = self.data_fields if data_fields is None else data_fields
+        wavelengths = self.wavelengths if wavelengths is None else wavelengths
+        shard_path, position = self.locate(index)
+        sample = dict()
+        with h5py.File(shard_path, "r") as shard_file:
+            for data_field in data_fields:
+                if _is_wavelength_dependent(data_field):
+                    sample[data_field] = {wavelength: shard_file[_get_dataset_path(data_field, wavelength)][position]
+                                          for wavelength in wavelengths}
+                else:
+                    sample[data_field] = shard_file[_get_dataset_path(data_field, None)][position]
+        return sample
+
+    def load_metadata_hashes(self, index: int) -> dict:
+        """
+        Returns the content hashes of the metadata components of a sample without loading the components. Samples
+        with the same hash share the component.
+
+        :param index: index of the sample.
+        :returns: dictionary that maps the global settings (Tags.SETTINGS), the settings dictionaries
+            (Tags.SETTINGS + "/" + key) and the device (Tags.DIGITAL_DEVICE) to their hashes if they were stored for
+            the sample.
+        """
+        metadata_hash = self.metadata_hashes[index]
+        if metadata_hash not in self._metadata_components:
+            with h5py.File(self.index_path, "r") as index_file:
+                self._metadata_components[metadata_hash] = _load_compact_node(
+                    index_file[METADATA_GROUP][metadata_hash])
+        return self._metadata_components[metadata_hash]
+
+    def load_metadata_component(self, metadata_hash: str):
+        """
+        Loads a metadata component by its content hash, see load_metadata_hashes.
+
+        :param metadata_hash: the hash of the component.
+        :returns: the component
+        """
+        with h5py.File(self.index_path, "r") as index_file:
+            return _load_compact_node(index_file[METADATA_GROUP][metadata_hash])
+
+    def load_metadata(self, index: int) -> dict:
+        """
+        Loads the settings and the digital device twin of a sample.
+
+        :param index: index of the sample.
+        :returns: dictionary with the settings (Tags.SETTINGS) and the device (Tags.DIGITAL_DEVICE) if they were
+            stored for the sample.
+        """
+        metadata = dict()
+        with h5py.File(self.index_path, "r") as index_file:
+            metadata_group = index_file[METADATA_GROUP]
+            components = _load_compact_node(metadata_group[self.metadata_hashes[index]])
+            if Tags.SETTINGS in components:
+                settings = Settings(_load_compact_node(metadata_group[components[Tags.SETTINGS]]))
+                for component, metadata_hash in components.items():
+                    if component.startswith(Tags.SETTINGS + "/"):
+                        settings[component[len(Tags.SETTINGS) + 1:]] = _load_compact_node(metadata_group[metadata_hash])
+                metadata[Tags.SETTINGS] = settings
+            if Tags.DIGITAL_DEVICE in components:
+                metadata[Tags.DIGITAL_DEVICE] = _load_compact_node(metadata_group[components[Tags.DIGITAL_DEVICE]])
+        return metadata
@@ -0,0 +1,319 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+from simpa.io_handling.serialization import serialize_to_json, deserialize_from_json, remove_key_from_json, \
+    SERIALIZATION_MAP
+from simpa.log import Logger
+from simpa.utils.serializer import SerializableSIMPAClass
+
+# Name of the attribute that stores the compression that is applied to all arrays written to a file.
+COMPRESSION_ATTRIBUTE = "simpa_file_compression"
+# Name of the attribute that stores the chunk shapes of the arrays written to a file.
+CHUNK_SHAPES_ATTRIBUTE = "simpa_chunk_shapes"
+# Groups that contain compactly serialised metadata are marked with this attribute.
+SERIALIZATION_ATTRIBUTE = "simpa_serialization"
+JSON_SERIALIZATION = "json"
+
+
+def get_chunk_shape(chunk_shapes: dict, dataset_path: str, shape: tuple):
+    """
+    Determines the chunk shape of a dataset. The chunk shape of the innermost group or dataset name in the path
+    of the dataset that is listed in chunk_shapes is used, e.g. the chunk shape given for "fluence" for the dataset
+    "/simulations/optical_forward_model_output/fluence/700". Entries of None span the full axis.
+
+    :returns: the chunk shape or True for automatic chunking.
+    """
+    if not chunk_shapes or 0 in shape:
+        return True
+    for name in reversed(dataset_path.strip("/").split("/")):
+        if name in chunk_shapes:
+            chunk_shape = chunk_shapes[name]
+            if len(chunk_shape) != len(shape):
+                Logger().warning(f"The chunk shape {chunk_shape} for {name} does not match the shape {shape} of "
+                                 f"{dataset_path}. Using automatic chunking instead.")
+                return True
+            return tuple(int(chunk_length) if isinstance(chunk_length, (int, np.integer)) and
+                         0 < chunk_length < axis_length else axis_length
+                         for chunk_length, axis_length in zip(chunk_shape, shape))
+    return True
+
+
+class StorageBackendBase(ABC):
+    """
+    Base class of the storage backends that can be used instead of HDF5 files by save_hdf5, load_hdf5,
+    save_data_field and load_data_field. A storage backend is chosen based on the file extension of the file path
+    (see register_storage_backend) and uses the same dictionary paths as the HDF5 files (see generate_dict_path).
+    """
+
+    def __init__(self):
+        self.logger = Logger()
+
+    @abstractmethod
+    def save(self, save_item, file_path: str, file_dictionary_path: str = "/", file_compression: str = None,
+             chunk_shapes: dict = None):
+        """
+        Saves an item at the given path. See save_hdf5 for a description of the parameters.
+        """
+        pass
+
+    @abstractmethod
+    def load(self, file_path: str, file_dictionary_path: str = "/", region=None):
+        """
+        Loads the item at the given path. See load_hdf5 for a description of the parameters.
+        """
+        pass
+
+    @abstractmethod
+    def open(self, file_path: str, file_dictionary_path: str):
+        """
+        Returns an array-like object for the array at the given path that loads the requested parts lazily when
+        it is sliced.
+        """
+        pass
+
+    @abstractmethod
+    def delete_entries(self, file_path: str, key: str, file_dictionary_path: str = "/", parent_key: str = None):
+        """
+        Deletes all entries with the given name below the given path. If parent_key is given, only entries whose
+        parent is named parent_key are deleted. See delete_hdf5_entries.
+        """
+        pass
+
+    @abstractmethod
+    def get_array_infos(self, file_path: str) -> dict:
+        """
+        Returns the metadata of all arrays in the file without loading their contents. The path of every array,
+        e.g. "/simulations/optical_forward_model_output/fluence/700", is mapped to its "shape", "dtype", size in
+        memory ("nbytes"), size in the file ("storage_size"), "compression" and "chunks". See index_hdf5.
+        """
+        pass
+
+    def save_region(self, data: np.ndarray, file_path: str, file_dictionary_path: str, region, shape: tuple,
+                    dtype: np.dtype):
+        """
+        Writes an array into a part of the array at the given path. See save_hdf5_region.
+        Per default, the complete array is loaded, the region is assigned and the complete array is saved again.
+        Backends that can write parts of arrays should override this method.
+        """
+        file_dictionary_path = "/" + file_dictionary_path.strip("/") + "/"
+        try:
+            array = self.load(file_path, file_dictionary_path)
+        except KeyError:
+            array = None
+        if not (isinstance(array, np.ndarray) and array.shape == shape and array.dtype == dtype):
+            array = np.zeros(shape, dtype=dtype)
+        array[region] = data
+        self.save(array, file_path, file_dictionary_path)
+
+
+class ZarrStorageBackend(StorageBackendBase):
+    """
+    Stores the simulation results in a Zarr directory store. Every array is stored as a chunked, compressed Zarr
+    array in its own directory, such that several processes or threads can write different data fields, e.g. the
+    results of different wavelengths, to the same store at the same time. Settings, devices and all other values
+    that are not arrays are stored as JSON documents like the compact metadata of the HDF5 files.
+
+    The backend requires the optional zarr package (pip install simpa[zarr]) and is used for all file paths that
+    end with ".zarr". The gzip compression is supported as is, all other compression filters are replaced by the
+    blosc compressor with lz4, which is fast like lzf.
+    """
+
+    def __init__(self):
+        super(ZarrStorageBackend, self).__init__()
+        try:
+            import zarr
+            import numcodecs
+        except ImportError as e:
+            msg = "The Zarr storage backend requires the zarr package. Install it with 'pip install simpa[zarr]'."
+            self.logger.critical(msg)
+            raise ImportError(msg) from e
+        self.zarr = zarr
+        self.numcodecs = numcodecs
+
+    def _get_compressor(self, compression: Optional[str]):
+        if compression is None:
+            return None
+        if compression == "gzip":
+            return self.numcodecs.GZip()
+        return self.numcodecs.Blosc(cname="lz4")
+
+    def _is_compact_node(self, item) -> bool:
+        return isinstance(item, self.zarr.hierarchy.Group) and \
+            item.attrs.get(SERIALIZATION_ATTRIBUTE) == JSON_SERIALIZATION
+
+    def save(self, save_item, file_path: str, file_dictionary_path: str = "/", file_compression: str = None,
+             chunk_shapes: dict = None):
+        writing_mode = "w" if file_dictionary_path == "/" else "a"
+        root = self.zarr.open_group(file_path, mode=writing_mode)
+
+        if file_compression is not None:
+            if writing_mode == "w":
+                root.attrs[COMPRESSION_ATTRIBUTE] = file_compression
+        else:
+            file_compression = root.attrs.get(COMPRESSION_ATTRIBUTE, None)
+        if chunk_shapes is not None:
+            if writing_mode == "w":
+                root.attrs[CHUNK_SHAPES_ATTRIBUTE] = chunk_shapes
+        else:
+            chunk_shapes = root.attrs.get(CHUNK_SHAPES_ATTRIBUTE, None)
+        compressor = self._get_compressor(file_compression)
+
+        if isinstance(save_item, SerializableSIMPAClass) and file_dictionary_path == "/":
+            save_item = save_item.serialize()
+        if isinstance(save_item, dict) and not isinstance(save_item, SerializableSIMPAClass):
+            self._save_dictionary(root, file_dictionary_path, save_item, compressor, chunk_shapes)
+        else:
+            save_key = file_dictionary_path.split("/")[-2]
+            file_dictionary_path = "/".join(file_dictionary_path.split("/")[:-2]) + "/"
+            self._save_dictionary(root, file_dictionary_path, {save_key: save_item}, compressor, chunk_shapes)
+
+    def _save_dictionary(self, root, path: str, dictionary: dict, compressor, chunk_shapes: dict):
+        group_path = path.strip("/")
+        group = root.require_group(group_path) if group_path else root
+        for key, item in dictionary.items():
+            key = str(key)
+            existing_item = group[key] if key in group else None
+
+            if isinstance(item, dict) and not isinstance(item, SerializableSIMPAClass):
+                if existing_item is not None and (not isinstance(existing_item, self.zarr.hierarchy.Group) or
+                                                  self._is_compact_node(existing_item)):
+                    del group[key]
+                self._save_dictionary(root, path + key + "/", item, compressor, chunk_shapes)
+                continue
+
+            if not isinstance(item, (SerializableSIMPAClass, list, tuple, np.generic)) and \
+                    hasattr(item, "__array__") and np.ndim(item) > 0:
+                item = np.asarray(item)
+                if isinstance(existing_item, self.zarr.core.Array) and existing_item.shape == item.shape and \
+                        existing_item.dtype == item.dtype:
+                    existing_item[...] = item
+                    continue
+                if existing_item is not None:
+                    del group[key]
+                group.create_dataset(key, data=item, compressor=compressor,
+                                     chunks=get_chunk_shape(chunk_shapes, path + key, item.shape))
+                continue
+
+            document, arrays = serialize_to_json(item)
+            if existing_item is not None:
+                del group[key]
+            node = group.create_group(key)
+            node.attrs.update({SERIALIZATION_ATTRIBUTE: JSON_SERIALIZATION, JSON_SERIALIZATION: document})
+            for array_name, array in arrays.items():
+                node.create_dataset(array_name, data=array, compressor=compressor)
+
+    def _load_item(self, item):
+        if isinstance(item, self.zarr.core.Array):
+            return item[...]
+        if self._is_compact_node(item):
+            return deserialize_from_json(item.attrs[JSON_SERIALIZATION], lambda array_name: item[array_name][...])
+        return {key: self._load_item(child) for key, child in item.items()}
+
+    def load(self, file_path: str, file_dictionary_path: str = "/", region=None):
+        root = self.zarr.open_group(file_path, mode="r")
+        path = file_dictionary_path.strip("/")
+        item = root[path] if path else root
+        if region is not None:
+            if not isinstance(item, self.zarr.core.Array):
+                msg = f"A region can only be loaded from an array, but {file_dictionary_path} is a group."
+                self.logger.critical(msg)
+                raise ValueError(msg)
+            return item[region]
+        return self._load_item(item)
+
+    def open(self, file_path: str, file_dictionary_path: str):
+        return self.zarr.open_group(file_path, mode="r")[file_dictionary_path.strip("/")]
+
+    def save_region(self, data: np.ndarray, file_path: str, file_dictionary_path: str, region, shape: tuple,
+                    dtype: np.dtype):
+        root = self.zarr.open_group(file_path, mode="a")
+        path = file_dictionary_path.strip("/")
+        array = root[path] if path in root else None
+        if not (isinstance(array, self.zarr.core.Array) and array.shape == shape and array.dtype == dtype):
+            if array is not None:
+                del root[path]
+            array = root.create_dataset(path, shape=shape, dtype=dtype, fill_value=0,
+                                        compressor=self._get_compressor(root.attrs.get(COMPRESSION_ATTRIBUTE, None)),
+                                        chunks=get_chunk_shape(root.attrs.get(CHUNK_SHAPES_ATTRIBUTE, None), path,
+                                                               shape))
+        array[region] = data
+
+    def get_array_infos(self, file_path: str) -> dict:
+        array_infos = dict()
+
+        def visit(name, item):
+            if isinstance(item, self.zarr.core.Array):
+                array_infos["/" + name] = {
+                    "shape": item.shape,
+                    "dtype": str(item.dtype),
+                    "nbytes": item.nbytes,
+                    "storage_size": item.nbytes_stored,
+                    "compression": item.compressor.codec_id if item.compressor is not None else None,
+                    "chunks": item.chunks
+                }
+
+        self.zarr.open_group(file_path, mode="r").visititems(visit)
+        return array_infos
+
+    def delete_entries(self, file_path: str, key: str, file_dictionary_path: str = "/", parent_key: str = None):
+        root = self.zarr.open_group(file_path, mode="a")
+        path = file_dictionary_path.strip("/")
+        if path and path not in root:
+            return
+
+        def delete_from_group(group, group_name):
+            if self._is_compact_node(group):
+                document, removed_arrays = remove_key_from_json(group.attrs[JSON_SERIALIZATION], key, parent_key,
+                                                                group_name)
+                if document is not None:
+                    group.attrs[JSON_SERIALIZATION] = document
+                    for array_name in removed_arrays:
+                        del group[array_name]
+                return
+            for child_key in list(group.keys()):
+                if child_key == key and (parent_key is None or group_name == parent_key):
+                    del group[child_key]
+                elif isinstance(group[child_key], self.zarr.hierarchy.Group):
+                    # groups of serialized SIMPA classes belong to the entry they are stored under
+                    delete_from_group(group[child_key], group_name if child_key in SERIALIZATION_MAP else child_key)
+
+        delete_from_group(root[path] if path else root, path.split("/")[-1])
+
+
+# Factories of the storage backends by file extension. HDF5 is used for all other file extensions.
+_STORAGE_BACKEND_FACTORIES = {".zarr": ZarrStorageBackend}
+_storage_backends = dict()
+
+
+def register_storage_backend(file_extension: str, storage_backend_factory):
+    """
+    Registers a storage backend for all file paths with the given extension.
+
+    :param file_extension: the file extension including the dot, e.g. ".zarr".
+    :param storage_backend_factory: callable without arguments that creates the StorageBackendBase instance, e.g.
+        the class of the storage backend.
+    """
+    _STORAGE_BACKEND_FACTORIES[file_extension] = storage_backend_factory
+    _storage_backends.pop(file_extension, None)
+
+
+def get_storage_backend(file_path: str) -> Optional[StorageBackendBase]:
+    """
+    Returns the storage backend for the given file path or None if the file is an HDF5 file.
+
+    :param file_path: Path of the file.
+    :returns: StorageBackendBase or None
+    """
+    file_extension = os.path.splitext(str(file_path).rstrip("/").rstrip(os.sep))[1]
+    if file_extension not in _STORAGE_BACKEND_FACTORIES:
+        return None
+    if file_extension not in _storage_backends:
+        _storage_backends[file_extension] = _STORAGE_BACKEND_FACTORIES[file_extension]()
+    return _storage_backends[file_extension]
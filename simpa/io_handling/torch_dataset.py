@@ -0,0 +1,277 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import glob
+import os
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+import h5py
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+
+from simpa.io_handling.io_hdf5 import load_data_field
+from simpa.io_handling.sharded_dataset import ShardedDatasetReader, INDEX_FILE_NAME, _get_dataset_path, \
+    _is_wavelength_dependent
+from simpa.io_handling.storage_backend import StorageBackendBase, get_storage_backend
+from simpa.log import Logger
+from simpa.utils import Tags, Settings
+from simpa.utils.constants import property_tags, toolkit_tags
+
+
+class _StorageBackendHandle:
+    """
+    Handle of a file of a storage backend (see get_storage_backend), whose arrays are read lazily when they are
+    sliced like the datasets of an h5py.File.
+    """
+
+    def __init__(self, storage_backend: StorageBackendBase, file_path: str):
+        self.storage_backend = storage_backend
+        self.file_path = file_path
+
+    def __getitem__(self, dataset_path: str):
+        return self.storage_backend.open(self.file_path, dataset_path)
+
+    def close(self):
+        pass
+
+
+def _is_simulation_file(file_path: str) -> bool:
+    return file_path.endswith(".hdf5") or get_storage_backend(file_path) is not None
+
+
+class SimulationDataset(Dataset):
+    """
+    A torch Dataset over SIMPA output files and sharded datasets (see ShardedDatasetWriter). Every sample is a
+    dictionary that maps the selected data fields to tensors. The wavelengths of wavelength-dependent data fields are
+    stacked along the first axis::
+
+        dataset = SimulationDataset("simulations", [Tags.DATA_FIELD_RECONSTRUCTED_DATA, Tags.DATA_FIELD_OXYGENATION],
+                                    wavelengths=[750, 850])
+        data_loader = create_data_loader(dataset, batch_size=16, shuffle=True, num_workers=4)
+
+    The files are opened lazily by the process that reads from them, i.e. by every DataLoader worker on its own,
+    and the most recently used handles are kept open. Only the selected data fields, wavelengths and, if the data
+    fields are cropped to the field of view, only the chunks within the field of view are read. Batches of
+    consecutive samples of the same shard are read at once.
+    """
+
+    def __init__(self, sources: Union[str, List[str]], data_fields: List[str], wavelengths: Optional[list] = None,
+                 crop_to_field_of_view: bool = False, crop_data_fields: Optional[List[str]] = None,
+                 max_open_files: int = 16):
+        """
+        :param sources: a directory with SIMPA output files, the directory of a sharded dataset, a SIMPA output file
+            or a list of them. Output files of other storage backends than HDF5, e.g. ".zarr" directories, are
+            supported as well.
+        :param data_fields: the data fields of the samples.
+        :param wavelengths: the wavelengths of the wavelength-dependent data fields. Per default, the wavelengths of
+            the first source are used.
+        :param crop_to_field_of_view: if True, the data fields are cropped to the field of view of the digital device
+            twin of the sample like by the FieldOfViewCropping. Data fields that have already been cropped are not
+            cropped again.
+        :param crop_data_fields: the data fields that are cropped. Per default, the volumes of the tissue properties,
+            the fluence and the initial pressure are cropped.
+        :param max_open_files: the maximum number of files that are kept open by every process.
+        """
+        self.logger = Logger()
+        if max_open_files < 1:
+            msg = f"At least one file must be kept open, but max_open_files was {max_open_files}."
+            self.logger.critical(msg)
+            raise ValueError(msg)
+        self.data_fields = list(data_fields)
+        self.crop_to_field_of_view = crop_to_field_of_view
+        self.crop_data_fields = property_tags + toolkit_tags + [Tags.DATA_FIELD_FLUENCE,
+                                                                Tags.DATA_FIELD_INITIAL_PRESSURE] \
+            if crop_data_fields is None else list(crop_data_fields)
+        self.max_open_files = max_open_files
+
+        # every sample is given by its file, its position within the file or None for SIMPA output files and the
+        # reader of its sharded dataset or None
+        self.samples = []
+        self._readers = []
+        if isinstance(sources, (str, os.PathLike)):
+            sources = [sources]
+        for source in sources:
+            source = str(source)
+            if os.path.isdir(source) and os.path.exists(os.path.join(source, INDEX_FILE_NAME)):
+                reader = ShardedDatasetReader(source)
+                self._readers.append(reader)
+                self.samples += [reader.locate(index) + (len(self._readers) - 1, index)
+                                 for index in range(len(reader))]
+            elif os.path.isdir(source) and get_storage_backend(source) is None:
+                self.samples += [(file_path, None, None, None)
+                                 for file_path in sorted(glob.glob(os.path.join(source, "*")))
+                                 if _is_simulation_file(file_path)]
+            else:
+                self.samples.append((source, None, None, None))
+        if len(self.samples) == 0:
+            msg = f"No samples were found in {sources}."
+            self.logger.critical(msg)
+            raise FileNotFoundError(msg)
+
+        if wavelengths is None:
+            if self.samples[0][2] is not None:
+                wavelengths = self._readers[self.samples[0][2]].wavelengths
+            else:
+                wavelengths = load_data_field(self.samples[0][0], Tags.SETTINGS)[Tags.WAVELENGTHS]
+        self.wavelengths = list(wavelengths)
+
+        self._handles = OrderedDict()
+        self._handles_pid = os.getpid()
+        self._field_of_view_voxels = dict()
+        self._field_of_view_keys = dict()
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getstate__(self):
+        # open file handles cannot be passed to the worker processes
+        state = self.__dict__.copy()
+        state["_handles"] = OrderedDict()
+        return state
+
+    def _get_handle(self, file_path: str) -> Union[h5py.File, _StorageBackendHandle]:
+        if self._handles_pid != os.getpid():
+            # the handles of the parent process must not be used after fork
+            self._handles = OrderedDict()
+            self._handles_pid = os.getpid()
+        if file_path in self._handles:
+            self._handles.move_to_end(file_path)
+            return self._handles[file_path]
+        if len(self._handles) >= self.max_open_files:
+            _, least_recently_used_handle = self._handles.popitem(last=False)
+            least_recently_used_handle.close()
+        storage_backend = get_storage_backend(file_path)
+        if storage_backend is None:
+            handle = h5py.File(file_path, "r")
+        else:
+            handle = _StorageBackendHandle(storage_backend, file_path)
+        self._handles[file_path] = handle
+        return handle
+
+    def close(self):
+        """
+        Closes all open file handles of the current process.
+        """
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = OrderedDict()
+
+    def _get_field_of_view_key(self, sample_index: int):
+        """
+        Returns the key of the field of view of a sample. The field of view of the samples of a sharded dataset only
+        depends on their digital device twin and their spacing, so that it is shared by samples whose other
+        settings differ.
+        """
+        file_path, _, reader_index, index = self.samples[sample_index]
+        if reader_index is None:
+            return file_path
+        if sample_index not in self._field_of_view_keys:
+            reader = self._readers[reader_index]
+            metadata_hashes = reader.load_metadata_hashes(index)
+            spacing = Settings(reader.load_metadata_component(metadata_hashes[Tags.SETTINGS]))[Tags.SPACING_MM]
+            self._field_of_view_keys[sample_index] = (reader_index, metadata_hashes[Tags.DIGITAL_DEVICE], spacing)
+        return self._field_of_view_keys[sample_index]
+
+    def _get_field_of_view_voxels(self, sample_index: int) -> list:
+        from simpa.core.processing_components.monospectral.field_of_view_cropping import get_field_of_view_voxels
+        key = self._get_field_of_view_key(sample_index)
+        if key not in self._field_of_view_voxels:
+            file_path, _, reader_index, _ = self.samples[sample_index]
+            if reader_index is None:
+                spacing = load_data_field(file_path, Tags.SETTINGS)[Tags.SPACING_MM]
+                device = load_data_field(file_path, Tags.DIGITAL_DEVICE)
+            else:
+                _, device_hash, spacing = key
+                device = self._readers[reader_index].load_metadata_component(device_hash)
+            self._field_of_view_voxels[key] = get_field_of_view_voxels(device, spacing, self.logger)
+        return self._field_of_view_voxels[key]
+
+    def _get_region(self, sample_index: int, data_field: str, shape: tuple) -> tuple:
+        """
+        Returns the index expression of the part of a data field of the given shape that is read for a sample.
+        """
+        from simpa.core.processing_components.monospectral.field_of_view_cropping import get_field_of_view_region
+        if not self.crop_to_field_of_view or data_field not in self.crop_data_fields or len(shape) not in [2, 3]:
+            return ()
+        region = get_field_of_view_region(self._get_field_of_view_voxels(sample_index), len(shape))
+        if tuple(axis_region.stop - axis_region.start for axis_region in region) == tuple(shape):
+            return ()
+        return region
+
+    def _get_dataset_paths(self, data_field: str) -> list:
+        if _is_wavelength_dependent(data_field):
+            return [_get_dataset_path(data_field, wavelength) for wavelength in self.wavelengths]
+        return [_get_dataset_path(data_field, None)]
+
+    def _load_samples(self, sample_indices: list) -> List[dict]:
+        """
+        Loads consecutive samples of the same file.
+        """
+        file_path, first_position = self.samples[sample_indices[0]][:2]
+        handle = self._get_handle(file_path)
+        samples = [dict() for _ in sample_indices]
+        for data_field in self.data_fields:
+            arrays = []
+            for dataset_path in self._get_dataset_paths(data_field):
+                dataset = handle[dataset_path]
+                if first_position is None:
+                    region = self._get_region(sample_indices[0], data_field, dataset.shape)
+                    arrays.append(dataset[region][np.newaxis])
+                else:
+                    region = self._get_region(sample_indices[0], data_field, dataset.shape[1:])
+                    positions = slice(first_position, first_position + len(sample_indices))
+                    arrays.append(dataset[(positions,) + region])
+            for sample_position, sample in enumerate(samples):
+                if _is_wavelength_dependent(data_field):
+                    data = np.stack([array[sample_position] for array in arrays])
+                else:
+                    data = arrays[0][sample_position]
+                sample[data_field] = torch.from_numpy(np.ascontiguousarray(data))
+        return samples
+
+    def __getitem__(self, index: int) -> dict:
+        return self._load_samples([index])[0]
+
+    def __getitems__(self, indices: list) -> List[dict]:
+        """
+        Loads a batch of samples. Consecutive samples of the same shard that share their field of view are read with
+        a single access per data field.
+        """
+        samples = []
+        group = [indices[0]]
+        for index in indices[1:]:
+            previous_sample, sample = self.samples[group[-1]], self.samples[index]
+            if sample[1] is not None and sample[0] == previous_sample[0] and sample[1] == previous_sample[1] + 1 and \
+                    (not self.crop_to_field_of_view or
+                     self._get_field_of_view_key(index) == self._get_field_of_view_key(group[-1])):
+                group.append(index)
+            else:
+                samples += self._load_samples(group)
+                group = [index]
+        samples += self._load_samples(group)
+        return samples
+
+
+def create_data_loader(dataset: SimulationDataset, batch_size: int = 1, shuffle: bool = False, num_workers: int = 0,
+                       prefetch_factor: int = 2, **kwargs) -> DataLoader:
+    """
+    Creates a DataLoader for a SimulationDataset. The workers are kept alive between the epochs, so that they keep
+    their open file handles, and every worker loads prefetch_factor batches in advance. The batches are loaded into
+    pinned memory if a GPU is available.
+
+    :param dataset: the dataset.
+    :param batch_size: the number of samples per batch.
+    :param shuffle: if True, the samples are shuffled in every epoch.
+    :param num_workers: the number of worker processes. If 0, the samples are loaded by the main process.
+    :param prefetch_factor: the number of batches that are loaded in advance by every worker.
+    :param kwargs: further arguments of the DataLoader.
+    :returns: DataLoader
+    """
+    kwargs.setdefault("pin_memory", torch.cuda.is_available())
+    if num_workers > 0:
+        kwargs.setdefault("prefetch_factor", prefetch_factor)
+        kwargs.setdefault("persistent_workers", True)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers, **kwargs)
@@ -104,6 +104,32 @@ class Logger(SerializableSIMPAClass):
         """
         self._logger.critical(msg)
 
+    def add_filter(self, log_filter: logging.Filter):
+        """
+        Adds a filter to the logging system. Filters can suppress or redirect log records before they are written
+        to the console and the log file.
+
+        :param log_filter: the filter to add
+        """
+        self._logger.addFilter(log_filter)
+
+    def remove_filter(self, log_filter: logging.Filter):
+        """
+        Removes a filter from the logging system.
+
+        :param log_filter: the filter to remove
+        """
+        self._logger.removeFilter(log_filter)
+
+    def handle(self, record: logging.LogRecord):
+        """
+        Passes an already created log record to the logging system, e.g. to emit records that were held back
+        by a filter.
+
+        :param record: the log record to handle
+        """
+        self._logger.handle(record)
+
     def serialize(self) -> dict:
         return {"Logger": {"Logger": 1}}
 
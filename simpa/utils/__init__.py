@@ -10,58 +10,72 @@ from .libraries.literature_values import MorphologicalTissueProperties
 from .libraries.literature_values import StandardProperties
 from .libraries.literature_values import OpticalTissueProperties
 from .constants import SegmentationClasses
+from .constants import EPS
 
-# Then load classes and methods with an <b>increasing</b> amount of internal dependencies.
-# If there are import errors in the tests, it is probably due to an incorrect
-# initialization order
-from .libraries.spectrum_library import AbsorptionSpectrumLibrary
-from .libraries.spectrum_library import Spectrum
-from .libraries.spectrum_library import view_saved_spectra
-from .libraries.spectrum_library import AnisotropySpectrumLibrary
-from .libraries.spectrum_library import ScatteringSpectrumLibrary
-from .libraries.spectrum_library import get_simpa_internal_absorption_spectra_by_names
+from .dict_path_manager import generate_dict_path
+from .dict_path_manager import get_data_field_from_simpa_output
 
-from .libraries.molecule_library import Molecule, MolecularCompositionGenerator
-from .libraries.molecule_library import MoleculeLibrary
-from .libraries.molecule_library import MOLECULE_LIBRARY
+# All other classes and methods depend on torch, scipy, sklearn or matplotlib and their modules are only imported
+# when they are accessed for the first time.
+from .lazy_import import create_lazy_attributes
 
-from .libraries.tissue_library import TissueLibrary
-from .libraries.tissue_library import TISSUE_LIBRARY
+_LAZY_ATTRIBUTES = {
+    "AbsorptionSpectrumLibrary": ".libraries.spectrum_library",
+    "Spectrum": ".libraries.spectrum_library",
+    "SpectrumRegistry": ".libraries.spectrum_library",
+    "view_saved_spectra": ".libraries.spectrum_library",
+    "AnisotropySpectrumLibrary": ".libraries.spectrum_library",
+    "ScatteringSpectrumLibrary": ".libraries.spectrum_library",
+    "get_simpa_internal_absorption_spectra_by_names": ".libraries.spectrum_library",
 
-from .calculate import calculate_oxygenation
-from .calculate import calculate_gruneisen_parameter_from_temperature
-from .calculate import randomize_uniform
-from .calculate import round_x5_away_from_zero
+    "Molecule": ".libraries.molecule_library",
+    "MolecularCompositionGenerator": ".libraries.molecule_library",
+    "MoleculeLibrary": ".libraries.molecule_library",
+    "MOLECULE_LIBRARY": ".libraries.molecule_library",
 
-from .deformation_manager import create_deformation_settings
-from .deformation_manager import get_functional_from_deformation_settings
+    "TissueLibrary": ".libraries.tissue_library",
+    "TISSUE_LIBRARY": ".libraries.tissue_library",
 
-from .dict_path_manager import generate_dict_path
-from .dict_path_manager import get_data_field_from_simpa_output
+    "calculate_oxygenation": ".calculate",
+    "calculate_gruneisen_parameter_from_temperature": ".calculate",
+    "randomize_uniform": ".calculate",
+    "round_x5_away_from_zero": ".calculate",
 
-from .constants import EPS
+    "create_deformation_settings": ".deformation_manager",
+    "get_functional_from_deformation_settings": ".deformation_manager",
+    "get_deformation_surface_mm": ".deformation_manager",
 
-from .path_manager import PathManager
+    "PathManager": ".path_manager",
 
-from .libraries.structure_library.BackgroundStructure import Background, define_background_structure_settings
-from .libraries.structure_library.CircularTubularStructure import CircularTubularStructure, \
-    define_circular_tubular_structure_settings
-from .libraries.structure_library.EllipticalTubularStructure import EllipticalTubularStructure, \
-    define_elliptical_tubular_structure_settings
-from .libraries.structure_library.HorizontalLayerStructure import HorizontalLayerStructure, \
-    define_horizontal_layer_structure_settings
-from .libraries.structure_library.ParallelepipedStructure import ParallelepipedStructure, \
-    define_parallelepiped_structure_settings
-from .libraries.structure_library.RectangularCuboidStructure import RectangularCuboidStructure, \
-    define_rectangular_cuboid_structure_settings
-from .libraries.structure_library.SphericalStructure import SphericalStructure, define_spherical_structure_settings
-from .libraries.structure_library.VesselStructure import VesselStructure, define_vessel_structure_settings
+    "Background": ".libraries.structure_library.BackgroundStructure",
+    "define_background_structure_settings": ".libraries.structure_library.BackgroundStructure",
+    "CircularTubularStructure": ".libraries.structure_library.CircularTubularStructure",
+    "define_circular_tubular_structure_settings": ".libraries.structure_library.CircularTubularStructure",
+    "EllipticalTubularStructure": ".libraries.structure_library.EllipticalTubularStructure",
+    "define_elliptical_tubular_structure_settings": ".libraries.structure_library.EllipticalTubularStructure",
+    "HorizontalLayerStructure": ".libraries.structure_library.HorizontalLayerStructure",
+    "define_horizontal_layer_structure_settings": ".libraries.structure_library.HorizontalLayerStructure",
+    "ParallelepipedStructure": ".libraries.structure_library.ParallelepipedStructure",
+    "define_parallelepiped_structure_settings": ".libraries.structure_library.ParallelepipedStructure",
+    "RectangularCuboidStructure": ".libraries.structure_library.RectangularCuboidStructure",
+    "define_rectangular_cuboid_structure_settings": ".libraries.structure_library.RectangularCuboidStructure",
+    "SphericalStructure": ".libraries.structure_library.SphericalStructure",
+    "define_spherical_structure_settings": ".libraries.structure_library.SphericalStructure",
+    "VesselStructure": ".libraries.structure_library.VesselStructure",
+    "define_vessel_structure_settings": ".libraries.structure_library.VesselStructure",
 
-# Heterogeneity
+    # Heterogeneity
+    "RandomHeterogeneity": ".libraries.heterogeneity_generator",
+    "BlobHeterogeneity": ".libraries.heterogeneity_generator",
+    "SpectralRandomHeterogeneity": ".libraries.heterogeneity_generator",
+    "SpectralBlobHeterogeneity": ".libraries.heterogeneity_generator",
+    "ImageHeterogeneity": ".libraries.heterogeneity_generator",
+}
 
-from .libraries.heterogeneity_generator import RandomHeterogeneity
-from .libraries.heterogeneity_generator import BlobHeterogeneity
-from .libraries.heterogeneity_generator import ImageHeterogeneity
+__getattr__, __dir__, _lazy_names = create_lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+__all__ = ["Tags", "Settings", "MorphologicalTissueProperties", "StandardProperties", "OpticalTissueProperties",
+           "SegmentationClasses", "EPS", "generate_dict_path", "get_data_field_from_simpa_output"] + _lazy_names
 
 if __name__ == "__main__":
+    from .libraries.spectrum_library import view_saved_spectra
     view_saved_spectra()
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from typing import Optional, Union
+
+import numpy as np
+import torch
+from simpa.log import Logger
+from simpa.utils import Tags, Settings
+
+_DATA_PRECISION_DTYPES = {
+    Tags.DATA_PRECISION_FLOAT64: np.float64,
+    Tags.DATA_PRECISION_FLOAT32: np.float32,
+    Tags.DATA_PRECISION_FLOAT16: np.float16
+}
+
+
+def get_data_precision(global_settings: Settings = None, default_dtype=None) -> Optional[np.dtype]:
+    """
+    Get the floating point type with which the data fields are stored as defined by Tags.DATA_PRECISION.
+
+    :param global_settings: global settings defined by user
+    :type global_settings: Settings
+    :param default_dtype: the type that is used if Tags.DATA_PRECISION is not set.
+    :return: numpy dtype or default_dtype
+    """
+    if global_settings is None or Tags.DATA_PRECISION not in global_settings:
+        return None if default_dtype is None else np.dtype(default_dtype)
+    data_precision = global_settings[Tags.DATA_PRECISION]
+    if data_precision not in _DATA_PRECISION_DTYPES:
+        msg = f"The data precision must be one of {list(_DATA_PRECISION_DTYPES.keys())} but was {data_precision}."
+        Logger().critical(msg)
+        raise ValueError(msg)
+    return np.dtype(_DATA_PRECISION_DTYPES[data_precision])
+
+
+def cast_to_data_precision(data: Union[np.ndarray, torch.Tensor], global_settings: Settings = None,
+                           default_dtype=None) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Casts a floating point data field to the precision defined by Tags.DATA_PRECISION before it is stored. Data
+    fields of other types, e.g. the segmentation, are returned unchanged. As all computations are done in at least
+    single precision, data fields are only cast to half precision if they are within its range.
+
+    :param data: the data field.
+    :param global_settings: global settings defined by user
+    :type global_settings: Settings
+    :param default_dtype: the type that is used if Tags.DATA_PRECISION is not set. If None, the data field is
+        returned unchanged in that case.
+    :return: the data field as numpy array or the unchanged data field
+    """
+    dtype = get_data_precision(global_settings, default_dtype)
+    if dtype is None:
+        return data
+    if isinstance(data, torch.Tensor):
+        data = data.detach().cpu().numpy()
+    if not isinstance(data, np.ndarray) or data.dtype.kind != "f":
+        return data
+    if dtype == np.float16 and np.any(np.abs(data[np.isfinite(data)]) > np.finfo(np.float16).max):
+        Logger().warning("The data field exceeds the range of half precision and is stored in single precision "
+                         "instead.")
+        dtype = np.dtype(np.float32)
+    return data.astype(dtype, copy=False)
@@ -2,11 +2,20 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
-import matplotlib.pyplot as plt
 from simpa.utils import Tags
-from scipy.interpolate import RegularGridInterpolator
+from scipy.interpolate import RegularGridInterpolator, make_interp_spline
 from scipy.ndimage import gaussian_filter
+from collections import OrderedDict
+import hashlib
+import threading
 import numpy as np
+import torch
+
+# Number of deformation surfaces that are kept by get_deformation_surface_mm.
+DEFORMATION_SURFACE_CACHE_SIZE = 8
+
+_deformation_surface_cache = OrderedDict()
+_deformation_surface_cache_lock = threading.Lock()
 
 
 def create_deformation_settings(bounds_mm, maximum_z_elevation_mm=1, filter_sigma=1, cosine_scaling_factor=4):
@@ -46,7 +55,8 @@ def create_deformation_settings(bounds_mm, maximum_z_elevation_mm=1, filter_sigm
 
 def get_functional_from_deformation_settings(deformation_settings: dict):
     """
-    FIXME
+    Creates the cubic scipy interpolator of the deformation surface. The structures use the equivalent
+    get_deformation_surface_mm instead, this function is the reference implementation.
     """
 
     if Tags.DEFORMATION_X_COORDINATES_MM not in deformation_settings:
@@ -66,6 +76,78 @@ def get_functional_from_deformation_settings(deformation_settings: dict):
     return functional_mm
 
 
+def _get_spline_weights(knots_mm: np.ndarray, positions_mm: np.ndarray) -> np.ndarray:
+    """
+    Computes the weights of the knot values for every position, such that the spline through the knot values at the
+    positions is the product of the weights and the knot values. The spline is the cubic not-a-knot spline that
+    RegularGridInterpolator uses along every axis.
+    """
+    degree = min(3, len(knots_mm) - 1)
+    return make_interp_spline(knots_mm, np.eye(len(knots_mm)), k=degree)(positions_mm)
+
+
+def get_deformation_surface_mm(deformation_settings: dict, volume_dimensions_voxels, spacing_mm: float,
+                               torch_device: torch.device = None) -> torch.Tensor:
+    """
+    Evaluates the deformation surface at the voxel positions in the xy-plane of the volume. The result equals the
+    evaluation of get_functional_from_deformation_settings at these positions. As the cubic interpolation is separable,
+    it is computed as the product of the spline weights along x, the elevations at the knots and the spline weights
+    along y.
+
+    The surfaces are cached for every deformation, volume size, spacing and device, such that all structures of a
+    volume and all wavelengths share the same tensor. The returned tensor must therefore not be changed in place.
+
+    :param deformation_settings: the deformation settings, see create_deformation_settings
+    :param volume_dimensions_voxels: the number of voxels along x and y (further dimensions are ignored)
+    :param spacing_mm: the spacing of the volume in mm
+    :param torch_device: the device of the returned tensor (default: CPU)
+    :return: the elevations of the surface in mm with the shape (x dimension, y dimension)
+    """
+    if Tags.DEFORMATION_X_COORDINATES_MM not in deformation_settings:
+        raise KeyError("x coordinates not defined in deformation settings")
+    if Tags.DEFORMATION_Y_COORDINATES_MM not in deformation_settings:
+        raise KeyError("y coordinates not defined in deformation settings")
+    if Tags.DEFORMATION_Z_ELEVATIONS_MM not in deformation_settings:
+        raise KeyError("z elevations not defined in deformation settings")
+
+    torch_device = torch.device("cpu") if torch_device is None else torch.device(torch_device)
+    x_coordinates_mm = np.asarray(deformation_settings[Tags.DEFORMATION_X_COORDINATES_MM], dtype=np.float64)
+    y_coordinates_mm = np.asarray(deformation_settings[Tags.DEFORMATION_Y_COORDINATES_MM], dtype=np.float64)
+    z_elevations_mm = np.asarray(deformation_settings[Tags.DEFORMATION_Z_ELEVATIONS_MM], dtype=np.float64)
+    x_dim, y_dim = int(volume_dimensions_voxels[0]), int(volume_dimensions_voxels[1])
+
+    digest = hashlib.sha1()
+    for array in (x_coordinates_mm, y_coordinates_mm, z_elevations_mm):
+        digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(str(array.shape).encode())
+    key = (digest.hexdigest(), x_dim, y_dim, float(spacing_mm), str(torch_device))
+
+    with _deformation_surface_cache_lock:
+        if key in _deformation_surface_cache:
+            _deformation_surface_cache.move_to_end(key)
+            return _deformation_surface_cache[key]
+
+    x_weights = _get_spline_weights(x_coordinates_mm, np.arange(x_dim) * spacing_mm)
+    y_weights = _get_spline_weights(y_coordinates_mm, np.arange(y_dim) * spacing_mm)
+    x_weights, y_weights, z_elevations_mm = (torch.as_tensor(array, dtype=torch.float64, device=torch_device)
+                                             for array in (x_weights, y_weights, z_elevations_mm))
+    surface_mm = (x_weights @ z_elevations_mm @ y_weights.T).float()
+
+    with _deformation_surface_cache_lock:
+        _deformation_surface_cache[key] = surface_mm
+        while len(_deformation_surface_cache) > DEFORMATION_SURFACE_CACHE_SIZE:
+            _deformation_surface_cache.popitem(last=False)
+    return surface_mm
+
+
+def clear_deformation_surface_cache():
+    """
+    Releases all cached deformation surfaces, e.g. to free GPU memory.
+    """
+    with _deformation_surface_cache_lock:
+        _deformation_surface_cache.clear()
+
+
 if __name__ == "__main__":
     x_bounds = [0, 9]
     y_bounds = [0, 9]
@@ -82,6 +164,7 @@ if __name__ == "__main__":
     values = functional(eval_points)
     max_elevation = -np.min(values)
 
+    import matplotlib.pyplot as plt
     ax = plt.figure().add_subplot(projection='3d')
     ax.plot_surface(eval_points[0], eval_points[1], values, cmap="viridis")
     ax.set_zlim(-max_elevation, 0)
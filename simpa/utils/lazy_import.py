@@ -0,0 +1,45 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import importlib
+import sys
+
+
+def create_lazy_attributes(package_name: str, attributes: dict):
+    """
+    Creates the module level __getattr__ and __dir__ functions (see PEP 562) of a package that imports the module of
+    a public attribute only when the attribute is accessed for the first time, e.g. when an adapter is instantiated.
+    Importing the package therefore does not import the heavy dependencies of its modules::
+
+        __getattr__, __dir__, __all__ = create_lazy_attributes(__name__, {"KWaveAdapter": ".core...k_wave_adapter"})
+
+    Attributes that are not listed are looked up as subpackages or modules of the package, such that e.g.
+    simpa.core can be accessed without importing it explicitly.
+
+    :param package_name: the name of the package, i.e. __name__ within its __init__.py.
+    :param attributes: the module, absolute or relative to the package, that defines each attribute by name.
+    :return: the __getattr__ function, the __dir__ function and the list of all lazy attributes.
+    """
+    package = sys.modules[package_name]
+
+    def __getattr__(name: str):
+        if name.startswith("__"):
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        if name in attributes:
+            value = getattr(importlib.import_module(attributes[name], package_name), name)
+        else:
+            try:
+                value = importlib.import_module(f"{package_name}.{name}")
+            except ModuleNotFoundError as e:
+                if e.name != f"{package_name}.{name}":
+                    raise
+                raise AttributeError(f"module {package_name!r} has no attribute {name!r}") from None
+        # later accesses do not call __getattr__ anymore
+        setattr(package, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(package).keys()) | set(attributes.keys()))
+
+    return __getattr__, __dir__, list(attributes.keys())
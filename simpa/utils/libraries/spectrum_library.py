@@ -5,8 +5,9 @@
 import os
 import inspect
 import glob
+import threading
+from functools import lru_cache
 import numpy as np
-import matplotlib.pylab as plt
 import torch
 from scipy import interpolate
 from simpa.utils.serializer import SerializableSIMPAClass
@@ -25,13 +26,16 @@ class Spectrum(SerializableSIMPAClass, object):
         values_interp (np.ndarray): Interpolated values across a continuous range of wavelengths.
     """
 
-    def __init__(self, spectrum_name: str, wavelengths: np.ndarray, values: np.ndarray):
+    def __init__(self, spectrum_name: str, wavelengths: np.ndarray, values: np.ndarray,
+                 values_interp: np.ndarray = None):
         """
         Initializes a Spectrum instance.
 
         :param spectrum_name: Name of the spectrum.
         :param wavelengths: Array of wavelengths.
         :param values: Corresponding values of the spectrum at each wavelength.
+        :param values_interp: Values of the spectrum interpolated for all integer wavelengths between the minimum
+            and the maximum wavelength. Per default, they are interpolated from the values.
 
         :raises ValueError: If the shape of wavelengths does not match the shape of values.
         """
@@ -48,9 +52,9 @@ class Spectrum(SerializableSIMPAClass, object):
             raise ValueError("The shape of the wavelengths and the values did not match: " +
                              str(torch.Tensor.size(wavelengths)) + " vs " + str(torch.Tensor.size(values)))
 
-        new_wavelengths = torch.arange(self.min_wavelength, self.max_wavelength+1, 1)
-        new_absorptions_function = interpolate.interp1d(self.wavelengths, self.values)
-        self.values_interp = new_absorptions_function(new_wavelengths)
+        if values_interp is None:
+            values_interp = interpolate_spectrum(self.wavelengths, self.values)
+        self.values_interp = values_interp
 
     def get_value_over_wavelength(self) -> np.ndarray:
         """
@@ -114,11 +118,99 @@ class Spectrum(SerializableSIMPAClass, object):
         return deserialized_spectrum
 
 
+def interpolate_spectrum(wavelengths, values) -> np.ndarray:
+    """
+    Linearly interpolates the values of a spectrum for all integer wavelengths between its minimum and maximum
+    wavelength.
+
+    :param wavelengths: Array of wavelengths.
+    :param values: Corresponding values of the spectrum at each wavelength.
+    :return: the interpolated values starting at the minimum wavelength.
+    """
+    new_wavelengths = torch.arange(int(torch.min(torch.as_tensor(wavelengths))),
+                                   int(torch.max(torch.as_tensor(wavelengths))) + 1, 1)
+    new_absorptions_function = interpolate.interp1d(wavelengths, values)
+    return new_absorptions_function(new_wavelengths)
+
+
+@lru_cache(maxsize=None)
+def load_spectrum_table(file_path: str) -> tuple:
+    """
+    Loads a spectrum file of the library and interpolates its values once per process. All spectra that are
+    created from the same file share the interpolated values, which are therefore read-only.
+
+    :param file_path: Path of the .npz file with the wavelengths and the values of the spectrum.
+    :return: the wavelengths, the values and the interpolated values of the spectrum.
+    """
+    numpy_data = np.load(file_path)
+    values = numpy_data["values"]
+    wavelengths = numpy_data["wavelengths"]
+    values_interp = interpolate_spectrum(wavelengths, values)
+    values_interp.flags.writeable = False
+    return wavelengths, values, values_interp
+
+
+class SpectrumRegistry(object):
+    """
+    Process-wide registry of the spectrum files of the spectra libraries. The registry is a singleton, such that
+    every folder is only searched for spectrum files once per process, and spectrum files are only loaded and
+    interpolated when a spectrum of the file is requested for the first time (see load_spectrum_table). Afterwards,
+    spectra are created from the memoised tables, which makes repeated calls of the spectra and molecule libraries,
+    e.g. when tissues are randomised for every structure, inexpensive.
+    """
+    _instance = None
+
+    def __new__(cls):
+        # This pattern can be used to realise a singleton implementation in Python
+        if cls._instance is None:
+            cls._instance = super(SpectrumRegistry, cls).__new__(cls)
+            cls._instance._spectrum_files = dict()
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def get_spectrum_files(self, folder_path: str) -> dict:
+        """
+        Returns the spectrum files of a folder without loading them.
+
+        :param folder_path: Path of the folder containing spectra data files.
+        :return: dictionary of the paths of the .npz files by spectrum name.
+        """
+        folder_path = os.path.abspath(folder_path)
+        with self._lock:
+            if folder_path not in self._spectrum_files:
+                self._spectrum_files[folder_path] = {
+                    os.path.basename(file_path)[:-4]: file_path
+                    for file_path in glob.glob(os.path.join(folder_path, "*.npz"))}
+            return dict(self._spectrum_files[folder_path])
+
+    @staticmethod
+    def get_spectrum(spectrum_name: str, file_path: str) -> Spectrum:
+        """
+        Creates a spectrum from a spectrum file. The file is loaded and interpolated on first access only.
+
+        :param spectrum_name: Name of the spectrum.
+        :param file_path: Path of the .npz file of the spectrum.
+        :return: the spectrum.
+        """
+        wavelengths, values, values_interp = load_spectrum_table(file_path)
+        return Spectrum(spectrum_name=spectrum_name, values=values.copy(), wavelengths=wavelengths.copy(),
+                        values_interp=values_interp)
+
+    def clear(self):
+        """
+        Forgets all spectrum files and loaded tables, e.g. after spectrum files were added to a folder.
+        """
+        with self._lock:
+            self._spectrum_files.clear()
+        load_spectrum_table.cache_clear()
+
+
 class SpectraLibrary(object):
     """
     A library to manage and store spectral data.
 
-    This class provides functionality to load and manage spectra data from specified folders.
+    This class provides functionality to load and manage spectra data from specified folders. The spectrum files are
+    looked up in the SpectrumRegistry and only loaded when a spectrum is requested.
 
     Attributes:
         spectra (list): A list to store spectra objects.
@@ -131,7 +223,8 @@ class SpectraLibrary(object):
         :param folder_name: The name of the folder containing spectra data files.
         :param additional_folder_path: An additional folder path for more spectra data.
         """
-        self.spectra = list()
+        self.spectrum_files = dict()
+        self._spectra = None
         self.add_spectra_from_folder(folder_name)
         if additional_folder_path is not None:
             self.add_spectra_from_folder(additional_folder_path)
@@ -143,12 +236,18 @@ class SpectraLibrary(object):
         :param folder_name: The name of the folder containing spectra data files.
         """
         base_path = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
-        for absorption_spectrum in glob.glob(os.path.join(base_path, folder_name, "*.npz")):
-            name = absorption_spectrum.split(os.path.sep)[-1][:-4]
-            numpy_data = np.load(absorption_spectrum)
-            values = numpy_data["values"]
-            wavelengths = numpy_data["wavelengths"]
-            self.spectra.append(Spectrum(spectrum_name=name, values=values, wavelengths=wavelengths))
+        self.spectrum_files.update(SpectrumRegistry().get_spectrum_files(os.path.join(base_path, folder_name)))
+        self._spectra = None
+
+    @property
+    def spectra(self) -> list:
+        """
+        All spectra of the library. They are loaded on first access.
+        """
+        if self._spectra is None:
+            self._spectra = [SpectrumRegistry.get_spectrum(name, file_path)
+                             for name, file_path in self.spectrum_files.items()]
+        return self._spectra
 
     def __next__(self):
         if self.i > 0:
@@ -166,7 +265,7 @@ class SpectraLibrary(object):
 
         :return: List of spectra names.
         """
-        return [spectrum.spectrum_name for spectrum in self]
+        return list(reversed(self.spectrum_files.keys()))
 
     def get_spectrum_by_name(self, spectrum_name: str) -> Spectrum:
         """
@@ -176,9 +275,8 @@ class SpectraLibrary(object):
         :return: The spectrum with the specified name.
         :raises LookupError: If no spectrum with the given name exists.
         """
-        for spectrum in self:
-            if spectrum.spectrum_name == spectrum_name:
-                return spectrum
+        if spectrum_name in self.spectrum_files:
+            return SpectrumRegistry.get_spectrum(spectrum_name, self.spectrum_files[spectrum_name])
 
         raise LookupError(
             f"No spectrum for the given name exists ({spectrum_name}). Try one of: {self.get_spectra_names()}")
@@ -298,6 +396,7 @@ def view_saved_spectra(save_path=None, mode="absorption"):
     :param save_path: If not None, then the figure will be saved as a PNG file to the destination.
     :param mode: Specifies the type of spectra to visualize ("absorption", "scattering", or "anisotropy").
     """
+    import matplotlib.pylab as plt
     plt.figure(figsize=(11, 8))
     if mode == "absorption":
         for spectrum in AbsorptionSpectrumLibrary():
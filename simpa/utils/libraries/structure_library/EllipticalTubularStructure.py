@@ -76,17 +76,9 @@ class EllipticalTubularStructure(GeometricalStructure):
             radius_margin = 0.7071
 
         if self.do_deformation:
-            # the deformation functional needs mm as inputs and returns the result in reverse indexing order...
-            eval_points = torch.meshgrid(torch.arange(self.volume_dimensions_voxels[0], dtype=torch.float) * self.voxel_spacing,
-                                         torch.arange(self.volume_dimensions_voxels[1], dtype=torch.float) * self.voxel_spacing, indexing='ij')
-            deformation_values_mm = self.deformation_functional_mm(eval_points)
-            deformation_values_mm = deformation_values_mm.reshape(self.volume_dimensions_voxels[0],
-                                                                  self.volume_dimensions_voxels[1], 1, 1)
-            deformation_values_mm = torch.tile(torch.as_tensor(
-                deformation_values_mm, device=self.torch_device), (1, 1, self.volume_dimensions_voxels[2], 3))
-            deformation_values_mm /= self.voxel_spacing
-            target_vector += deformation_values_mm
-            del deformation_values_mm
+            # the deformation surface is shared by all structures and must not be changed in place
+            deformation_values_mm = self.get_deformation_surface_mm()
+            target_vector += (deformation_values_mm / self.voxel_spacing)[:, :, None, None]
         cylinder_vector = torch.subtract(end_voxels, start_voxels)
 
         main_axis_length = radius_voxels/(1-eccentricity**2)**0.25
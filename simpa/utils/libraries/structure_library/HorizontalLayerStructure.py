@@ -64,13 +64,9 @@ class HorizontalLayerStructure(GeometricalStructure):
         target_vector_voxels -= start_voxels
         target_vector_voxels = target_vector_voxels[:, :, :, 2]
         if self.do_deformation:
-            # the deformation functional needs mm as inputs and returns the result in reverse indexing order...
-            eval_points = torch.meshgrid(torch.arange(self.volume_dimensions_voxels[0], dtype=torch.float) * self.voxel_spacing,
-                                         torch.arange(self.volume_dimensions_voxels[1], dtype=torch.float) * self.voxel_spacing, indexing='ij')
-            deformation_values_mm = self.deformation_functional_mm(eval_points)
-            target_vector_voxels = (target_vector_voxels + torch.from_numpy(deformation_values_mm.reshape(
-                self.volume_dimensions_voxels[0],
-                self.volume_dimensions_voxels[1], 1)).to(self.torch_device) / self.voxel_spacing).float()
+            # the deformation surface is shared by all structures and must not be changed in place
+            deformation_values_mm = self.get_deformation_surface_mm()
+            target_vector_voxels = target_vector_voxels + deformation_values_mm[:, :, None] / self.voxel_spacing
 
         volume_fractions = torch.zeros(tuple(self.volume_dimensions_voxels),
                                        dtype=torch.float, device=self.torch_device)
@@ -7,7 +7,10 @@ from abc import abstractmethod
 import numpy as np
 
 from simpa.log import Logger
-from simpa.utils import Settings, Tags, get_functional_from_deformation_settings, round_x5_away_from_zero
+import torch
+
+from simpa.utils import Settings, Tags, get_functional_from_deformation_settings, get_deformation_surface_mm, \
+    round_x5_away_from_zero
 from simpa.utils.libraries.molecule_library import MolecularComposition
 from simpa.utils.tissue_properties import TissueProperties
 from simpa.utils.processing_device import get_processing_device
@@ -46,12 +49,11 @@ class GeometricalStructure:
         self.logger.debug(f"This structure will simulate deformations: {self.do_deformation}")
 
         if self.do_deformation and Tags.DEFORMED_LAYERS_SETTINGS in global_settings.get_volume_creation_settings():
-            self.deformation_functional_mm = get_functional_from_deformation_settings(
-                global_settings.get_volume_creation_settings()[Tags.DEFORMED_LAYERS_SETTINGS])
+            self.deformation_settings = global_settings.get_volume_creation_settings()[Tags.DEFORMED_LAYERS_SETTINGS]
         else:
-            self.deformation_functional_mm = None
+            self.deformation_settings = None
 
-        self.logger.debug(f"This structure's deformation functional: {self.deformation_functional_mm}")
+        self.logger.debug(f"This structure has deformation settings: {self.deformation_settings is not None}")
 
         if single_structure_settings is None:
             self.molecule_composition = MolecularComposition()
@@ -91,6 +93,26 @@ class GeometricalStructure:
         """
         return self.geometrical_volume
 
+    @property
+    def deformation_functional_mm(self):
+        """
+        The cubic scipy interpolator of the deformation surface or None if the structure is not deformed. The
+        structures use get_deformation_surface_mm instead, the interpolator is only kept as a reference.
+        """
+        if self.deformation_settings is None:
+            return None
+        return get_functional_from_deformation_settings(self.deformation_settings)
+
+    def get_deformation_surface_mm(self) -> torch.Tensor:
+        """
+        :return: the deformation surface in mm at the voxel positions in the xy-plane on the processing device. The
+            tensor is shared by all structures and must not be changed in place.
+        """
+        if self.deformation_settings is None:
+            raise KeyError("Tags.DEFORMED_LAYERS_SETTINGS are not defined in the volume creation settings")
+        return get_deformation_surface_mm(self.deformation_settings, self.volume_dimensions_voxels,
+                                          self.voxel_spacing, self.torch_device)
+
     @abstractmethod
     def get_enclosed_indices(self):
         """
@@ -2,6 +2,10 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
+import hashlib
+
+import numpy as np
+
 from simpa.utils import Tags
 from simpa.utils.serializer import SerializableSIMPAClass
 from simpa.log import Logger
@@ -14,19 +18,49 @@ class Settings(dict, SerializableSIMPAClass):
     Usage: Settings({Tags.KEY1: value1, Tags.KEY2: value2, ...})
     """
 
+    # The plain string keys for which a warning has been logged. The warning is logged only once per key.
+    _warned_keys = set()
+
     def __init__(self, dictionary: dict = None, verbose: bool = True):
         super(Settings, self).__init__()
         self.logger = Logger()
         self.verbose = verbose
         if dictionary is None:
-            dictionary = {}
+            return
+        if isinstance(dictionary, Settings):
+            # the entries of other settings have already been checked
+            dict.update(self, dictionary)
+            return
         for key, value in dictionary.items():
             self.__setitem__(key, value)
 
+    @classmethod
+    def from_trusted(cls, dictionary: dict, verbose: bool = False) -> "Settings":
+        """
+        Creates settings from a dictionary whose entries have already been checked, e.g. a copy of other settings
+        or settings loaded from a file, without checking the types of the values or logging warnings for plain
+        string keys.
+
+        :param dictionary: the trusted dictionary.
+        :param verbose: whether warnings are logged for plain string keys that are assigned later on.
+        :return: Settings
+        """
+        settings = cls(verbose=verbose)
+        dict.update(settings, {(key[0] if isinstance(key, tuple) else key): value
+                               for key, value in dictionary.items()})
+        return settings
+
+    def freeze(self) -> "FrozenSettings":
+        """
+        :return: an immutable copy of these settings that can be hashed, e.g. to use it as key of a cache.
+        """
+        return FrozenSettings(self)
+
     def __setitem__(self, key, value):
         if isinstance(key, str):
             super().__setitem__(key, value)
-            if self.verbose:
+            if self.verbose and key not in Settings._warned_keys:
+                Settings._warned_keys.add(key)
                 self.logger.warning("The key for the Settings dictionary should be a tuple in the form of "
                                     "('{}', (data_type_1, data_type_2, ...)). "
                                     "The tuple of data types specifies all possible types, the value can have.\n"
@@ -177,4 +211,88 @@ class Settings(dict, SerializableSIMPAClass):
 
     @staticmethod
     def deserialize(dictionary_to_deserialize: dict):
-        return Settings(dictionary_to_deserialize, verbose=False)
+        return Settings.from_trusted(dictionary_to_deserialize)
+
+
+def _update_content_hash(digest, value):
+    """
+    Feeds the content of a settings value into a hash, independent of the insertion order of dictionaries.
+    """
+    if isinstance(value, SerializableSIMPAClass) and not isinstance(value, dict):
+        digest.update(type(value).__name__.encode())
+        value = value.serialize()
+    if isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value.keys(), key=str):
+            digest.update(repr(key).encode() + b":")
+            _update_content_hash(digest, value[key])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            _update_content_hash(digest, item)
+        digest.update(b"]")
+    elif hasattr(value, "__array__") and not isinstance(value, np.generic):
+        array = np.ascontiguousarray(np.asarray(value))
+        digest.update(f"array{array.shape}{array.dtype.str}".encode())
+        digest.update(array.tobytes() if array.dtype != object else repr(array.tolist()).encode())
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+class FrozenSettings(Settings):
+    """
+    An immutable copy of settings, which is created by Settings.freeze(). Nested settings and dictionaries are
+    frozen as well. The hash of frozen settings is computed once from their content, such that they can be used as
+    keys of caches. Settings(frozen_settings) creates a modifiable copy of the top level.
+    """
+
+    def __init__(self, dictionary: dict = None):
+        super(FrozenSettings, self).__init__(verbose=False)
+        self._content_hash = None
+        if dictionary is not None:
+            for key, value in dictionary.items():
+                if isinstance(value, dict) and not isinstance(value, FrozenSettings):
+                    value = FrozenSettings(value)
+                dict.__setitem__(self, key[0] if isinstance(key, tuple) else key, value)
+
+    def _raise_immutable(self, *args, **kwargs):
+        msg = "FrozenSettings cannot be modified. Use Settings(frozen_settings) to create a modifiable copy."
+        self.logger.critical(msg)
+        raise TypeError(msg)
+
+    __setitem__ = __delitem__ = __ior__ = _raise_immutable
+    clear = pop = popitem = setdefault = update = _raise_immutable
+
+    def content_hash(self) -> str:
+        """
+        :return: the hexadecimal SHA-1 digest of the content, which does not depend on the insertion order.
+        """
+        if self._content_hash is None:
+            digest = hashlib.sha1()
+            _update_content_hash(digest, dict(self))
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def __hash__(self):
+        return int(self.content_hash()[:16], 16)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenSettings):
+            return self.content_hash() == other.content_hash()
+        return super(FrozenSettings, self).__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def freeze(self) -> "FrozenSettings":
+        return self
+
+    def __reduce__(self):
+        return FrozenSettings, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
@@ -94,10 +94,139 @@ class Tags:
 
     DO_FILE_COMPRESSION = ("minimize_file_size", (bool, np.bool_))
     """
-    If not set to False, the HDF5 file will be optimised after the simulations are done.
+    If not set to False, all arrays are written to the HDF5 file as compressed datasets and unused space is released
+    from the file after the simulations are done.
     Usage: simpa.core.simulation.simulate
     """
 
+    FILE_COMPRESSION_FILTER = ("file_compression_filter", str)
+    """
+    The HDF5 filter that is used to compress the arrays if Tags.DO_FILE_COMPRESSION is not set to False. Possible
+    values are "gzip" (default) and "lzf", which compresses less but is considerably faster.
+    Usage: simpa.core.simulation.simulate
+    """
+
+    STORAGE_BACKEND = ("storage_backend", str)
+    """
+    The storage backend of the simulation output, which also defines the file extension of
+    Tags.SIMPA_OUTPUT_FILE_PATH. Possible values are Tags.STORAGE_BACKEND_HDF5 (default) and
+    Tags.STORAGE_BACKEND_ZARR.
+    Usage: simpa.core.simulation.simulate
+    """
+
+    STORAGE_BACKEND_HDF5 = "hdf5"
+    """
+    Stores the simulation output in a single HDF5 file.
+    Usage: simpa.core.simulation.simulate
+    """
+
+    STORAGE_BACKEND_ZARR = "zarr"
+    """
+    Stores the simulation output in a Zarr directory store, which allows several processes to write the output at
+    the same time. Requires the optional zarr package.
+    Usage: simpa.core.simulation.simulate, simpa.io_handling.storage_backend
+    """
+
+    DATA_PRECISION = ("data_precision", str)
+    """
+    The floating point precision with which the simulated volumes and the results of the simulation modules and
+    noise models are stored. Possible values are Tags.DATA_PRECISION_FLOAT64, Tags.DATA_PRECISION_FLOAT32 and
+    Tags.DATA_PRECISION_FLOAT16. Per default, the volumes and the noisy data fields are stored in double precision
+    and all other data fields in the precision of the simulation module that computed them.
+    As the volumes are created with torch and the optical and acoustic forward models compute in single precision,
+    Tags.DATA_PRECISION_FLOAT32 halves the memory and disk usage without changing the results by more than
+    the single precision rounding error (the relative deviation of the absorption, fluence and initial pressure of
+    the test pipeline is below 1e-6 in single and 1e-2 in half precision).\n
+    Usage: simpa.core.simulation_modules, simpa.core.processing_components.monospectral.noise
+    """
+
+    DATA_PRECISION_FLOAT64 = "float64"
+    """
+    Stores the data fields in double precision.
+    Usage: simpa.utils.data_precision
+    """
+
+    DATA_PRECISION_FLOAT32 = "float32"
+    """
+    Stores the data fields in single precision.
+    Usage: simpa.utils.data_precision
+    """
+
+    DATA_PRECISION_FLOAT16 = "float16"
+    """
+    Computes in single precision but stores the data fields in half precision, e.g. to generate training data. Data
+    fields that exceed the range of half precision, such as initial pressures in Pa, are stored in single precision.
+    Usage: simpa.utils.data_precision
+    """
+
+    DATA_CHUNK_SHAPES = ("data_chunk_shapes", dict)
+    """
+    Dictionary that maps data fields to the chunk shapes with which they are stored in the HDF5 file. Entries of None
+    span the full axis, e.g. {Tags.DATA_FIELD_FLUENCE: [None, None, 1]} stores the fluence in z-slabs and
+    {Tags.DATA_FIELD_TIME_SERIES_DATA: [1, None]} stores the time series data per sensor element, such that single
+    slices or sensor elements can be loaded efficiently with load_data_field(..., region=...).
+    Usage: simpa.core.simulation.simulate, simpa.io_handling.io_hdf5
+    """
+
+    PIPELINE_EXECUTION_MODE = ("pipeline_execution_mode", str)
+    """
+    Defines how simulate() executes the pipeline elements. Possible values are
+    Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL (default), Tags.PIPELINE_EXECUTION_MODE_GRAPH and
+    Tags.PIPELINE_EXECUTION_MODE_PIPELINED.\n
+    Usage: simpa.core.simulation.simulate
+    """
+
+    PIPELINE_EXECUTION_MODE_SEQUENTIAL = "pipeline_execution_mode_sequential"
+    """
+    All pipeline elements are executed one after another for each wavelength.\n
+    Usage: simpa.core.simulation.simulate, naming convention
+    """
+
+    PIPELINE_EXECUTION_MODE_GRAPH = "pipeline_execution_mode_graph"
+    """
+    The pipeline elements are scheduled as a dependency graph based on the data fields they read and write.
+    Elements that do not depend on each other are executed concurrently.\n
+    Usage: simpa.core.simulation.simulate, naming convention
+    """
+
+    PIPELINE_EXECUTION_MODE_PIPELINED = "pipeline_execution_mode_pipelined"
+    """
+    Every pipeline element is run as a stage with its own worker thread and the wavelengths are passed from stage
+    to stage through bounded queues. This way, e.g. the optical forward model of the next wavelength runs while the
+    acoustic forward model and the reconstruction of the current wavelength are computed. Results and log
+    output are in the same order as in Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL.\n
+    Usage: simpa.core.simulation.simulate, naming convention
+    """
+
+    PIPELINE_QUEUE_SIZE = ("pipeline_queue_size", int)
+    """
+    Maximum number of wavelengths that wait between two stages in Tags.PIPELINE_EXECUTION_MODE_PIPELINED
+    (default: 1).\n
+    Usage: simpa.core.simulation.simulate
+    """
+
+    PIPELINE_MAX_WORKERS = ("pipeline_max_workers", int)
+    """
+    Maximum number of pipeline elements that are executed concurrently in
+    Tags.PIPELINE_EXECUTION_MODE_GRAPH (default: 2).\n
+    Usage: simpa.core.simulation.simulate
+    """
+
+    RECORD_TELEMETRY = ("record_telemetry", bool)
+    """
+    If True, simulate() records the wall time, CPU time and peak memory of every pipeline element for every
+    wavelength and of sub-steps such as loading and saving data fields and the MCX and MATLAB subprocesses. The
+    records are stored as Tags.TELEMETRY in the output file (default: False).\n
+    Usage: simpa.core.simulation.simulate, simpa.utils.telemetry
+    """
+
+    TELEMETRY_JSON_LINES_FILE = ("telemetry_json_lines_file", str)
+    """
+    Path of a file to which every telemetry record is appended as a JSON line as soon as the step has finished.
+    Setting this tag also enables Tags.RECORD_TELEMETRY.\n
+    Usage: simpa.core.simulation.simulate, simpa.utils.telemetry
+    """
+
     """
     Volume Creation Settings
     """
@@ -1275,6 +1404,12 @@ class Tags:
     Usage: naming convention
     """
 
+    TELEMETRY = "telemetry"
+    """
+    Location of the telemetry records in the SIMPA output file (see Tags.RECORD_TELEMETRY).\n
+    Usage: simpa.utils.telemetry, naming convention
+    """
+
     SIMULATION_PROPERTIES = "simulation_properties"
     """
     Location of the simulation properties in the SIMPA output file.\n
@@ -1367,6 +1502,21 @@ class Tags:
     Usage: module algorithms (iterative_qPAI_algorithm.py)
     """
 
+    ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION = ("iterative_reconstruction_initial_photon_fraction", Number)
+    """
+    Fraction of Tags.OPTICAL_MODEL_NUMBER_PHOTONS that is used to simulate the fluence in the first iteration.
+    The number of photons grows by Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR in every iteration until the full
+    number of photons is reached. The stopping criterion is only evaluated with the full number of photons.\n
+    Usage: module algorithms (iterative_qPAI_algorithm.py)
+    """
+
+    ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR = ("iterative_reconstruction_photon_growth_factor", Number)
+    """
+    Factor by which the number of photons of the fluence simulation grows in every iteration, see
+    Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION.\n
+    Usage: module algorithms (iterative_qPAI_algorithm.py)
+    """
+
     LINEAR_UNMIXING_NON_NEGATIVE = ("linear_unmixing_nonnegative", bool)
     """
     If True, non-negative linear unmixing is performed which solves the 
@@ -1435,6 +1585,14 @@ class Tags:
     Usage: module algorithms (linear_unmixing)
     """
 
+    MULTISPECTRAL_BLOCK_SIZE = ("multispectral_block_size", (int, np.integer))
+    """
+    If set, a multispectral processing algorithm loads and processes the data field in blocks of this number of
+    slices along its first axis instead of loading all wavelengths of the complete data field at once. The results
+    are written to the output file block by block, such that the required memory does not depend on the volume size.\n
+    Usage: module algorithms (linear_unmixing)
+    """
+
     DO_IPASC_EXPORT = ("do_ipasc_export", (bool, np.bool_))
     """
     Flag which determines whether the simulated time series data (if available) will be
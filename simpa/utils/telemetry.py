@@ -0,0 +1,318 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where the peak memory is not recorded
+    resource = None
+
+from simpa.log import Logger
+
+# The telemetry of the simulation that is currently run by simulate, if it is recorded.
+_active_telemetry = None
+_active_telemetry_lock = threading.Lock()
+# The pipeline element and wavelength of the step that is currently measured by each thread.
+_current_step = threading.local()
+
+
+def _get_rss_mb() -> Optional[float]:
+    """
+    Returns the current resident set size of the process in MiB or None if it is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError, AttributeError):
+        # /proc is only available on Linux
+        return None
+
+
+def _get_peak_rss_mb(who) -> Optional[float]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+def _get_child_cpu_time() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _get_cuda_module():
+    # torch is only queried if it has been imported by a pipeline element, telemetry never imports it.
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available() or not torch.cuda.is_initialized():
+        return None
+    return torch.cuda
+
+
+class _StepPeaks:
+    """
+    The peak memory of a step that is currently measured.
+    """
+
+    def __init__(self):
+        self.rss_mb = None
+        self.cuda_memory_mb = None
+
+    def update(self, rss_mb: Optional[float], cuda_memory_mb: Optional[float]):
+        if rss_mb is not None:
+            self.rss_mb = rss_mb if self.rss_mb is None else max(self.rss_mb, rss_mb)
+        if cuda_memory_mb is not None:
+            self.cuda_memory_mb = cuda_memory_mb if self.cuda_memory_mb is None else \
+                max(self.cuda_memory_mb, cuda_memory_mb)
+
+
+class Telemetry:
+    """
+    Records the wall time, CPU time and peak memory of the steps of a simulation. The simulate method records the
+    run of every pipeline element for every wavelength as well as sub-steps such as loading and saving data fields,
+    the MCX and MATLAB subprocesses and the reconstruction algorithms if Tags.RECORD_TELEMETRY is set. The records
+    are stored in the output file (see load_telemetry) and appended to the JSON lines file given by
+    Tags.TELEMETRY_JSON_LINES_FILE as soon as a step has finished.
+
+    Every record is a dictionary with the entries
+
+    - name: the name of the step, e.g. "run", "hdf5_save" or "mcx_subprocess".
+    - element: the class name of the pipeline element that ran the step or None.
+    - wavelength: the wavelength of the pipeline element or None for multispectral steps.
+    - start_s: the start of the step in seconds since the start of the recording.
+    - wall_time_s: the wall time of the step in seconds.
+    - cpu_time_s: the CPU time of the process during the step in seconds. If several steps run concurrently, e.g.
+      with Tags.PIPELINE_EXECUTION_MODE_GRAPH, this includes the CPU time of the other steps.
+    - child_cpu_time_s: the CPU time of the subprocesses that terminated during the step in seconds.
+    - peak_rss_mb: the peak resident set size of the process during the step in MiB. It is sampled at the start
+      and the end of the step and every sampling_interval_s in between. None if it is not available, i.e. on
+      other systems than Linux.
+    - process_peak_rss_mb: the peak resident set size of the process since its start up to the end of the step
+      in MiB.
+    - child_peak_rss_mb: the largest peak resident set size of all terminated subprocesses in MiB.
+    - peak_cuda_memory_mb: the peak memory allocated by torch on the GPU during the step in MiB or None if CUDA
+      is not used.
+
+    The memory is measured for the whole process. If several steps run concurrently, the peaks of a step include
+    the memory used by the other steps. The peaks of nested steps are included in the peaks of the enclosing step.
+
+    Only one simulation per process can record its telemetry at a time.
+    """
+
+    def __init__(self, json_lines_path: str = None, metadata: dict = None, sampling_interval_s: float = 0.05):
+        """
+        :param json_lines_path: path of a file to which every record is appended as a JSON line.
+        :param metadata: entries that are added to every record, e.g. the name of the volume.
+        :param sampling_interval_s: the interval in which the resident set size is sampled while the telemetry
+            is recorded.
+        """
+        self.logger = Logger()
+        self.json_lines_path = json_lines_path
+        self.metadata = dict() if metadata is None else dict(metadata)
+        self.sampling_interval_s = sampling_interval_s
+        self.records = []
+        self._lock = threading.Lock()
+        self._start_time = time.perf_counter()
+        # the peaks of all steps that are currently measured by any thread
+        self._active_steps = []
+        self._peak_lock = threading.Lock()
+        self._stop_sampling = threading.Event()
+        self._sampling_thread = None
+
+    def __enter__(self):
+        global _active_telemetry
+        with _active_telemetry_lock:
+            if _active_telemetry is not None:
+                msg = "The telemetry of another simulation is already recorded in this process."
+                self.logger.critical(msg)
+                raise RuntimeError(msg)
+            _active_telemetry = self
+        self._stop_sampling.clear()
+        self._sampling_thread = threading.Thread(target=self._sample_peaks, name="SIMPA telemetry", daemon=True)
+        self._sampling_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active_telemetry
+        with _active_telemetry_lock:
+            _active_telemetry = None
+        self._stop_sampling.set()
+        self._sampling_thread.join()
+        self._sampling_thread = None
+
+    def _sample_peaks(self):
+        while not self._stop_sampling.wait(self.sampling_interval_s):
+            with self._peak_lock:
+                if self._active_steps:
+                    self._update_peaks(self._active_steps, None)
+
+    @staticmethod
+    def _update_peaks(steps: list, cuda):
+        rss_mb = _get_rss_mb()
+        cuda_memory_mb = cuda.max_memory_allocated() / 2 ** 20 if cuda is not None else None
+        for step in steps:
+            step.update(rss_mb, cuda_memory_mb)
+
+    @contextmanager
+    def measure(self, name: str, element: str = None, wavelength=None):
+        """
+        Records the resources that are used within the context.
+
+        :param name: the name of the step.
+        :param element: the class name of the pipeline element. Per default, the element of the enclosing step of
+            the current thread is used.
+        :param wavelength: the wavelength of the step. Per default, the wavelength of the enclosing step is used.
+        """
+        parent = getattr(_current_step, "value", None)
+        if element is None and parent is not None:
+            element, wavelength = parent
+        _current_step.value = (element, wavelength)
+
+        step = _StepPeaks()
+        with self._peak_lock:
+            cuda = _get_cuda_module()
+            if cuda is not None:
+                # the peak since the last reset is passed on to all running steps before it is reset
+                self._update_peaks(self._active_steps, cuda)
+                cuda.reset_peak_memory_stats()
+            self._update_peaks([step], cuda)
+            self._active_steps.append(step)
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        start_child_cpu_time = _get_child_cpu_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+            child_cpu_time = _get_child_cpu_time()
+            if child_cpu_time is not None:
+                child_cpu_time -= start_child_cpu_time
+            _current_step.value = parent
+            with self._peak_lock:
+                self._update_peaks(self._active_steps, _get_cuda_module())
+                self._active_steps.remove(step)
+            record = dict(self.metadata)
+            record.update({
+                "name": name,
+                "element": element,
+                "wavelength": wavelength,
+                "start_s": start_wall_time - self._start_time,
+                "wall_time_s": wall_time,
+                "cpu_time_s": cpu_time,
+                "child_cpu_time_s": child_cpu_time,
+                "peak_rss_mb": step.rss_mb,
+                "process_peak_rss_mb": _get_peak_rss_mb(resource.RUSAGE_SELF) if resource is not None else None,
+                "child_peak_rss_mb": _get_peak_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None,
+                "peak_cuda_memory_mb": step.cuda_memory_mb
+            })
+            self._add_record(record)
+
+    def _add_record(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if self.json_lines_path is not None:
+                with open(self.json_lines_path, "a") as json_lines_file:
+                    json_lines_file.write(json.dumps(record, default=str) + "\n")
+
+
+def measure(name: str, element: str = None, wavelength=None):
+    """
+    Records a step in the telemetry of the simulation that is currently run::
+
+        with measure("mcx_subprocess"):
+            subprocess.run(cmd)
+
+    :param name: the name of the step.
+    :param element: the class name of the pipeline element. Per default, the element of the enclosing step is used.
+    :param wavelength: the wavelength of the step. Per default, the wavelength of the enclosing step is used.
+    :return: a context manager, which does nothing if no telemetry is recorded.
+    """
+    telemetry = _active_telemetry
+    if telemetry is None:
+        return nullcontext()
+    return telemetry.measure(name, element, wavelength)
+
+
+def measure_pipeline_element(pipeline_element, wavelength):
+    """
+    Records the run of a pipeline element. Nested runs of the same pipeline element, e.g. if the run method of a
+    subclass calls the run method of its base class, are recorded only once.
+
+    :param pipeline_element: the pipeline element.
+    :param wavelength: the wavelength that the pipeline element is run for or None.
+    :return: a context manager, which does nothing if no telemetry is recorded.
+    """
+    telemetry = _active_telemetry
+    if telemetry is None or getattr(_current_step, "pipeline_element", None) is pipeline_element:
+        return nullcontext()
+    return _measure_pipeline_element(telemetry, pipeline_element, wavelength)
+
+
+@contextmanager
+def _measure_pipeline_element(telemetry: Telemetry, pipeline_element, wavelength):
+    parent = getattr(_current_step, "pipeline_element", None)
+    _current_step.pipeline_element = pipeline_element
+    try:
+        with telemetry.measure("run", type(pipeline_element).__name__, wavelength):
+            yield
+    finally:
+        _current_step.pipeline_element = parent
+
+
+def measured(name: str):
+    """
+    Decorator that records every call of the decorated function as a step with the given name, see measure.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def save_telemetry(file_path: str, records: list):
+    """
+    Appends telemetry records to the ones that are stored in a SIMPA output file.
+
+    :param file_path: path of the SIMPA output file.
+    :param records: the records, see Telemetry.
+    """
+    from simpa.io_handling import save_data_field
+    from simpa.utils import Tags
+    save_data_field(json.dumps(load_telemetry(file_path) + list(records), default=str), file_path, Tags.TELEMETRY)
+
+
+def load_telemetry(file_path: str) -> list:
+    """
+    Loads the telemetry records that are stored in a SIMPA output file.
+
+    :param file_path: path of the SIMPA output file.
+    :return: list of records, see Telemetry. The list is empty if no telemetry was recorded.
+    """
+    from simpa.io_handling import load_data_field
+    from simpa.utils import Tags
+    if not os.path.exists(file_path):
+        return []
+    try:
+        document = load_data_field(file_path, Tags.TELEMETRY)
+    except KeyError:
+        return []
+    if isinstance(document, bytes):
+        document = document.decode("utf-8")
+    return json.loads(document)
@@ -0,0 +1,6 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from simpa_benchmarks.benchmark import Benchmark, benchmark, load_benchmarks, run_benchmarks, compare_results, \
+    time_function, get_machine_metadata, get_cube_settings, SIZES, BENCHMARKS
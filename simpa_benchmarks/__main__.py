@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import json
+import sys
+from argparse import ArgumentParser
+
+from simpa_benchmarks.benchmark import run_benchmarks, compare_results, load_benchmarks, SIZES
+
+
+def format_params(params: dict) -> str:
+    return ", ".join(f"{key}={value}" for key, value in params.items())
+
+
+def main(arguments=None) -> int:
+    parser = ArgumentParser(description="Runs the SIMPA benchmarks with synthetic phantoms and the test adapters, "
+                                        "such that no MCX or MATLAB installation is needed.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--filter", default=None, type=str,
+                            help="regular expression that selects the benchmarks by name")
+    run_parser.add_argument("--sizes", nargs="+", default=None, choices=list(SIZES.keys()),
+                            help="the benchmark sizes to run (default: all)")
+    run_parser.add_argument("--repeat", default=5, type=int, help="number of timed runs per benchmark")
+    run_parser.add_argument("--warmup", default=1, type=int, help="number of untimed runs per benchmark")
+    run_parser.add_argument("--threads", default=None, type=int,
+                            help="number of torch threads, fix it to compare results of different machines")
+    run_parser.add_argument("--output", default=None, type=str, help="path of the JSON file (default: stdout)")
+
+    subparsers.add_parser("list", help="list the benchmarks and their parameters")
+
+    compare_parser = subparsers.add_parser("compare", help="compare the median wall times of two result files")
+    compare_parser.add_argument("baseline", type=str, help="the JSON file of the baseline run")
+    compare_parser.add_argument("contender", type=str, help="the JSON file of the run to compare")
+    compare_parser.add_argument("--threshold", default=1.1, type=float,
+                                help="ratio of the medians above which a benchmark counts as a regression")
+    config = parser.parse_args(arguments)
+
+    if config.command == "list":
+        for benchmark in load_benchmarks():
+            print(f"{benchmark.name}: {format_params(benchmark.params)}")
+        return 0
+
+    if config.command == "compare":
+        with open(config.baseline) as baseline_file, open(config.contender) as contender_file:
+            comparison = compare_results(json.load(baseline_file), json.load(contender_file))
+        regressions = 0
+        for entry in comparison:
+            marker = ""
+            if entry["ratio"] > config.threshold:
+                marker = " <- regression"
+                regressions += 1
+            print(f"{entry['name']} ({format_params(entry['params'])}): {entry['baseline_median_s']:.4g}s -> "
+                  f"{entry['contender_median_s']:.4g}s ({entry['ratio']:.2f}x){marker}")
+        return 1 if regressions > 0 else 0
+
+    if config.command == "run":
+        if config.threads is not None:
+            import torch
+            torch.set_num_threads(config.threads)
+
+        def progress(name, params):
+            print(f"Running {name} ({format_params(params)})...", file=sys.stderr)
+
+        results = run_benchmarks(pattern=config.filter, sizes=config.sizes, repeat=config.repeat,
+                                 warmup=config.warmup, progress=progress)
+        if config.output is None:
+            print(json.dumps(results, indent=2))
+        else:
+            with open(config.output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import datetime
+import importlib
+import itertools
+import logging
+import os
+import platform
+import re
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+
+# Edge length of the cubic phantoms in voxels for each benchmark size.
+SIZES = {
+    "small": 32,
+    "medium": 64,
+    "large": 128
+}
+
+# The modules that define the benchmarks, see load_benchmarks.
+BENCHMARK_MODULES = [
+    "simpa_benchmarks.volume_creation",
+    "simpa_benchmarks.spectra",
+    "simpa_benchmarks.io_handling",
+    "simpa_benchmarks.reconstruction",
+    "simpa_benchmarks.processing",
+    "simpa_benchmarks.pipeline"
+]
+
+# Format version of the result documents written by run_benchmarks.
+RESULT_FORMAT_VERSION = 1
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    """
+    A benchmark consists of a setup function and a set of parameters. The setup function is called for every
+    combination of the parameter values with a temporary directory and the parameter values as keyword arguments.
+    It prepares the inputs, which is not timed, and returns the function that is timed.
+    """
+
+    def __init__(self, name: str, setup: Callable, params: dict):
+        """
+        :param name: the name of the benchmark.
+        :param setup: the setup function.
+        :param params: the values of every parameter by parameter name.
+        """
+        self.name = name
+        self.setup = setup
+        self.params = params
+
+    def get_parameter_combinations(self, sizes: list = None) -> List[dict]:
+        """
+        :param sizes: the benchmark sizes to use for a "size" parameter. All sizes are used if None.
+        :return: all combinations of the parameter values.
+        """
+        params = dict(self.params)
+        if sizes is not None and "size" in params:
+            params["size"] = [size for size in params["size"] if size in sizes]
+        return [dict(zip(params.keys(), values)) for values in itertools.product(*params.values())]
+
+
+def benchmark(name: str = None, **params):
+    """
+    Registers a setup function as a benchmark::
+
+        @benchmark(size=list(SIZES.keys()), compression=[None, "gzip"])
+        def hdf5_save(directory, size, compression):
+            data = ...
+            return lambda: save_hdf5(data, os.path.join(directory, "benchmark.hdf5"), file_compression=compression)
+
+    :param name: the name of the benchmark. Per default, the name of the setup function is used.
+    :param params: list of values of every parameter of the setup function.
+    """
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(setup.__name__ if name is None else name, setup, params))
+        return setup
+    return decorator
+
+
+def load_benchmarks() -> List[Benchmark]:
+    """
+    Imports all benchmark modules.
+
+    :return: the registered benchmarks.
+    """
+    for module_name in BENCHMARK_MODULES:
+        importlib.import_module(module_name)
+    return list(BENCHMARKS)
+
+
+def get_machine_metadata() -> dict:
+    """
+    :return: a description of the machine and the versions of the most important packages, such that results of
+        different machines and software versions can be told apart.
+    """
+    import h5py
+    import scipy
+    import torch
+    import simpa
+
+    processor = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    processor = line.split(":", 1)[1].strip()
+                    break
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": processor,
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "cuda_device": torch.cuda.get_device_name() if torch.cuda.is_available() else None,
+        "python": platform.python_version(),
+        "simpa": simpa.__version__,
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "torch": torch.__version__,
+        "h5py": h5py.__version__
+    }
+
+
+def time_function(function: Callable, repeat: int = 5, warmup: int = 1) -> dict:
+    """
+    Times a function.
+
+    :param function: the function without arguments.
+    :param repeat: the number of timed calls.
+    :param warmup: the number of calls before the timed calls, e.g. to fill caches or to compile kernels.
+    :return: the wall times and statistics of the timed calls.
+    """
+    for _ in range(warmup):
+        function()
+    wall_times = []
+    cpu_times = []
+    for _ in range(max(int(repeat), 1)):
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        function()
+        cpu_times.append(time.process_time() - start_cpu_time)
+        wall_times.append(time.perf_counter() - start_wall_time)
+    return {
+        "wall_times_s": wall_times,
+        "min_s": min(wall_times),
+        "median_s": statistics.median(wall_times),
+        "mean_s": statistics.mean(wall_times),
+        "stdev_s": statistics.stdev(wall_times) if len(wall_times) > 1 else 0.0,
+        "cpu_median_s": statistics.median(cpu_times)
+    }
+
+
+def run_benchmarks(pattern: str = None, sizes: list = None, repeat: int = 5, warmup: int = 1,
+                   random_seed: int = 4711, log_level: int = logging.WARNING, progress: Callable = None) -> dict:
+    """
+    Runs the benchmarks. Every parameter combination runs in its own temporary directory with the same random
+    seed, such that the results of different runs are comparable.
+
+    :param pattern: regular expression that selects benchmarks by name. All benchmarks are run if None.
+    :param sizes: the benchmark sizes to run, see SIZES. All sizes are run if None.
+    :param repeat: the number of timed calls of every benchmark.
+    :param warmup: the number of untimed calls before the timed calls.
+    :param random_seed: the seed of numpy and torch.
+    :param log_level: the level of the SIMPA logger during the benchmarks.
+    :param progress: function that is called with the name and the parameters of every benchmark before it is run.
+    :return: JSON-serialisable dictionary with the machine metadata and the results of all benchmarks.
+    """
+    import torch
+    from simpa.log import Logger
+
+    if sizes is not None:
+        unknown_sizes = [size for size in sizes if size not in SIZES]
+        if unknown_sizes:
+            raise ValueError(f"Unknown benchmark sizes {unknown_sizes}, the available sizes are {list(SIZES.keys())}.")
+
+    # the SIMPA logger is configured when the Logger is instantiated for the first time
+    Logger()
+    simpa_logger = logging.getLogger("SIMPA Logger")
+    previous_log_level = simpa_logger.level
+    simpa_logger.setLevel(log_level)
+    results = []
+    try:
+        for current_benchmark in load_benchmarks():
+            if pattern is not None and re.search(pattern, current_benchmark.name) is None:
+                continue
+            for params in current_benchmark.get_parameter_combinations(sizes):
+                if progress is not None:
+                    progress(current_benchmark.name, params)
+                np.random.seed(random_seed)
+                torch.manual_seed(random_seed)
+                with tempfile.TemporaryDirectory() as directory:
+                    function = current_benchmark.setup(directory, **params)
+                    result = {"name": current_benchmark.name, "params": params}
+                    result.update(time_function(function, repeat=repeat, warmup=warmup))
+                results.append(result)
+    finally:
+        simpa_logger.setLevel(previous_log_level)
+
+    return {"metadata": get_machine_metadata(), "benchmarks": results}
+
+
+def compare_results(baseline: dict, contender: dict) -> List[dict]:
+    """
+    Compares the median wall times of two benchmark runs.
+
+    :param baseline: the results of the baseline run, see run_benchmarks.
+    :param contender: the results of the run that is compared to the baseline.
+    :return: the benchmarks that are contained in both runs with the median wall times and the ratio of the
+        contender median to the baseline median, i.e. a ratio above 1 is a slowdown.
+    """
+    def get_key(result):
+        return result["name"], tuple(sorted((key, str(value)) for key, value in result["params"].items()))
+
+    baseline_results = {get_key(result): result for result in baseline["benchmarks"]}
+    comparison = []
+    for result in contender["benchmarks"]:
+        key = get_key(result)
+        if key not in baseline_results:
+            continue
+        baseline_median = baseline_results[key]["median_s"]
+        comparison.append({
+            "name": result["name"],
+            "params": result["params"],
+            "baseline_median_s": baseline_median,
+            "contender_median_s": result["median_s"],
+            "ratio": result["median_s"] / baseline_median if baseline_median > 0 else float("inf")
+        })
+    return comparison
+
+
+def get_cube_settings(directory: str, size: str, spacing_mm: float = 0.5):
+    """
+    Creates the global settings of a cubic phantom for a benchmark size.
+
+    :param directory: the simulation path.
+    :param size: the benchmark size, see SIZES.
+    :param spacing_mm: the voxel spacing.
+    :return: the settings.
+    """
+    from simpa.utils import Settings, Tags
+
+    edge_length_mm = SIZES[size] * spacing_mm
+    return Settings({
+        Tags.RANDOM_SEED: 4711,
+        Tags.VOLUME_NAME: "SimpaBenchmark",
+        Tags.SIMULATION_PATH: directory,
+        Tags.SPACING_MM: spacing_mm,
+        Tags.DIM_VOLUME_X_MM: edge_length_mm,
+        Tags.DIM_VOLUME_Y_MM: edge_length_mm,
+        Tags.DIM_VOLUME_Z_MM: edge_length_mm,
+        Tags.WAVELENGTHS: [800],
+        Tags.WAVELENGTH: 800,
+        Tags.GPU: False
+    }, verbose=False)
@@ -0,0 +1,64 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+
+import numpy as np
+
+from simpa.io_handling import save_hdf5, load_hdf5, load_data_field
+from simpa.utils import Tags
+from simpa.utils.dict_path_manager import generate_dict_path
+from simpa_benchmarks.benchmark import benchmark, SIZES
+
+# The data fields of the synthetic simulation result.
+DATA_FIELDS = [Tags.DATA_FIELD_ABSORPTION_PER_CM, Tags.DATA_FIELD_SCATTERING_PER_CM, Tags.DATA_FIELD_ANISOTROPY,
+               Tags.DATA_FIELD_FLUENCE, Tags.DATA_FIELD_INITIAL_PRESSURE]
+
+
+def create_simulation_result(size: str, wavelength: int = 800) -> dict:
+    """
+    Creates random volumes of the data fields of a single wavelength with the paths of a SIMPA output file.
+
+    :param size: the benchmark size, see SIZES.
+    :param wavelength: the wavelength of the data fields.
+    :return: dictionary of the data fields by path.
+    """
+    shape = (SIZES[size],) * 3
+    return {generate_dict_path(data_field, wavelength): np.random.random(shape) for data_field in DATA_FIELDS}
+
+
+def save_simulation_result(simulation_result: dict, file_path: str, compression: str = None):
+    save_hdf5({}, file_path, file_compression=compression)
+    for path, data in simulation_result.items():
+        save_hdf5(data, file_path, path)
+
+
+@benchmark(size=list(SIZES.keys()), compression=[None, "gzip", "lzf"])
+def hdf5_save(directory, size, compression):
+    """
+    Saves the data fields of a single wavelength to a new HDF5 file.
+    """
+    simulation_result = create_simulation_result(size)
+    file_path = os.path.join(directory, "benchmark.hdf5")
+    return lambda: save_simulation_result(simulation_result, file_path, compression)
+
+
+@benchmark(size=list(SIZES.keys()), compression=[None, "gzip", "lzf"])
+def hdf5_load(directory, size, compression):
+    """
+    Loads the complete HDF5 file with the data fields of a single wavelength.
+    """
+    file_path = os.path.join(directory, "benchmark.hdf5")
+    save_simulation_result(create_simulation_result(size), file_path, compression)
+    return lambda: load_hdf5(file_path)
+
+
+@benchmark(size=list(SIZES.keys()))
+def hdf5_load_region(directory, size):
+    """
+    Loads a single slice of a data field.
+    """
+    file_path = os.path.join(directory, "benchmark.hdf5")
+    save_simulation_result(create_simulation_result(size), file_path, "gzip")
+    return lambda: load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 800, region=np.s_[:, SIZES[size] // 2, :])
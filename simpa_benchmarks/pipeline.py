@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import subprocess
+import sys
+
+from simpa.core.device_digital_twins import RSOMExplorerP50
+from simpa.core.processing_components.monospectral.noise import GaussianNoise
+from simpa.core.simulation import simulate
+from simpa.core.simulation_modules.acoustic_module.acoustic_test_adapter import AcousticTestAdapter
+from simpa.core.simulation_modules.optical_module.optical_test_adapter import OpticalTestAdapter
+from simpa.core.simulation_modules.reconstruction_module.reconstruction_test_adapter import \
+    ReconstructionTestAdapter
+from simpa.core.simulation_modules.volume_creation_module.model_based_adapter import ModelBasedAdapter
+from simpa.utils import Tags, TISSUE_LIBRARY
+from simpa.utils.libraries.structure_library import define_background_structure_settings, \
+    define_circular_tubular_structure_settings
+from simpa_benchmarks.benchmark import benchmark, get_cube_settings, SIZES
+
+
+@benchmark(size=list(SIZES.keys()),
+           execution_mode=[Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL, Tags.PIPELINE_EXECUTION_MODE_GRAPH,
+                           Tags.PIPELINE_EXECUTION_MODE_PIPELINED])
+def simulation_pipeline(directory, size, execution_mode):
+    """
+    Simulates three wavelengths of a vessel phantom with the test adapters, which do not need MCX or MATLAB, such
+    that the benchmark measures the overhead of the pipeline, i.e. volume creation, file handling and scheduling.
+    """
+    settings = get_cube_settings(directory, size)
+    edge_length_mm = settings[Tags.DIM_VOLUME_X_MM]
+    settings[Tags.WAVELENGTHS] = [700, 800, 900]
+    settings[Tags.PIPELINE_EXECUTION_MODE] = execution_mode
+    settings.set_volume_creation_settings({
+        Tags.STRUCTURES: {
+            "background": define_background_structure_settings(TISSUE_LIBRARY.muscle()),
+            "vessel": define_circular_tubular_structure_settings([edge_length_mm / 2, 0, edge_length_mm / 2],
+                                                                 [edge_length_mm / 2, edge_length_mm,
+                                                                  edge_length_mm / 2],
+                                                                 TISSUE_LIBRARY.blood(), radius_mm=edge_length_mm / 8)
+        }
+    })
+    settings.set_optical_settings({Tags.OPTICAL_MODEL: Tags.OPTICAL_MODEL_TEST})
+    settings.set_acoustic_settings({})
+    settings.set_reconstruction_settings({})
+    settings["noise_time_series"] = {
+        Tags.NOISE_STD: 1,
+        Tags.DATA_FIELD: Tags.DATA_FIELD_TIME_SERIES_DATA
+    }
+    pipeline = [
+        ModelBasedAdapter(settings),
+        OpticalTestAdapter(settings),
+        AcousticTestAdapter(settings),
+        GaussianNoise(settings, "noise_time_series"),
+        ReconstructionTestAdapter(settings)
+    ]
+    device = RSOMExplorerP50(0.1, 1, 1)
+    return lambda: simulate(pipeline, settings, device)
+
+
+@benchmark()
+def import_time(directory):
+    """
+    Imports simpa in a new interpreter, including the start of the interpreter.
+    """
+    return lambda: subprocess.run([sys.executable, "-c", "import simpa"], check=True)
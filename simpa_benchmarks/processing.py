@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+
+import numpy as np
+import torch
+
+from simpa.core.processing_components.monospectral.noise import GaussianNoise, PoissonNoise, UniformNoise, \
+    GammaNoise, SaltAndPepperNoise
+from simpa.core.processing_components.multispectral.linear_unmixing import LinearUnmixing
+from simpa.core.simulation_modules.reconstruction_module.reconstruction_utils import tukey_bandpass_filtering, \
+    butter_bandpass_filtering
+from simpa.io_handling import save_hdf5, save_data_field
+from simpa.utils import Tags
+from simpa.utils.libraries.spectrum_library import get_simpa_internal_absorption_spectra_by_names
+from simpa_benchmarks.benchmark import benchmark, get_cube_settings, SIZES
+from simpa_benchmarks.reconstruction import create_time_series_data
+
+NOISE_MODELS = {
+    "gaussian": GaussianNoise,
+    "poisson": PoissonNoise,
+    "uniform": UniformNoise,
+    "gamma": GammaNoise,
+    "salt_and_pepper": SaltAndPepperNoise
+}
+BANDPASS_FILTERS = {
+    "tukey": tukey_bandpass_filtering,
+    "butterworth": butter_bandpass_filtering
+}
+UNMIXING_WAVELENGTHS = [700, 750, 800, 850, 900]
+
+
+@benchmark(size=list(SIZES.keys()), method=list(BANDPASS_FILTERS.keys()))
+def bandpass_filtering(directory, size, method):
+    """
+    Filters the time series data of a linear array with the default cutoff frequencies.
+    """
+    time_series_data, _ = create_time_series_data(size)
+    # the time spacing of 40 MHz sampling
+    return lambda: BANDPASS_FILTERS[method](time_series_data, time_spacing_in_ms=2.5e-5)
+
+
+@benchmark(size=list(SIZES.keys()), noise_model=list(NOISE_MODELS.keys()))
+def noise(directory, size, noise_model):
+    """
+    Applies a noise model with its default parameters to a volume of positive values.
+    """
+    settings = get_cube_settings(directory, size)
+    settings["noise"] = {Tags.DATA_FIELD: Tags.DATA_FIELD_INITIAL_PRESSURE}
+    model = NOISE_MODELS[noise_model](settings, "noise")
+    data_tensor = torch.rand((SIZES[size],) * 3, dtype=torch.float32, device=model.torch_device) + 1
+    generator = torch.Generator(device=model.torch_device)
+    generator.manual_seed(settings[Tags.RANDOM_SEED])
+    return lambda: model.apply_noise(data_tensor.clone(), generator)
+
+
+@benchmark(size=list(SIZES.keys()), non_negative=[False, True])
+def linear_unmixing(directory, size, non_negative):
+    """
+    Unmixes oxy- and deoxyhemoglobin from the absorption of five wavelengths and computes the oxygenation.
+    """
+    settings = get_cube_settings(directory, size)
+    settings[Tags.WAVELENGTHS] = UNMIXING_WAVELENGTHS
+    settings[Tags.SIMPA_OUTPUT_FILE_PATH] = os.path.join(directory, "benchmark.hdf5")
+    spectra = get_simpa_internal_absorption_spectra_by_names([Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_OXYHEMOGLOBIN,
+                                                             Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_DEOXYHEMOGLOBIN])
+    settings["linear_unmixing"] = {
+        Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+        Tags.WAVELENGTHS: UNMIXING_WAVELENGTHS,
+        Tags.LINEAR_UNMIXING_SPECTRA: spectra,
+        Tags.LINEAR_UNMIXING_NON_NEGATIVE: non_negative,
+        Tags.LINEAR_UNMIXING_COMPUTE_SO2: True
+    }
+
+    save_hdf5({Tags.SETTINGS: settings}, settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+    concentrations = np.random.random((len(spectra),) + (SIZES[size],) * 3)
+    for wavelength in UNMIXING_WAVELENGTHS:
+        absorption = sum(spectrum.get_value_for_wavelength(wavelength) * concentration
+                         for spectrum, concentration in zip(spectra, concentrations))
+        save_data_field(absorption, settings[Tags.SIMPA_OUTPUT_FILE_PATH], Tags.DATA_FIELD_ABSORPTION_PER_CM,
+                        wavelength)
+
+    unmixing = LinearUnmixing(settings, "linear_unmixing")
+    return lambda: unmixing.run(None)
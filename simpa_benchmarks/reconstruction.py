@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+
+from simpa.core.device_digital_twins import LinearArrayDetectionGeometry
+from simpa.core.simulation_modules.reconstruction_module.delay_and_sum_adapter import \
+    reconstruct_delay_and_sum_pytorch
+from simpa.core.simulation_modules.reconstruction_module.delay_multiply_and_sum_adapter import \
+    reconstruct_delay_multiply_and_sum_pytorch
+from simpa.core.simulation_modules.reconstruction_module.signed_delay_multiply_and_sum_adapter import \
+    reconstruct_signed_delay_multiply_and_sum_pytorch
+from simpa_benchmarks.benchmark import benchmark, SIZES
+
+RECONSTRUCTION_ALGORITHMS = {
+    "DAS": reconstruct_delay_and_sum_pytorch,
+    "DMAS": reconstruct_delay_multiply_and_sum_pytorch,
+    "sDMAS": reconstruct_signed_delay_multiply_and_sum_pytorch
+}
+# Number of time steps per detector element.
+TIME_STEPS_PER_ELEMENT = 8
+PITCH_MM = 0.5
+
+
+def create_time_series_data(size: str) -> tuple:
+    """
+    Creates random time series data of a linear array with one detector element per voxel of the benchmark size.
+
+    :param size: the benchmark size, see SIZES.
+    :return: the time series data of shape (detector elements, time steps) and the detection geometry.
+    """
+    number_detector_elements = SIZES[size]
+    detection_geometry = LinearArrayDetectionGeometry(pitch_mm=PITCH_MM,
+                                                      number_detector_elements=number_detector_elements)
+    time_series_data = np.random.random((number_detector_elements,
+                                         TIME_STEPS_PER_ELEMENT * number_detector_elements)).astype(np.float32)
+    return time_series_data, detection_geometry
+
+
+@benchmark(size=list(SIZES.keys()), algorithm=list(RECONSTRUCTION_ALGORITHMS.keys()))
+def reconstruction(directory, size, algorithm):
+    """
+    Reconstructs an image from the time series data of a linear array with the image spacing equal to the pitch.
+    """
+    time_series_data, detection_geometry = create_time_series_data(size)
+    return lambda: RECONSTRUCTION_ALGORITHMS[algorithm](time_series_data, detection_geometry,
+                                                         sensor_spacing_in_mm=PITCH_MM)
@@ -0,0 +1,35 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from simpa.utils import TISSUE_LIBRARY
+from simpa.utils.libraries.spectrum_library import AbsorptionSpectrumLibrary, SpectrumRegistry
+from simpa_benchmarks.benchmark import benchmark
+
+
+@benchmark(cache=["cold", "warm"])
+def spectrum_lookup(directory, cache):
+    """
+    Looks up every absorption spectrum by name. With a cold cache, the spectrum files are searched, loaded and
+    interpolated again for every call.
+    """
+    def lookup():
+        if cache == "cold":
+            SpectrumRegistry().clear()
+        library = AbsorptionSpectrumLibrary()
+        for spectrum_name in library.get_spectra_names():
+            library.get_spectrum_by_name(spectrum_name).get_value_for_wavelength(800)
+    return lookup
+
+
+@benchmark(cache=["cold", "warm"])
+def tissue_library(directory, cache):
+    """
+    Creates the molecular compositions of common tissues, which looks up the spectra of all of their molecules.
+    """
+    def create_tissues():
+        if cache == "cold":
+            SpectrumRegistry().clear()
+        return [TISSUE_LIBRARY.muscle(), TISSUE_LIBRARY.blood(), TISSUE_LIBRARY.epidermis(), TISSUE_LIBRARY.dermis(),
+                TISSUE_LIBRARY.soft_tissue()]
+    return create_tissues
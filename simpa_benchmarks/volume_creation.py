@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+from simpa.core.simulation_modules.volume_creation_module.model_based_adapter import ModelBasedAdapter
+from simpa.utils import Tags, TISSUE_LIBRARY
+from simpa.utils.libraries.heterogeneity_generator import RandomHeterogeneity, SpectralRandomHeterogeneity, \
+    BlobHeterogeneity, SpectralBlobHeterogeneity
+from simpa.utils.libraries.structure_library import define_horizontal_layer_structure_settings, \
+    define_circular_tubular_structure_settings, define_elliptical_tubular_structure_settings, \
+    define_spherical_structure_settings, define_rectangular_cuboid_structure_settings, \
+    define_parallelepiped_structure_settings, define_vessel_structure_settings, define_background_structure_settings
+from simpa_benchmarks.benchmark import benchmark, get_cube_settings, SIZES
+
+
+def create_structure_settings(structure_type: str, edge_length_mm: float) -> dict:
+    """
+    Creates the settings of a structure of the given type that extends over the centre of a cubic phantom.
+
+    :param structure_type: the structure type, e.g. Tags.SPHERICAL_STRUCTURE.
+    :param edge_length_mm: the edge length of the phantom.
+    :return: the structure settings.
+    """
+    centre_mm = edge_length_mm / 2
+    radius_mm = edge_length_mm / 8
+    if structure_type == Tags.HORIZONTAL_LAYER_STRUCTURE:
+        return define_horizontal_layer_structure_settings(TISSUE_LIBRARY.epidermis(), z_start_mm=centre_mm,
+                                                          thickness_mm=radius_mm, consider_partial_volume=True)
+    if structure_type == Tags.CIRCULAR_TUBULAR_STRUCTURE:
+        return define_circular_tubular_structure_settings([centre_mm, 0, centre_mm],
+                                                          [centre_mm, edge_length_mm, centre_mm],
+                                                          TISSUE_LIBRARY.blood(), radius_mm=radius_mm,
+                                                          consider_partial_volume=True)
+    if structure_type == Tags.ELLIPTICAL_TUBULAR_STRUCTURE:
+        return define_elliptical_tubular_structure_settings([centre_mm, 0, centre_mm],
+                                                            [centre_mm, edge_length_mm, centre_mm],
+                                                            TISSUE_LIBRARY.blood(), radius_mm=radius_mm,
+                                                            consider_partial_volume=True)
+    if structure_type == Tags.SPHERICAL_STRUCTURE:
+        return define_spherical_structure_settings([centre_mm, centre_mm, centre_mm], TISSUE_LIBRARY.blood(),
+                                                   radius_mm=radius_mm, consider_partial_volume=True)
+    if structure_type == Tags.RECTANGULAR_CUBOID_STRUCTURE:
+        return define_rectangular_cuboid_structure_settings([centre_mm - radius_mm] * 3, [2 * radius_mm] * 3,
+                                                            TISSUE_LIBRARY.blood())
+    if structure_type == Tags.PARALLELEPIPED_STRUCTURE:
+        return define_parallelepiped_structure_settings([centre_mm - radius_mm] * 3, [2 * radius_mm, radius_mm, 0],
+                                                        [0, 2 * radius_mm, radius_mm], [radius_mm, 0, 2 * radius_mm],
+                                                        TISSUE_LIBRARY.blood())
+    if structure_type == Tags.VESSEL_STRUCTURE:
+        return define_vessel_structure_settings([centre_mm, 0, centre_mm], [0, 1, 0], TISSUE_LIBRARY.blood(),
+                                                radius_mm=radius_mm, bifurcation_length_mm=edge_length_mm,
+                                                consider_partial_volume=True)
+    raise ValueError(f"The structure type {structure_type} is not supported by the benchmarks.")
+
+
+@benchmark(size=list(SIZES.keys()),
+           structure_type=[Tags.BACKGROUND, Tags.HORIZONTAL_LAYER_STRUCTURE, Tags.CIRCULAR_TUBULAR_STRUCTURE,
+                           Tags.ELLIPTICAL_TUBULAR_STRUCTURE, Tags.SPHERICAL_STRUCTURE,
+                           Tags.RECTANGULAR_CUBOID_STRUCTURE, Tags.PARALLELEPIPED_STRUCTURE, Tags.VESSEL_STRUCTURE])
+def volume_creation(directory, size, structure_type):
+    """
+    Creates the simulation volume of a muscle background with a single structure.
+    """
+    settings = get_cube_settings(directory, size)
+    structures = {"background": define_background_structure_settings(TISSUE_LIBRARY.muscle())}
+    if structure_type != Tags.BACKGROUND:
+        structures["structure"] = create_structure_settings(structure_type, settings[Tags.DIM_VOLUME_X_MM])
+    settings.set_volume_creation_settings({Tags.STRUCTURES: structures})
+    return ModelBasedAdapter(settings).create_simulation_volume
+
+
+@benchmark(size=list(SIZES.keys()), generator=["random", "spectral_random", "blob", "spectral_blob"])
+def heterogeneity_generator(directory, size, generator):
+    """
+    Creates a blurred random or a blob-like heterogeneity map with the scipy/sklearn generators and their spectral
+    torch counterparts.
+    """
+    edge_length = SIZES[size]
+    shape = (edge_length, edge_length, edge_length)
+    if generator == "random":
+        return lambda: RandomHeterogeneity(*shape, spacing_mm=0.5, gaussian_blur_size_mm=2).get_map()
+    if generator == "spectral_random":
+        return lambda: SpectralRandomHeterogeneity(*shape, spacing_mm=0.5, gaussian_blur_size_mm=2).get_map()
+    if generator == "blob":
+        return lambda: BlobHeterogeneity(*shape, spacing_mm=0.5).get_map()
+    return lambda: SpectralBlobHeterogeneity(*shape, spacing_mm=0.5).get_map()
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import unittest
+
+import numpy as np
+
+from simpa.utils import Tags
+from simpa.utils.settings import Settings
+from simpa.utils.deformation_manager import create_deformation_settings, get_functional_from_deformation_settings, \
+    get_deformation_surface_mm, clear_deformation_surface_cache
+from simpa.utils.libraries.tissue_library import TISSUE_LIBRARY
+from simpa.utils.libraries.structure_library import HorizontalLayerStructure, CircularTubularStructure, \
+    define_horizontal_layer_structure_settings, define_circular_tubular_structure_settings
+
+
+class TestDeformation(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(4711)
+        clear_deformation_surface_cache()
+        self.deformation_settings = create_deformation_settings(bounds_mm=[[0, 20], [0, 15]],
+                                                                maximum_z_elevation_mm=3,
+                                                                filter_sigma=0,
+                                                                cosine_scaling_factor=1)
+        self.global_settings = Settings({
+            Tags.SPACING_MM: 0.5,
+            Tags.DIM_VOLUME_X_MM: 20,
+            Tags.DIM_VOLUME_Y_MM: 15,
+            Tags.DIM_VOLUME_Z_MM: 10,
+            Tags.GPU: False
+        })
+        self.global_settings.set_volume_creation_settings({
+            Tags.SIMULATE_DEFORMED_LAYERS: True,
+            Tags.DEFORMED_LAYERS_SETTINGS: self.deformation_settings
+        })
+
+    def test_surface_equals_the_cubic_interpolation(self):
+        surface = get_deformation_surface_mm(self.deformation_settings, [40, 30, 20], 0.5)
+        functional = get_functional_from_deformation_settings(self.deformation_settings)
+        eval_points = tuple(np.meshgrid(np.arange(40) * 0.5, np.arange(30) * 0.5, indexing="ij"))
+
+        self.assertEqual(tuple(surface.shape), (40, 30))
+        np.testing.assert_allclose(surface.numpy(), functional(eval_points), atol=1e-5)
+
+    def test_structures_share_the_surface(self):
+        layer = HorizontalLayerStructure(self.global_settings, Settings(define_horizontal_layer_structure_settings(
+            TISSUE_LIBRARY.muscle(), z_start_mm=3, thickness_mm=2, consider_partial_volume=True,
+            adhere_to_deformation=True)))
+        tube = CircularTubularStructure(self.global_settings, Settings(define_circular_tubular_structure_settings(
+            [10, 0, 5], [10, 15, 5], TISSUE_LIBRARY.blood(), radius_mm=2, consider_partial_volume=True,
+            adhere_to_deformation=True)))
+        self.assertIs(layer.get_deformation_surface_mm(), tube.get_deformation_surface_mm())
+
+        # the layer follows the deformation surface like with the cubic scipy interpolation
+        eval_points = tuple(np.meshgrid(np.arange(40) * 0.5, np.arange(30) * 0.5, indexing="ij"))
+        surface_voxels = layer.deformation_functional_mm(eval_points) / 0.5
+        volume = layer.geometrical_volume
+        for x, y in [(0, 0), (20, 15), (39, 29)]:
+            z_voxels = np.arange(20) - 6 + surface_voxels[x, y]
+            expected = np.clip(np.minimum(z_voxels + 1, 4 - z_voxels), 0, 1)
+            np.testing.assert_allclose(volume[x, y, :], expected, atol=1e-5)
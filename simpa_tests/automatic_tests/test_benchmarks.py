@@ -0,0 +1,40 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import json
+import unittest
+
+from simpa_benchmarks import run_benchmarks, compare_results, load_benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_all_small_benchmarks_run(self):
+        results = run_benchmarks(sizes=["small"], repeat=1, warmup=0)
+        # the results are machine-comparable JSON documents
+        results = json.loads(json.dumps(results))
+
+        self.assertIn("processor", results["metadata"])
+        self.assertIn("simpa", results["metadata"])
+        names = {result["name"] for result in results["benchmarks"]}
+        self.assertEqual(names, {benchmark.name for benchmark in load_benchmarks()})
+        for result in results["benchmarks"]:
+            self.assertNotIn(result["params"].get("size", "small"), ["medium", "large"])
+            self.assertEqual(len(result["wall_times_s"]), 1)
+            self.assertGreater(result["median_s"], 0)
+
+    def test_compare_results(self):
+        baseline = run_benchmarks(pattern="^hdf5_load$", sizes=["small"], repeat=2, warmup=0)
+        self.assertEqual(len(baseline["benchmarks"]), 3)
+        contender = json.loads(json.dumps(baseline))
+        contender["benchmarks"][0]["median_s"] *= 2
+
+        comparison = compare_results(baseline, contender)
+        self.assertEqual(len(comparison), 3)
+        self.assertAlmostEqual(comparison[0]["ratio"], 2)
+        self.assertAlmostEqual(comparison[1]["ratio"], 1)
+
+    def test_unknown_sizes_raise_an_error(self):
+        with self.assertRaises(ValueError):
+            run_benchmarks(sizes=["huge"])
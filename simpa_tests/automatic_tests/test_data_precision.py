@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+import unittest
+
+import numpy as np
+import torch
+
+import simpa as sp
+from simpa import ModelBasedAdapter, GaussianNoise
+from simpa.core.simulation_modules.optical_module.optical_test_adapter import OpticalTestAdapter
+from simpa.core.simulation_modules.acoustic_module.acoustic_test_adapter import AcousticTestAdapter
+from simpa.core.simulation_modules.reconstruction_module.reconstruction_test_adapter import \
+    ReconstructionTestAdapter
+from simpa.utils import Tags, Settings
+from simpa.utils.data_precision import cast_to_data_precision
+from simpa_tests.test_utils import create_test_structure_parameters
+
+
+class TestDataPrecision(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = Settings({
+            Tags.RANDOM_SEED: 4711,
+            Tags.VOLUME_NAME: "TestDataPrecision",
+            Tags.SIMULATION_PATH: ".",
+            Tags.SPACING_MM: 0.5,
+            Tags.DIM_VOLUME_Z_MM: 5,
+            Tags.DIM_VOLUME_X_MM: 5,
+            Tags.DIM_VOLUME_Y_MM: 5,
+            Tags.WAVELENGTHS: [800],
+            Tags.GPU: False
+        })
+        self.settings.set_volume_creation_settings({
+            Tags.STRUCTURES: create_test_structure_parameters()
+        })
+        self.settings.set_optical_settings({Tags.OPTICAL_MODEL: Tags.OPTICAL_MODEL_TEST})
+        self.settings.set_acoustic_settings({})
+        self.settings.set_reconstruction_settings({})
+        self.settings["noise_initial_pressure"] = {
+            Tags.NOISE_MEAN: 1,
+            Tags.NOISE_STD: 1e-12,
+            Tags.NOISE_MODE: Tags.NOISE_MODE_MULTIPLICATIVE,
+            Tags.DATA_FIELD: Tags.DATA_FIELD_INITIAL_PRESSURE
+        }
+        self.device = sp.RSOMExplorerP50(0.1, 1, 1)
+
+    def simulate(self, data_precision=None) -> dict:
+        if data_precision is not None:
+            self.settings[Tags.DATA_PRECISION] = data_precision
+        pipeline = [
+            ModelBasedAdapter(self.settings),
+            OpticalTestAdapter(self.settings),
+            GaussianNoise(self.settings, "noise_initial_pressure"),
+            AcousticTestAdapter(self.settings),
+            ReconstructionTestAdapter(self.settings)
+        ]
+        sp.simulate(pipeline, self.settings, self.device)
+        file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+        try:
+            return {data_field: sp.load_data_field(file_path, data_field, 800)
+                    for data_field in [Tags.DATA_FIELD_ABSORPTION_PER_CM, Tags.DATA_FIELD_FLUENCE,
+                                       Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_TIME_SERIES_DATA,
+                                       Tags.DATA_FIELD_RECONSTRUCTED_DATA]}
+        finally:
+            os.remove(file_path)
+
+    def test_single_and_half_precision_match_double_precision(self):
+        double_precision = self.simulate()
+        self.assertEqual(double_precision[Tags.DATA_FIELD_ABSORPTION_PER_CM].dtype, np.float64)
+        self.assertEqual(double_precision[Tags.DATA_FIELD_INITIAL_PRESSURE].dtype, np.float64)
+
+        for data_precision, rtol in [(Tags.DATA_PRECISION_FLOAT32, 1e-6), (Tags.DATA_PRECISION_FLOAT16, 1e-2)]:
+            results = self.simulate(data_precision)
+            for data_field, data in results.items():
+                self.assertEqual(data.dtype, np.dtype(data_precision), data_field)
+            # the time series data of the acoustic test adapter are random
+            for data_field in [Tags.DATA_FIELD_ABSORPTION_PER_CM, Tags.DATA_FIELD_FLUENCE,
+                               Tags.DATA_FIELD_INITIAL_PRESSURE]:
+                self.assertTrue(np.allclose(results[data_field], double_precision[data_field], rtol=rtol, atol=0),
+                                data_field)
+
+    def test_cast_to_data_precision(self):
+        settings = Settings({Tags.DATA_PRECISION: Tags.DATA_PRECISION_FLOAT16})
+        data = np.ones((2, 2))
+        self.assertEqual(cast_to_data_precision(data, settings).dtype, np.float16)
+        self.assertEqual(cast_to_data_precision(torch.ones((2, 2)), settings).dtype, np.float16)
+        # values outside of the range of half precision are stored in single precision
+        self.assertEqual(cast_to_data_precision(data * 1e6, settings).dtype, np.float32)
+        self.assertEqual(cast_to_data_precision(np.ones((2, 2), dtype=np.int32), settings).dtype, np.int32)
+        # without Tags.DATA_PRECISION, the data is only cast if a default is given
+        self.assertIs(cast_to_data_precision(data, Settings()), data)
+        self.assertEqual(cast_to_data_precision(data.astype(np.float32), Settings(), np.float64).dtype, np.float64)
+        with self.assertRaises(ValueError):
+            cast_to_data_precision(data, Settings({Tags.DATA_PRECISION: "float8"}))
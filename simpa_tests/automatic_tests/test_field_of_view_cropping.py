@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from simpa import FieldOfViewCropping
+from simpa.core.device_digital_twins import RSOMExplorerP50
+from simpa.core.processing_components.monospectral.field_of_view_cropping import get_field_of_view_voxels, \
+    get_field_of_view_region
+from simpa.io_handling import save_hdf5, save_data_field, load_data_field
+from simpa.utils import Tags, Settings
+
+
+class TestFieldOfViewCropping(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, "field_of_view_cropping.hdf5")
+        self.device = RSOMExplorerP50(0.1, 1, 1)
+        self.settings = Settings({
+            Tags.WAVELENGTHS: [700, 800],
+            Tags.WAVELENGTH: 800,
+            Tags.SPACING_MM: 0.5,
+            Tags.SIMPA_OUTPUT_FILE_PATH: self.file_path
+        })
+        save_hdf5({Tags.SETTINGS: self.settings}, self.file_path)
+        self.volume = np.arange(20 * 12 * 16, dtype=np.float32).reshape((20, 12, 16))
+        self.image = np.arange(20 * 16, dtype=np.float32).reshape((20, 16))
+        save_data_field(self.volume, self.file_path, Tags.DATA_FIELD_FLUENCE, 800)
+        save_data_field(self.image, self.file_path, Tags.DATA_FIELD_INITIAL_PRESSURE, 800)
+        save_data_field(self.volume.astype(np.int32), self.file_path, Tags.DATA_FIELD_SEGMENTATION)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cropping_of_volumes_and_images(self):
+        field_of_view_voxels = get_field_of_view_voxels(self.device, 0.5)
+        expected_volume = np.squeeze(self.volume[get_field_of_view_region(field_of_view_voxels, 3)])
+        expected_image = np.squeeze(self.image[get_field_of_view_region(field_of_view_voxels, 2)])
+
+        FieldOfViewCropping(self.settings).run(self.device)
+
+        np.testing.assert_array_equal(load_data_field(self.file_path, Tags.DATA_FIELD_FLUENCE, 800), expected_volume)
+        np.testing.assert_array_equal(load_data_field(self.file_path, Tags.DATA_FIELD_INITIAL_PRESSURE, 800),
+                                      expected_image)
+        np.testing.assert_array_equal(load_data_field(self.file_path, Tags.DATA_FIELD_SEGMENTATION),
+                                      expected_volume.astype(np.int32))
+
+    def test_wavelength_independent_fields_are_cropped_in_the_last_wavelength(self):
+        self.settings[Tags.WAVELENGTH] = 700
+        save_data_field(self.volume, self.file_path, Tags.DATA_FIELD_FLUENCE, 700)
+
+        FieldOfViewCropping(self.settings).run(self.device)
+
+        self.assertEqual(load_data_field(self.file_path, Tags.DATA_FIELD_SEGMENTATION).shape, self.volume.shape)
+        self.assertNotEqual(load_data_field(self.file_path, Tags.DATA_FIELD_FLUENCE, 700).shape, self.volume.shape)
+        self.assertEqual(load_data_field(self.file_path, Tags.DATA_FIELD_FLUENCE, 800).shape, self.volume.shape)
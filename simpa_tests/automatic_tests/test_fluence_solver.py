@@ -0,0 +1,144 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+import simpa as sp
+from simpa import ModelBasedAdapter, IterativeqPAI
+from simpa.core.simulation_modules.optical_module.fluence_solver import FluenceSolverBase, \
+    OpticalAdapterFluenceSolver
+from simpa.core.simulation_modules.optical_module.optical_test_adapter import OpticalTestAdapter
+from simpa.utils import Tags, Settings
+from simpa_tests.test_utils import create_test_structure_parameters
+
+
+class RecordingFluenceSolver(FluenceSolverBase):
+
+    def __init__(self):
+        super(RecordingFluenceSolver, self).__init__()
+        self.number_of_photons = []
+        self.initial_fluences = []
+        self.closed = False
+
+    def solve(self, absorption_cm, number_of_photons=None, initial_fluence=None):
+        self.number_of_photons.append(number_of_photons)
+        self.initial_fluences.append(initial_fluence)
+        return len(self.number_of_photons) * np.ones_like(absorption_cm)
+
+    def close(self):
+        self.closed = True
+
+
+class TestFluenceSolver(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = Settings({
+            Tags.RANDOM_SEED: 4711,
+            Tags.VOLUME_NAME: "TestFluenceSolver",
+            Tags.SIMULATION_PATH: self.directory.name,
+            Tags.SPACING_MM: 0.5,
+            Tags.DIM_VOLUME_Z_MM: 10,
+            Tags.DIM_VOLUME_X_MM: 10,
+            Tags.DIM_VOLUME_Y_MM: 10,
+            Tags.WAVELENGTHS: [800],
+            Tags.GPU: False
+        })
+        self.settings.set_volume_creation_settings({
+            Tags.STRUCTURES: create_test_structure_parameters()
+        })
+        self.settings.set_optical_settings({
+            Tags.OPTICAL_MODEL: Tags.OPTICAL_MODEL_TEST,
+            Tags.OPTICAL_MODEL_NUMBER_PHOTONS: 1000
+        })
+        self.device = sp.RSOMExplorerP50(0.1, 1, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_optical_adapter_fluence_solver(self):
+        adapter = OpticalTestAdapter(self.settings)
+        solver = OpticalAdapterFluenceSolver(adapter)
+        absorption = np.random.random((4, 5, 6)) + 0.1
+        scattering = np.random.random((4, 5, 6)) + 10
+        anisotropy = 0.9 * np.ones((4, 5, 6))
+        geometry = self.device.get_illumination_geometry()
+
+        solver.set_medium(scattering, anisotropy, [geometry, geometry])
+        fluence = solver.solve(absorption, number_of_photons=10)
+
+        np.testing.assert_allclose(fluence, absorption / ((1 - anisotropy) * scattering))
+        self.assertEqual(adapter.component_settings[Tags.OPTICAL_MODEL_NUMBER_PHOTONS], 10)
+        self.assertAlmostEqual(adapter.component_settings[Tags.MCX_ASSUMED_ANISOTROPY], 0.9)
+
+        solver.close()
+        self.assertEqual(adapter.component_settings[Tags.OPTICAL_MODEL_NUMBER_PHOTONS], 1000)
+        self.assertNotIn(Tags.MCX_ASSUMED_ANISOTROPY, adapter.component_settings)
+
+        with self.assertRaises(TypeError):
+            solver.set_medium(scattering, anisotropy, "not a device")
+
+    def test_iterative_qpai_increases_the_number_of_photons(self):
+        sp.simulate([ModelBasedAdapter(self.settings), OpticalTestAdapter(self.settings)],
+                    self.settings, self.device)
+        self.assertTrue(os.path.exists(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]))
+        self.settings[("iterative_qpai", dict)] = {
+            Tags.ITERATIVE_RECONSTRUCTION_MAX_ITERATION_NUMBER: 8,
+            Tags.ITERATIVE_RECONSTRUCTION_INITIAL_PHOTON_FRACTION: 0.25,
+            Tags.ITERATIVE_RECONSTRUCTION_PHOTON_GROWTH_FACTOR: 2,
+            Tags.ITERATIVE_RECONSTRUCTION_STOPPING_LEVEL: 1e10,
+            Tags.DOWNSCALE_FACTOR: 1
+        }
+        solver = RecordingFluenceSolver()
+        reconstruction = IterativeqPAI(self.settings, "iterative_qpai", fluence_solver=solver)
+        absorption, intermediate_absorptions = reconstruction.iterative_absorption_reconstruction(self.device)
+        self.assertIsInstance(absorption, np.ndarray)
+        # without Tags.DATA_PRECISION, the iteration is computed in double precision
+        self.assertEqual(absorption.dtype, np.float64)
+        self.assertEqual(len(intermediate_absorptions), 4)
+        self.assertIsInstance(intermediate_absorptions[0], np.ndarray)
+
+        # every iteration counts as converged, which is only accepted with the full number of photons
+        self.assertEqual(solver.number_of_photons, [250, 500, 1000, 1000])
+        self.assertIsNone(solver.initial_fluences[0])
+        self.assertIsNotNone(solver.initial_fluences[1])
+        self.assertTrue(solver.closed)
+
+        self.assertEqual(reconstruction.number_of_photons_for_iteration(iteration=1, max_iterations=2), 1000)
+
+    def test_iterative_qpai_updates_on_the_processing_device(self):
+        self.settings.get_optical_settings()[Tags.LASER_PULSE_ENERGY_IN_MILLIJOULE] = 50
+        self.settings[Tags.DATA_FIELD_GRUNEISEN_PARAMETER] = 0.2
+        self.settings[("iterative_qpai", dict)] = {}
+        reconstruction = IterativeqPAI(self.settings, "iterative_qpai")
+        initial_pressure = np.random.random((6, 5, 4)) + 0.1
+        fluence = np.random.random((6, 5, 4)) + 0.1
+        absorption = np.random.random((6, 5, 4))
+        sigma = np.random.random((6, 5, 4)) * 1e-2
+        factor = 0.2 * 50 / 1000 * 1e6
+
+        expected_absorption = initial_pressure / ((fluence + sigma) * factor)
+        expected_error = np.log10(np.sum(np.square(initial_pressure[:, 2, :] -
+                                                   (absorption * (fluence + sigma) * factor)[:, 2, :])))
+
+        def to_tensor(array):
+            return torch.as_tensor(array, dtype=torch.float64, device=reconstruction.torch_device)
+
+        out = torch.empty_like(to_tensor(absorption))
+        result = reconstruction.update_absorption_estimate(to_tensor(initial_pressure), to_tensor(fluence),
+                                                           to_tensor(sigma), out=out)
+        self.assertIs(result, out)
+        np.testing.assert_allclose(out.cpu().numpy(), expected_absorption)
+        np.testing.assert_allclose(reconstruction.update_absorption_estimate(initial_pressure, fluence, sigma),
+                                   expected_absorption)
+        self.assertAlmostEqual(reconstruction.log_sum_squared_error(to_tensor(initial_pressure), to_tensor(absorption),
+                                                                    to_tensor(fluence), to_tensor(sigma)),
+                               expected_error)
+        self.assertAlmostEqual(reconstruction.log_sum_squared_error(initial_pressure, absorption, fluence, sigma),
+                               expected_error)
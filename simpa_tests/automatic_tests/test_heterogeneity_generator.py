@@ -4,8 +4,11 @@
 
 import unittest
 import numpy as np
+import torch
+from scipy.ndimage import gaussian_filter
 import simpa as sp
 from simpa.utils import Tags
+from simpa.utils.libraries.heterogeneity_generator import gaussian_filter_fft
 
 
 class TestHeterogeneityGenerator(unittest.TestCase):
@@ -32,6 +35,9 @@ class TestHeterogeneityGenerator(unittest.TestCase):
             sp.RandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing),
             sp.RandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, gaussian_blur_size_mm=3),
             sp.BlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing),
+            sp.SpectralRandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing),
+            sp.SpectralRandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, gaussian_blur_size_mm=3),
+            sp.SpectralBlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing),
             sp.ImageHeterogeneity(dimx, dimy, dimz, heterogeneity_image=self.FULL_IMAGE, spacing_mm=self.spacing,
                                   image_pixel_spacing_mm=self.spacing),
             sp.ImageHeterogeneity(dimx, dimy, dimz, heterogeneity_image=self.PARTIAL_IMAGE,
@@ -50,6 +56,10 @@ class TestHeterogeneityGenerator(unittest.TestCase):
             sp.RandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_min=self.MIN, target_max=self.MAX,
                                    gaussian_blur_size_mm=3),
             sp.BlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_min=self.MIN, target_max=self.MAX),
+            sp.SpectralRandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_min=self.MIN,
+                                           target_max=self.MAX, gaussian_blur_size_mm=3),
+            sp.SpectralBlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_min=self.MIN,
+                                         target_max=self.MAX),
             sp.ImageHeterogeneity(dimx, dimy, dimz, heterogeneity_image=self.FULL_IMAGE, spacing_mm=self.spacing,
                                   target_min=self.MIN, target_max=self.MAX),
             sp.ImageHeterogeneity(dimx, dimy, dimz, heterogeneity_image=self.PARTIAL_IMAGE,
@@ -74,6 +84,10 @@ class TestHeterogeneityGenerator(unittest.TestCase):
             sp.RandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_mean=self.MEAN, target_std=self.STD,
                                    gaussian_blur_size_mm=3),
             sp.BlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_mean=self.MEAN, target_std=self.STD),
+            sp.SpectralRandomHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_mean=self.MEAN,
+                                           target_std=self.STD, gaussian_blur_size_mm=3),
+            sp.SpectralBlobHeterogeneity(dimx, dimy, dimz, spacing_mm=self.spacing, target_mean=self.MEAN,
+                                         target_std=self.STD),
             sp.ImageHeterogeneity(dimx, dimy, dimz, heterogeneity_image=self.PARTIAL_IMAGE,
                                   scaling_type=Tags.IMAGE_SCALING_CONSTANT, spacing_mm=self.spacing, constant=0.5,
                                   target_mean=self.MEAN, target_std=self.STD),
@@ -124,6 +138,22 @@ class TestHeterogeneityGenerator(unittest.TestCase):
         for generator in self.HETEROGENEITY_GENERATORS_MEAN_STD:
             self.assert_mean_std(generator)
 
+    def test_spectral_generators_are_reproducible(self):
+        dimx, dimy, dimz = self.TEST_SETTINGS.get_volume_dimensions_voxels()
+        for generator_class in [sp.SpectralRandomHeterogeneity, sp.SpectralBlobHeterogeneity]:
+            first_map = generator_class(dimx, dimy, dimz, spacing_mm=self.spacing, random_state=4711).get_map()
+            second_map = generator_class(dimx, dimy, dimz, spacing_mm=self.spacing, random_state=4711).get_map()
+            third_map = generator_class(dimx, dimy, dimz, spacing_mm=self.spacing, random_state=4712).get_map()
+            np.testing.assert_array_equal(first_map, second_map)
+            self.assertFalse(np.array_equal(first_map, third_map))
+
+    def test_gaussian_filter_fft(self):
+        volume = torch.zeros((32, 33, 34), dtype=torch.float64)
+        volume[16, 16, 17] = 1
+        filtered = gaussian_filter_fft(volume, 2).numpy()
+        expected = gaussian_filter(volume.numpy(), 2, mode="wrap", truncate=8)
+        np.testing.assert_allclose(filtered, expected, atol=1e-10)
+
 
 class TestImageScaling(unittest.TestCase):
     """
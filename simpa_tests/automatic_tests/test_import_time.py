@@ -0,0 +1,64 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import json
+import subprocess
+import sys
+import unittest
+
+# Dependencies that must not be imported by import simpa, as they take seconds to import.
+HEAVY_MODULES = ["torch", "scipy", "h5py", "sklearn", "skimage", "matplotlib", "jdata", "pacfish"]
+
+
+def import_in_subprocess(statement: str) -> dict:
+    """
+    Runs the import statement in a new interpreter and returns the import time in seconds and the heavy
+    dependencies that were imported.
+    """
+    script = f"""
+import json, sys, time
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "modules": [m for m in {HEAVY_MODULES} if m in sys.modules]}}))
+"""
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_simpa_does_not_import_heavy_dependencies(self):
+        result = import_in_subprocess("import simpa")
+        self.assertEqual(result["modules"], [])
+        # importing the heavy dependencies alone takes seconds, the generous bound avoids flaky failures
+        self.assertLess(result["duration"], 2.0)
+
+        result = import_in_subprocess("from simpa import Tags, Settings, Logger")
+        self.assertEqual(result["modules"], [])
+
+    def test_attributes_are_imported_on_first_access(self):
+        result = import_in_subprocess("import simpa\nsimpa.GaussianNoise")
+        self.assertIn("torch", result["modules"])
+
+        result = import_in_subprocess("from simpa.utils import TISSUE_LIBRARY")
+        self.assertIn("torch", result["modules"])
+        self.assertNotIn("matplotlib", result["modules"])
+        self.assertNotIn("sklearn", result["modules"])
+
+    def test_submodules_of_the_former_wildcard_imports_are_resolved(self):
+        import simpa
+        from simpa.utils import calculate, constants, libraries, settings, tags, path_manager, tissue_properties
+        self.assertIs(simpa.calculate, calculate)
+        self.assertIs(simpa.tags, tags)
+        for module in [constants, libraries, settings, path_manager, tissue_properties]:
+            self.assertIs(getattr(simpa, module.__name__.split(".")[-1]), module)
+        for name in ["deformation_manager", "dict_path_manager", "processing_device", "serializer"]:
+            self.assertEqual(getattr(simpa, name).__name__, "simpa.utils." + name)
+        for name in ["detection_geometries", "digital_device_twin_base", "illumination_geometries", "pa_devices"]:
+            self.assertEqual(getattr(simpa, name).__name__, "simpa.core.device_digital_twins." + name)
+        self.assertIs(simpa.calculate.calculate_oxygenation, simpa.calculate_oxygenation)
+
+        result = import_in_subprocess("import simpa\nsimpa.tags.Tags\nsimpa.settings.Settings")
+        self.assertEqual(result["modules"], [])
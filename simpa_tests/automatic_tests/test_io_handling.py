@@ -2,25 +2,33 @@
 # SPDX-FileCopyrightText: 2021 Janek Groehl
 # SPDX-License-Identifier: MIT
 
+import importlib.util
+import shutil
 import unittest
 
 from simpa.io_handling import load_hdf5
 from simpa.io_handling import save_hdf5
+from simpa.io_handling import load_data_field, save_data_field, open_data_field, memory_map_data_field
+from simpa.io_handling import HDF5FileSession, index_hdf5, ShardedDatasetWriter, ShardedDatasetReader
+from simpa.io_handling.io_hdf5 import delete_hdf5_entries, repack_hdf5
+from simpa.io_handling.storage_backend import StorageBackendBase, ZarrStorageBackend
+from simpa.utils.dict_path_manager import generate_dict_path
 from simpa.utils import Tags
 from simpa.utils.settings import Settings
 from simpa.utils.libraries.tissue_library import TISSUE_LIBRARY, AbsorptionSpectrumLibrary
 from simpa_tests.test_utils import assert_equals_recursive
 from simpa.core.device_digital_twins import *
 import os
+import h5py
 import numpy as np
 
 
 class TestIOHandling(unittest.TestCase):
 
     @staticmethod
-    def assert_save_and_read_dictionaries_equal(save_dict, save_string="test.hdf5"):
+    def assert_save_and_read_dictionaries_equal(save_dict, save_string="test.hdf5", compact_metadata=True):
         try:
-            save_hdf5(save_dict, save_string)
+            save_hdf5(save_dict, save_string, compact_metadata=compact_metadata)
             read_dictionary = load_hdf5(save_string)
         except Exception as e:
             raise e
@@ -110,3 +118,318 @@ class TestIOHandling(unittest.TestCase):
         save_dictionary = Settings()
         save_dictionary[Tags.DIGITAL_DEVICE] = device
         self.assert_save_and_read_dictionaries_equal(save_dictionary)
+
+    def test_arrays_are_compressed_at_write_time(self):
+        file_path = "test_compression.hdf5"
+        try:
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path, file_compression="gzip")
+            data = np.random.random((20, 20, 20))
+            save_data_field(data, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            with h5py.File(file_path, "r") as h5file:
+                dataset = h5file["/simulations/optical_forward_model_output/fluence/700"]
+                self.assertEqual(dataset.compression, "gzip")
+                self.assertIsNotNone(dataset.chunks)
+                offset = dataset.id.get_offset()
+
+            # data of the same shape and type is overwritten in place
+            save_data_field(data * 2, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            with h5py.File(file_path, "r") as h5file:
+                self.assertEqual(h5file["/simulations/optical_forward_model_output/fluence/700"].id.get_offset(),
+                                 offset)
+            self.assertTrue(np.allclose(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700), data * 2))
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_delete_entries_and_repack(self):
+        file_path = "test_repack.hdf5"
+        try:
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test", "large": np.random.random((50, 50, 50))})},
+                      file_path, file_compression="gzip")
+            save_data_field(np.random.random((40, 40, 40)), file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            file_size = os.path.getsize(file_path)
+            delete_hdf5_entries(file_path, "large", "/settings/")
+            self.assertTrue(repack_hdf5(file_path))
+            self.assertLess(os.path.getsize(file_path), file_size)
+            self.assertFalse(repack_hdf5(file_path))
+
+            settings = load_data_field(file_path, Tags.SETTINGS)
+            self.assertEqual(settings["test"], "test")
+            self.assertNotIn("large", settings)
+            self.assertEqual(np.shape(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700)), (40, 40, 40))
+            with h5py.File(file_path, "r") as h5file:
+                self.assertEqual(h5file["/simulations/optical_forward_model_output/fluence/700"].compression, "gzip")
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_chunk_shapes_and_partial_reads(self):
+        file_path = "test_chunks.hdf5"
+        try:
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path, file_compression="lzf",
+                      chunk_shapes={Tags.DATA_FIELD_FLUENCE: [None, None, 1]})
+            data = np.random.random((20, 30, 40))
+            save_data_field(data, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            save_data_field(data[0], file_path, Tags.DATA_FIELD_TIME_SERIES_DATA, 700, chunk_shape=(1, None))
+            with open_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700) as fluence:
+                self.assertEqual(fluence.compression, "lzf")
+                self.assertEqual(fluence.chunks, (20, 30, 1))
+                self.assertTrue(np.allclose(fluence[:, 15, :], data[:, 15, :]))
+            with open_data_field(file_path, Tags.DATA_FIELD_TIME_SERIES_DATA, 700) as time_series:
+                self.assertEqual(time_series.chunks, (1, 40))
+
+            self.assertTrue(np.allclose(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700,
+                                                        region=np.s_[:, :, 10]), data[:, :, 10]))
+            self.assertRaises(ValueError, load_data_field, file_path, Tags.SETTINGS, region=np.s_[0])
+            self.assertRaises(ValueError, memory_map_data_field, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_memory_map_uncompressed_data_field(self):
+        file_path = "test_memory_map.hdf5"
+        try:
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path)
+            data = np.random.random((20, 30, 40))
+            save_data_field(data, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            mapped_data = memory_map_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            self.assertTrue(np.allclose(mapped_data[5], data[5]))
+            del mapped_data
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_file_session_reuses_handle(self):
+        file_path = "test_session.hdf5"
+        try:
+            data = np.random.random((10, 10))
+            with HDF5FileSession(file_path) as session:
+                save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path, file_compression="gzip")
+                with HDF5FileSession(file_path):
+                    save_data_field(data, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+                self.assertTrue(np.allclose(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700), data))
+                session.flush()
+                self.assertRaises(RuntimeError, repack_hdf5, file_path, 0)
+                # a complete rewrite of the file within a session replaces the previous content
+                save_hdf5({"other": 1}, file_path)
+                self.assertEqual(load_hdf5(file_path), {"other": 1})
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path)
+            self.assertEqual(load_data_field(file_path, Tags.SETTINGS)["test"], "test")
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def assert_index_of_output_file(self, file_path):
+        save_hdf5({Tags.SIMPA_VERSION: "1.2.3", Tags.SETTINGS: Settings({"test": "test"})}, file_path,
+                  file_compression="gzip")
+        for wavelength in [700, 800]:
+            save_data_field(np.zeros((10, 20, 30)), file_path, Tags.DATA_FIELD_FLUENCE, wavelength)
+            save_data_field(np.zeros((10, 20, 30)), file_path, Tags.DATA_FIELD_ABSORPTION_PER_CM, wavelength)
+        save_data_field(np.zeros((10, 20, 30), dtype=np.int32), file_path, Tags.DATA_FIELD_SEGMENTATION)
+        save_data_field({"chromophore_concentrations": {"Oxyhemoglobin": np.zeros((10, 20, 30))}}, file_path,
+                        Tags.LINEAR_UNMIXING_RESULT)
+
+        index = index_hdf5(file_path)
+        self.assertEqual(index["simpa_version"], "1.2.3")
+        self.assertEqual(index["wavelengths"], [700, 800])
+        self.assertEqual(index["data_fields"], {
+            Tags.DATA_FIELD_ABSORPTION_PER_CM: [700, 800],
+            Tags.DATA_FIELD_FLUENCE: [700, 800],
+            Tags.LINEAR_UNMIXING_RESULT: [],
+            Tags.DATA_FIELD_SEGMENTATION: []
+        })
+        fluence = index["datasets"]["/simulations/optical_forward_model_output/fluence/800"]
+        self.assertEqual(tuple(fluence["shape"]), (10, 20, 30))
+        self.assertEqual(fluence["dtype"], "float64")
+        self.assertEqual(fluence["nbytes"], 10 * 20 * 30 * 8)
+        self.assertLess(fluence["storage_size"], fluence["nbytes"])
+        self.assertEqual(fluence["compression"], "gzip")
+        self.assertEqual(index["datasets"]["/simulations/simulation_properties/seg"]["dtype"], "int32")
+
+    def test_index_hdf5(self):
+        file_path = "test_index.hdf5"
+        try:
+            self.assert_index_of_output_file(file_path)
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "The zarr package is not installed.")
+    def test_index_zarr(self):
+        file_path = "test_index.zarr"
+        try:
+            self.assert_index_of_output_file(file_path)
+        finally:
+            if os.path.exists(file_path):
+                shutil.rmtree(file_path)
+
+    def test_compact_and_legacy_metadata_layout(self):
+        settings = Settings()
+        settings[Tags.SPACING_MM] = 0.5
+        structure_settings = Settings()
+        structure_settings[Tags.MOLECULE_COMPOSITION] = TISSUE_LIBRARY.muscle()
+        structure_settings[Tags.STRUCTURE_TYPE] = Tags.BACKGROUND
+        settings[Tags.STRUCTURES] = Settings({"background": structure_settings})
+        volume_creation_settings = Settings()
+        volume_creation_settings[Tags.INPUT_SEGMENTATION_VOLUME] = np.ones((20, 20, 20), dtype=np.int32)
+        settings[Tags.VOLUME_CREATION_MODEL_SETTINGS] = volume_creation_settings
+        save_dictionary = {Tags.SETTINGS: settings,
+                           Tags.DIGITAL_DEVICE: MSOTAcuityEcho(device_position_mm=np.array([1, 2, 3]))}
+
+        self.assert_save_and_read_dictionaries_equal(save_dictionary, compact_metadata=False)
+        self.assert_save_and_read_dictionaries_equal(save_dictionary)
+
+        file_path = "test_compact.hdf5"
+        try:
+            save_hdf5(save_dictionary, file_path, file_compression="gzip")
+            with h5py.File(file_path, "r") as h5file:
+                objects = []
+                h5file["settings"].visit(objects.append)
+                # one JSON document and one dataset for the segmentation volume
+                self.assertEqual(len(objects), 2)
+
+            # compact metadata can be overwritten by the legacy layout and vice versa
+            save_data_field(settings, file_path, Tags.SETTINGS)
+            save_hdf5(settings, file_path, "/settings/", compact_metadata=False)
+            self.assertTrue(np.all(load_data_field(file_path, Tags.SETTINGS)[Tags.VOLUME_CREATION_MODEL_SETTINGS]
+                                   [Tags.INPUT_SEGMENTATION_VOLUME] == 1))
+            save_data_field(settings, file_path, Tags.SETTINGS)
+
+            delete_hdf5_entries(file_path, Tags.INPUT_SEGMENTATION_VOLUME[0], "/settings/")
+            loaded_settings = load_data_field(file_path, Tags.SETTINGS)
+            self.assertNotIn(Tags.INPUT_SEGMENTATION_VOLUME,
+                             loaded_settings[Tags.VOLUME_CREATION_MODEL_SETTINGS])
+            self.assertEqual(loaded_settings[Tags.SPACING_MM], 0.5)
+            with h5py.File(file_path, "r") as h5file:
+                self.assertEqual(len(h5file["settings"].keys()), 1)
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_delete_entries_of_a_parent(self):
+        settings = Settings({Tags.SPACING_MM: 0.5})
+        settings.set_volume_creation_settings({Tags.INPUT_SEGMENTATION_VOLUME: np.ones((20, 20, 20), dtype=np.int32)})
+        settings["component"] = Settings({Tags.INPUT_SEGMENTATION_VOLUME: np.zeros((20, 20, 20), dtype=np.int32)})
+        file_paths = [("test_delete_parent_compact.hdf5", True), ("test_delete_parent_legacy.hdf5", False)]
+        if importlib.util.find_spec("zarr") is not None:
+            file_paths.append(("test_delete_parent.zarr", True))
+        for file_path, compact_metadata in file_paths:
+            try:
+                save_hdf5({Tags.SETTINGS: settings}, file_path, compact_metadata=compact_metadata)
+                delete_hdf5_entries(file_path, Tags.INPUT_SEGMENTATION_VOLUME[0], "/settings/",
+                                    parent_key=Tags.VOLUME_CREATION_MODEL_SETTINGS[0])
+                loaded_settings = load_data_field(file_path, Tags.SETTINGS)
+                self.assertNotIn(Tags.INPUT_SEGMENTATION_VOLUME, loaded_settings[Tags.VOLUME_CREATION_MODEL_SETTINGS])
+                self.assertTrue(np.all(loaded_settings["component"][Tags.INPUT_SEGMENTATION_VOLUME] == 0))
+            finally:
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                elif os.path.exists(file_path):
+                    os.remove(file_path)
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "The zarr package is not installed.")
+    def test_zarr_storage_backend(self):
+        file_path = "test_storage_backend.zarr"
+        try:
+            save_dictionary = {Tags.SIMPA_VERSION: "1.2.3",
+                               Tags.SETTINGS: Settings({Tags.SPACING_MM: 0.5,
+                                                        Tags.STRUCTURES: Settings({
+                                                            Tags.MOLECULE_COMPOSITION: TISSUE_LIBRARY.muscle()})}),
+                               Tags.DIGITAL_DEVICE: MSOTAcuityEcho(device_position_mm=np.array([1, 2, 3]))}
+            save_hdf5(save_dictionary, file_path, file_compression="gzip",
+                      chunk_shapes={Tags.DATA_FIELD_FLUENCE: [None, None, 1]})
+            self.assertTrue(os.path.isdir(file_path))
+            assert_equals_recursive(save_dictionary, load_hdf5(file_path))
+
+            data = np.random.random((10, 20, 30))
+            save_data_field(data, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            save_data_field(data * 2, file_path, Tags.DATA_FIELD_FLUENCE, 700)
+            save_data_field("mm^-2", file_path, Tags.OPTICAL_MODEL_UNITS, 700)
+            self.assertTrue(np.allclose(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700), data * 2))
+            self.assertEqual(load_data_field(file_path, Tags.OPTICAL_MODEL_UNITS, 700), "mm^-2")
+            self.assertTrue(np.allclose(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700,
+                                                        region=np.s_[:, 5, :]), data[:, 5, :] * 2))
+            with open_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700) as fluence:
+                self.assertEqual(fluence.chunks, (10, 20, 1))
+                self.assertTrue(np.allclose(fluence[0], data[0] * 2))
+
+            delete_hdf5_entries(file_path, Tags.MOLECULE_COMPOSITION[0], "/settings/")
+            self.assertNotIn(Tags.MOLECULE_COMPOSITION,
+                             load_data_field(file_path, Tags.SETTINGS)[Tags.STRUCTURES])
+            self.assertFalse(repack_hdf5(file_path))
+        finally:
+            if os.path.exists(file_path):
+                shutil.rmtree(file_path)
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "The zarr package is not installed.")
+    def test_default_save_region_of_storage_backends(self):
+        file_path = "test_save_region.zarr"
+        storage_backend = ZarrStorageBackend()
+        dictionary_path = generate_dict_path(Tags.DATA_FIELD_FLUENCE, 700)
+        try:
+            save_hdf5({Tags.SETTINGS: Settings({"test": "test"})}, file_path)
+            data = np.random.random((10, 20))
+            # the default implementation of the base class loads and saves the complete array
+            StorageBackendBase.save_region(storage_backend, data[:5], file_path, dictionary_path, np.s_[:5],
+                                           (10, 20), np.dtype(np.float64))
+            StorageBackendBase.save_region(storage_backend, data[5:], file_path, dictionary_path, np.s_[5:],
+                                           (10, 20), np.dtype(np.float64))
+            self.assertTrue(np.array_equal(load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, 700), data))
+        finally:
+            if os.path.exists(file_path):
+                shutil.rmtree(file_path)
+
+    def test_sharded_dataset(self):
+        directory = "test_sharded_dataset"
+        file_paths = [f"test_sharded_dataset_{index}.hdf5" for index in range(5)]
+        device = MSOTAcuityEcho(device_position_mm=np.array([1, 2, 3]))
+        try:
+            for index, file_path in enumerate(file_paths):
+                settings = Settings({Tags.WAVELENGTHS: [700, 800], Tags.RANDOM_SEED: index})
+                settings.set_acoustic_settings({Tags.DATA_FIELD_SPEED_OF_SOUND: 1540})
+                save_hdf5({Tags.SETTINGS: settings, Tags.DIGITAL_DEVICE: device}, file_path)
+                for wavelength in [700, 800]:
+                    save_data_field(np.full((4, 5, 6), index + wavelength, dtype=np.float32), file_path,
+                                    Tags.DATA_FIELD_INITIAL_PRESSURE, wavelength)
+                save_data_field(np.full((4, 5, 6), index, dtype=np.int32), file_path, Tags.DATA_FIELD_SEGMENTATION)
+
+            data_fields = [Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_SEGMENTATION]
+            with ShardedDatasetWriter(directory, data_fields, samples_per_shard=2) as writer:
+                for file_path in file_paths[:3]:
+                    writer.append(file_path)
+            # an existing dataset is continued
+            with ShardedDatasetWriter(directory, data_fields, samples_per_shard=2) as writer:
+                for file_path in file_paths[3:]:
+                    writer.append(file_path)
+                self.assertEqual(len(writer), 5)
+
+            reader = ShardedDatasetReader(directory)
+            self.assertEqual(len(reader), 5)
+            self.assertEqual(reader.wavelengths, [700, 800])
+            self.assertEqual(len(reader.shard_paths), 3)
+            self.assertEqual(reader.locate(3), (os.path.join(directory, "shard_00001.hdf5"), 1))
+            for index in range(5):
+                sample = reader.load_sample(index)
+                self.assertTrue(np.all(sample[Tags.DATA_FIELD_INITIAL_PRESSURE][800] == index + 800))
+                self.assertTrue(np.all(sample[Tags.DATA_FIELD_SEGMENTATION] == index))
+                self.assertEqual(sample[Tags.DATA_FIELD_SEGMENTATION].dtype, np.int32)
+            self.assertEqual(list(reader.load_sample(4, [Tags.DATA_FIELD_INITIAL_PRESSURE], [700])
+                                  [Tags.DATA_FIELD_INITIAL_PRESSURE].keys()), [700])
+            self.assertTrue(np.all(load_data_field(reader.locate(4)[0], Tags.DATA_FIELD_INITIAL_PRESSURE, 700,
+                                                   region=0) == 704))
+
+            metadata = reader.load_metadata(2)
+            self.assertEqual(metadata[Tags.SETTINGS][Tags.RANDOM_SEED], 2)
+            self.assertEqual(metadata[Tags.SETTINGS][Tags.ACOUSTIC_MODEL_SETTINGS][Tags.DATA_FIELD_SPEED_OF_SOUND], 1540)
+            self.assertTrue(isinstance(metadata[Tags.DIGITAL_DEVICE], MSOTAcuityEcho))
+            with h5py.File(reader.index_path, "r") as index_file:
+                # the device and the acoustic settings are shared, the global settings and the index records are not
+                self.assertEqual(len(index_file["metadata"].keys()), 2 + 2 * 5)
+            with h5py.File(reader.locate(4)[0], "r") as shard_file:
+                self.assertEqual(shard_file["simulations/simulation_properties/seg"].shape, (1, 4, 5, 6))
+        finally:
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            for file_path in file_paths:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
@@ -7,8 +7,21 @@ from unittest.case import expectedFailure
 from simpa.utils import Tags, Settings
 from simpa_tests.test_utils.tissue_models import create_simple_tissue_model
 import simpa as sp
+from simpa.core.processing_components.multispectral.linear_unmixing import batched_nnls, clear_unmixing_cache
+from simpa.core.processing_components.multispectral import MultispectralProcessingAlgorithm
 import numpy as np
 import os
+from scipy.optimize import nnls
+
+
+class MeanOverWavelengths(MultispectralProcessingAlgorithm):
+    """
+    Minimal multispectral algorithm that only reads self.data like the algorithms written before the data was loaded
+    lazily.
+    """
+
+    def run(self, device=None):
+        self.mean = np.mean(self.data, axis=0)
 
 
 class TestLinearUnmixing(unittest.TestCase):
@@ -257,3 +270,84 @@ class TestLinearUnmixing(unittest.TestCase):
                 os.path.isfile(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH])):
             # Delete the created file
             os.remove(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+
+    def test_batched_nnls_matches_scipy(self):
+        random_state = np.random.RandomState(4711)
+        for number_of_wavelengths, number_of_endmembers in [(2, 2), (5, 3), (8, 5)]:
+            absorption_matrix = random_state.random_sample((number_of_wavelengths, number_of_endmembers))
+            data = random_state.normal(size=(number_of_wavelengths, 1000))
+            expected = np.stack([nnls(absorption_matrix, data[:, pixel])[0] for pixel in range(data.shape[1])],
+                                axis=1)
+            self.assertTrue(np.allclose(batched_nnls(absorption_matrix, data, chunk_size=300), expected,
+                                        rtol=1e-8, atol=1e-10))
+
+    def test_blockwise_unmixing_matches_complete_unmixing(self):
+        file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+        for non_negative in [False, True]:
+            self.settings["linear_unmixing"] = {
+                Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+                Tags.LINEAR_UNMIXING_SPECTRA:
+                    sp.get_simpa_internal_absorption_spectra_by_names(
+                        [Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_DEOXYHEMOGLOBIN,
+                         Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_OXYHEMOGLOBIN]),
+                Tags.LINEAR_UNMIXING_COMPUTE_SO2: True,
+                Tags.WAVELENGTHS: self.WAVELENGTHS,
+                Tags.LINEAR_UNMIXING_NON_NEGATIVE: non_negative,
+                Tags.SIGNAL_THRESHOLD: 0.1
+            }
+            sp.LinearUnmixing(self.settings, "linear_unmixing").run()
+            expected = sp.load_data_field(file_path, Tags.LINEAR_UNMIXING_RESULT)
+
+            self.settings["linear_unmixing"][Tags.MULTISPECTRAL_BLOCK_SIZE] = 7
+            lu = sp.LinearUnmixing(self.settings, "linear_unmixing")
+            lu.run()
+            # the blocks are released after the unmixing, accessing lu.data would load the complete data
+            self.assertIsNone(lu._data)
+            lu_results = sp.load_data_field(file_path, Tags.LINEAR_UNMIXING_RESULT)
+            self.assertEqual(list(lu_results["wavelengths"]), self.WAVELENGTHS)
+            self.assertTrue(np.allclose(lu_results["sO2"], expected["sO2"]))
+            for chromophore, concentration in expected["chromophore_concentrations"].items():
+                self.assertTrue(np.allclose(lu_results["chromophore_concentrations"][chromophore], concentration))
+
+    def test_endmember_matrices_are_cached(self):
+        clear_unmixing_cache()
+        spectra = sp.get_simpa_internal_absorption_spectra_by_names(
+            [Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_DEOXYHEMOGLOBIN, Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_OXYHEMOGLOBIN])
+        self.settings["linear_unmixing"] = {
+            Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+            Tags.LINEAR_UNMIXING_SPECTRA: spectra,
+            Tags.WAVELENGTHS: self.WAVELENGTHS
+        }
+        first_unmixing = sp.LinearUnmixing(self.settings, "linear_unmixing")
+        first_unmixing.run()
+        second_unmixing = sp.LinearUnmixing(self.settings, "linear_unmixing")
+        second_unmixing.run()
+        self.assertIs(first_unmixing.absorption_matrix, second_unmixing.absorption_matrix)
+        self.assertIs(first_unmixing.pseudo_inverse_absorption_matrix,
+                      second_unmixing.pseudo_inverse_absorption_matrix)
+
+        # spectra with the same names but different values do not share the cached matrices
+        self.settings["linear_unmixing"][Tags.LINEAR_UNMIXING_SPECTRA] = [
+            sp.AbsorptionSpectrumLibrary.CONSTANT_ABSORBER_ARBITRARY(1),
+            sp.ScatteringSpectrumLibrary.CONSTANT_SCATTERING_ARBITRARY(1)]
+        third_unmixing = sp.LinearUnmixing(self.settings, "linear_unmixing")
+        third_unmixing.build_chromophore_spectra_dict()
+        self.settings["linear_unmixing"][Tags.LINEAR_UNMIXING_SPECTRA][0] = \
+            sp.AbsorptionSpectrumLibrary.CONSTANT_ABSORBER_ARBITRARY(2)
+        fourth_unmixing = sp.LinearUnmixing(self.settings, "linear_unmixing")
+        fourth_unmixing.build_chromophore_spectra_dict()
+        self.assertFalse(np.array_equal(third_unmixing.create_absorption_matrix(),
+                                        fourth_unmixing.create_absorption_matrix()))
+
+    def test_data_of_multispectral_algorithms_is_loaded_on_first_access(self):
+        self.settings["mean"] = {
+            Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+            Tags.WAVELENGTHS: self.WAVELENGTHS
+        }
+        algorithm = MeanOverWavelengths(self.settings, "mean")
+        algorithm.run()
+        expected_data = np.asarray([sp.load_data_field(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH],
+                                                       Tags.DATA_FIELD_ABSORPTION_PER_CM, wavelength)
+                                    for wavelength in self.WAVELENGTHS])
+        self.assertEqual(algorithm.data.shape, expected_data.shape)
+        self.assertTrue(np.allclose(algorithm.mean, np.mean(expected_data, axis=0)))
@@ -14,6 +14,7 @@ from simpa.core.simulation import simulate
 from simpa.utils import TISSUE_LIBRARY
 from simpa.io_handling import load_data_field
 from simpa import ModelBasedAdapter
+from simpa.core.processing_components.monospectral.noise.noise_model_base import sample_gamma
 
 
 class TestNoiseModels(unittest.TestCase):
@@ -397,3 +398,78 @@ class TestNoiseModels(unittest.TestCase):
                                           background_value=1.0,
                                           expected_mean=2.0,
                                           expected_std=np.sqrt(1 / 12 * (3 - 1) ** 2))
+
+    def test_composite_noise_matches_sequential_noise_models(self):
+        settings = Settings({
+            Tags.RANDOM_SEED: self.RANDOM_SEED,
+            Tags.VOLUME_NAME: "TestCompositeNoise",
+            Tags.SIMULATION_PATH: ".",
+            Tags.SPACING_MM: self.SPACING,
+            Tags.DIM_VOLUME_Z_MM: 10,
+            Tags.DIM_VOLUME_X_MM: 10,
+            Tags.DIM_VOLUME_Y_MM: 10,
+            Tags.WAVELENGTHS: [800]
+        })
+        settings.set_volume_creation_settings({
+            Tags.STRUCTURES: self.create_background_parameters(background_value=1.0)
+        })
+        settings["gaussian_noise"] = {Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM, Tags.NOISE_STD: 0.1}
+        settings["gamma_noise"] = {Tags.DATA_FIELD: Tags.DATA_FIELD_SCATTERING_PER_CM}
+        settings["uniform_noise"] = {Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+                                     Tags.NOISE_MODE: Tags.NOISE_MODE_MULTIPLICATIVE}
+        noise_models = [GaussianNoise(settings, "gaussian_noise"), GammaNoise(settings, "gamma_noise"),
+                        UniformNoise(settings, "uniform_noise")]
+        composite_noise = CompositeNoise(settings, noise_models)
+        self.assertEqual(composite_noise.get_input_data_fields(), [Tags.DATA_FIELD_ABSORPTION_PER_CM,
+                                                                   Tags.DATA_FIELD_SCATTERING_PER_CM])
+
+        def simulate_data_fields(pipeline):
+            simulate(pipeline, settings, RSOMExplorerP50(0.1, 1, 1))
+            try:
+                return [load_data_field(settings[Tags.SIMPA_OUTPUT_FILE_PATH], data_field, 800)
+                        for data_field in composite_noise.get_input_data_fields()]
+            finally:
+                os.remove(settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+
+        clean_absorption, clean_scattering = simulate_data_fields([ModelBasedAdapter(settings)])
+        noisy_absorption, noisy_scattering = simulate_data_fields([ModelBasedAdapter(settings), composite_noise])
+        # the noise is reproducible
+        self.assertTrue(np.array_equal(noisy_absorption,
+                                       simulate_data_fields([ModelBasedAdapter(settings), composite_noise])[0]))
+
+        # all noise models of a data field are applied in order with a single generator
+        generator = torch.Generator(device=composite_noise.torch_device).manual_seed(self.RANDOM_SEED)
+        absorption = torch.as_tensor(clean_absorption, dtype=torch.float32, device=composite_noise.torch_device)
+        absorption = noise_models[2].apply_noise(noise_models[0].apply_noise(absorption, generator), generator)
+        scattering = torch.as_tensor(clean_scattering, dtype=torch.float32, device=composite_noise.torch_device)
+        scattering = noise_models[1].apply_noise(scattering, generator)
+        self.assertTrue(np.allclose(noisy_absorption, absorption.cpu().numpy()))
+        self.assertTrue(np.allclose(noisy_scattering, scattering.cpu().numpy()))
+        self.assertFalse(np.allclose(noisy_absorption, clean_absorption))
+
+        with self.assertRaises(TypeError):
+            CompositeNoise(settings, [ModelBasedAdapter(settings)])
+
+    def test_composite_noise_does_not_write_into_the_global_settings(self):
+        settings = Settings({Tags.RANDOM_SEED: self.RANDOM_SEED, "CompositeNoise": {Tags.RANDOM_SEED: 1}})
+        first_composite_noise = CompositeNoise(settings, [])
+        second_composite_noise = CompositeNoise(settings, [])
+        self.assertEqual(settings["CompositeNoise"], {Tags.RANDOM_SEED: 1})
+        self.assertEqual(first_composite_noise.component_settings, {})
+        self.assertIsNot(first_composite_noise.component_settings, second_composite_noise.component_settings)
+
+    def test_gamma_noise_with_generator(self):
+        data_tensor = torch.zeros((200, 500))
+        torch.manual_seed(self.RANDOM_SEED)
+        global_random_numbers = torch.rand(10)
+        for shape, scale in [(0.1, 1), (2, 2)]:
+            torch.manual_seed(self.RANDOM_SEED)
+            noise = sample_gamma(shape, scale, data_tensor, torch.Generator().manual_seed(self.RANDOM_SEED))
+            # the global random number generator is not used
+            self.assertTrue(torch.equal(torch.rand(10), global_random_numbers))
+            self.assertTrue(torch.equal(noise, sample_gamma(shape, scale, data_tensor,
+                                                            torch.Generator().manual_seed(self.RANDOM_SEED))))
+            self.assertEqual(noise.shape, data_tensor.shape)
+            self.assertAlmostEqual(noise.mean().item(), shape * scale, delta=0.02 * shape * scale)
+            self.assertAlmostEqual(noise.var().item(), shape * scale ** 2, delta=0.05 * shape * scale ** 2)
+            self.assertGreaterEqual(noise.min().item(), 0)
@@ -0,0 +1,201 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import importlib.util
+import logging
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+import simpa as sp
+from simpa import ModelBasedAdapter, GaussianNoise, LinearUnmixing
+from simpa.core.pipeline_graph import PipelineGraph
+from simpa.core.simulation_modules.optical_module.optical_test_adapter import OpticalTestAdapter
+from simpa.core.simulation_modules.acoustic_module.acoustic_test_adapter import AcousticTestAdapter
+from simpa.core.simulation_modules.reconstruction_module.reconstruction_test_adapter import \
+    ReconstructionTestAdapter
+from simpa.utils import Tags, Settings
+from simpa_tests.test_utils import create_test_structure_parameters
+
+
+class TestPipelineGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.wavelengths = [700, 800]
+        self.settings = Settings({
+            Tags.RANDOM_SEED: 4711,
+            Tags.VOLUME_NAME: "TestPipelineGraph",
+            Tags.SIMULATION_PATH: ".",
+            Tags.SPACING_MM: 0.5,
+            Tags.DIM_VOLUME_Z_MM: 5,
+            Tags.DIM_VOLUME_X_MM: 5,
+            Tags.DIM_VOLUME_Y_MM: 5,
+            Tags.WAVELENGTHS: self.wavelengths,
+            Tags.GPU: False
+        })
+        self.settings.set_volume_creation_settings({
+            Tags.STRUCTURES: create_test_structure_parameters()
+        })
+        self.settings.set_optical_settings({Tags.OPTICAL_MODEL: Tags.OPTICAL_MODEL_TEST})
+        self.settings.set_acoustic_settings({})
+        self.settings.set_reconstruction_settings({})
+        self.settings["noise_initial_pressure"] = {
+            Tags.NOISE_MEAN: 1,
+            Tags.NOISE_STD: 0.1,
+            Tags.NOISE_MODE: Tags.NOISE_MODE_MULTIPLICATIVE,
+            Tags.DATA_FIELD: Tags.DATA_FIELD_INITIAL_PRESSURE
+        }
+        self.settings["noise_time_series"] = {
+            Tags.NOISE_STD: 1,
+            Tags.DATA_FIELD: Tags.DATA_FIELD_TIME_SERIES_DATA
+        }
+        self.settings["linear_unmixing"] = {
+            Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+            Tags.WAVELENGTHS: self.wavelengths,
+            Tags.LINEAR_UNMIXING_SPECTRA: sp.get_simpa_internal_absorption_spectra_by_names(
+                [Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_OXYHEMOGLOBIN,
+                 Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_DEOXYHEMOGLOBIN])
+        }
+        self.device = sp.RSOMExplorerP50(0.1, 1, 1)
+
+    def tearDown(self):
+        if Tags.SIMPA_OUTPUT_FILE_PATH in self.settings and os.path.exists(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]):
+            if os.path.isdir(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]):
+                shutil.rmtree(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+            else:
+                os.remove(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+
+    def create_pipeline(self):
+        return [
+            ModelBasedAdapter(self.settings),
+            OpticalTestAdapter(self.settings),
+            GaussianNoise(self.settings, "noise_initial_pressure"),
+            AcousticTestAdapter(self.settings),
+            GaussianNoise(self.settings, "noise_time_series"),
+            ReconstructionTestAdapter(self.settings),
+            LinearUnmixing(self.settings, "linear_unmixing")
+        ]
+
+    def test_dependencies(self):
+        self.settings[Tags.SIMPA_OUTPUT_FILE_PATH] = "TestPipelineGraph.hdf5"
+        graph = PipelineGraph(self.create_pipeline(), self.settings)
+        nodes = {(node.element_index, node.wavelength): node for node in graph.nodes}
+        self.assertEqual(len(nodes), 6 * len(self.wavelengths) + 1)
+
+        # the optical model reads the volumes of its own wavelength
+        self.assertIn(nodes[(0, 800)], nodes[(1, 800)].dependencies)
+        # the noise on the time series does not depend on the noise on the initial pressure directly
+        self.assertNotIn(nodes[(2, 700)], nodes[(4, 700)].dependencies)
+        # the optical model of the next wavelength does not wait for the reconstruction
+        self.assertNotIn(nodes[(5, 700)], nodes[(1, 800)].dependencies)
+        # the same pipeline element is not run for two wavelengths at the same time
+        self.assertIn(nodes[(1, 700)], nodes[(1, 800)].dependencies)
+        # linear unmixing is run once after the volumes of all wavelengths have been created
+        unmixing = nodes[(6, None)]
+        self.assertIn(nodes[(0, 700)], unmixing.dependencies)
+        self.assertIn(nodes[(0, 800)], unmixing.dependencies)
+
+    def test_graph_execution_matches_sequential_execution(self):
+        results = []
+        for execution_mode in [Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL, Tags.PIPELINE_EXECUTION_MODE_GRAPH]:
+            self.settings[Tags.PIPELINE_EXECUTION_MODE] = execution_mode
+            self.settings[Tags.PIPELINE_MAX_WORKERS] = 3
+            sp.simulate(self.create_pipeline(), self.settings, self.device)
+            file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+            result = {
+                Tags.DATA_FIELD_FLUENCE: [sp.load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, wl)
+                                          for wl in self.wavelengths],
+                Tags.DATA_FIELD_RECONSTRUCTED_DATA: [
+                    sp.load_data_field(file_path, Tags.DATA_FIELD_RECONSTRUCTED_DATA, wl) for wl in self.wavelengths],
+                Tags.LINEAR_UNMIXING_RESULT: sp.load_data_field(file_path, Tags.LINEAR_UNMIXING_RESULT)
+            }
+            results.append(result)
+            os.remove(file_path)
+
+        sequential, graph = results
+        for wl_idx in range(len(self.wavelengths)):
+            self.assertTrue(np.allclose(sequential[Tags.DATA_FIELD_FLUENCE][wl_idx],
+                                        graph[Tags.DATA_FIELD_FLUENCE][wl_idx]))
+            self.assertEqual(np.shape(sequential[Tags.DATA_FIELD_RECONSTRUCTED_DATA][wl_idx]),
+                             np.shape(graph[Tags.DATA_FIELD_RECONSTRUCTED_DATA][wl_idx]))
+        for chromophore, concentration in sequential[Tags.LINEAR_UNMIXING_RESULT]["chromophore_concentrations"].items():
+            self.assertTrue(np.allclose(concentration,
+                                        graph[Tags.LINEAR_UNMIXING_RESULT]["chromophore_concentrations"][chromophore]))
+
+    def simulate_random_time_series(self, execution_mode) -> list:
+        self.settings[Tags.WAVELENGTHS] = [700, 720, 740, 760, 780, 800]
+        self.settings[Tags.PIPELINE_EXECUTION_MODE] = execution_mode
+        self.settings[Tags.PIPELINE_MAX_WORKERS] = 3
+        # the acoustic test adapter draws its time series from numpy's global random state
+        sp.simulate([ModelBasedAdapter(self.settings), OpticalTestAdapter(self.settings),
+                     AcousticTestAdapter(self.settings)], self.settings, self.device)
+        file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+        time_series = [sp.load_data_field(file_path, Tags.DATA_FIELD_TIME_SERIES_DATA, wl)
+                       for wl in self.settings[Tags.WAVELENGTHS]]
+        os.remove(file_path)
+        return time_series
+
+    def test_graph_execution_reproduces_random_numbers(self):
+        sequential = self.simulate_random_time_series(Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL)
+        for _ in range(3):
+            graph = self.simulate_random_time_series(Tags.PIPELINE_EXECUTION_MODE_GRAPH)
+            for sequential_time_series, graph_time_series in zip(sequential, graph):
+                np.testing.assert_array_equal(sequential_time_series, graph_time_series)
+
+    def test_pipelined_execution_reproduces_random_numbers(self):
+        sequential = self.simulate_random_time_series(Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL)
+        for _ in range(3):
+            pipelined = self.simulate_random_time_series(Tags.PIPELINE_EXECUTION_MODE_PIPELINED)
+            for sequential_time_series, pipelined_time_series in zip(sequential, pipelined):
+                np.testing.assert_array_equal(sequential_time_series, pipelined_time_series)
+
+    def test_pipelined_execution_matches_sequential_execution(self):
+        results = []
+        log_messages = []
+        for execution_mode in [Tags.PIPELINE_EXECUTION_MODE_SEQUENTIAL, Tags.PIPELINE_EXECUTION_MODE_PIPELINED]:
+            self.settings[Tags.PIPELINE_EXECUTION_MODE] = execution_mode
+            handler = _RecordingHandler()
+            logging.getLogger("SIMPA Logger").addHandler(handler)
+            try:
+                sp.simulate(self.create_pipeline(), self.settings, self.device)
+            finally:
+                logging.getLogger("SIMPA Logger").removeHandler(handler)
+            log_messages.append([message for message in handler.messages
+                                 if "entire simulation pipeline required" not in message])
+            file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+            results.append([sp.load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, wl) for wl in self.wavelengths])
+            os.remove(file_path)
+
+        self.assertEqual(log_messages[0], log_messages[1])
+        for sequential_fluence, pipelined_fluence in zip(*results):
+            self.assertTrue(np.allclose(sequential_fluence, pipelined_fluence))
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "The zarr package is not installed.")
+    def test_graph_execution_with_zarr_storage_backend(self):
+        results = []
+        for storage_backend in [Tags.STORAGE_BACKEND_HDF5, Tags.STORAGE_BACKEND_ZARR]:
+            self.settings[Tags.PIPELINE_EXECUTION_MODE] = Tags.PIPELINE_EXECUTION_MODE_GRAPH
+            self.settings[Tags.PIPELINE_MAX_WORKERS] = 3
+            self.settings[Tags.STORAGE_BACKEND] = storage_backend
+            sp.simulate(self.create_pipeline(), self.settings, self.device)
+            file_path = self.settings[Tags.SIMPA_OUTPUT_FILE_PATH]
+            self.assertTrue(file_path.endswith("." + storage_backend))
+            results.append([sp.load_data_field(file_path, Tags.DATA_FIELD_FLUENCE, wl) for wl in self.wavelengths])
+            self.assertEqual(sp.load_data_field(file_path, Tags.SETTINGS)[Tags.STORAGE_BACKEND], storage_backend)
+            self.tearDown()
+
+        for hdf5_fluence, zarr_fluence in zip(*results):
+            self.assertTrue(np.allclose(hdf5_fluence, zarr_fluence))
+
+
+class _RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        super(_RecordingHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
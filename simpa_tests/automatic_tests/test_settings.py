@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import copy
+import pickle
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from simpa.log import Logger
+from simpa.utils import Tags, Settings
+from simpa.utils.settings import FrozenSettings
+
+
+class TestSettings(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = Settings({
+            Tags.SPACING_MM: 0.5,
+            Tags.WAVELENGTHS: [700, 800],
+            Tags.VOLUME_NAME: "TestSettings"
+        })
+        self.settings.set_optical_settings({Tags.OPTICAL_MODEL_NUMBER_PHOTONS: 100})
+        self.settings["custom_array"] = np.arange(5)
+
+    def test_plain_string_keys_are_warned_about_once(self):
+        with patch.object(Logger, "warning") as warning:
+            settings = Settings()
+            settings["test_settings_plain_key"] = 1
+            settings["test_settings_plain_key"] = 2
+            Settings({"test_settings_plain_key": 3})
+            self.assertEqual(warning.call_count, 1)
+
+    def test_copies_are_not_checked_again(self):
+        with patch.object(Logger, "warning") as warning, patch.object(Settings, "__setitem__") as setitem:
+            copied_settings = Settings(self.settings)
+            trusted_settings = Settings.from_trusted({Tags.SPACING_MM: 1.0, "custom_key": "value"})
+            self.assertEqual(setitem.call_count, 0)
+            self.assertEqual(warning.call_count, 0)
+        self.assertEqual(copied_settings[Tags.SPACING_MM], 0.5)
+        self.assertEqual(trusted_settings[Tags.SPACING_MM], 1.0)
+        self.assertEqual(trusted_settings["custom_key"], "value")
+        with self.assertRaises(ValueError):
+            Settings({Tags.SPACING_MM: "invalid"})
+
+    def test_frozen_settings(self):
+        frozen_settings = self.settings.freeze()
+        self.assertIsInstance(frozen_settings[Tags.OPTICAL_MODEL_SETTINGS], FrozenSettings)
+        self.assertEqual(frozen_settings[Tags.SPACING_MM], 0.5)
+        with self.assertRaises(TypeError):
+            frozen_settings[Tags.SPACING_MM] = 1.0
+        with self.assertRaises(TypeError):
+            frozen_settings[Tags.OPTICAL_MODEL_SETTINGS][Tags.OPTICAL_MODEL_NUMBER_PHOTONS] = 1
+        with self.assertRaises(TypeError):
+            del frozen_settings[Tags.SPACING_MM]
+
+        # the hash depends on the content only
+        reordered_settings = Settings.from_trusted(dict(reversed(list(self.settings.items()))))
+        self.assertEqual(hash(frozen_settings), hash(reordered_settings.freeze()))
+        self.assertEqual(hash(frozen_settings), hash(pickle.loads(pickle.dumps(frozen_settings))))
+        self.assertIs(copy.deepcopy(frozen_settings), frozen_settings)
+        self.settings["custom_array"] = np.arange(6)
+        self.assertNotEqual(hash(frozen_settings), hash(self.settings.freeze()))
+        cache = {frozen_settings: "cached"}
+        copied_array_settings = Settings.from_trusted(reordered_settings)
+        copied_array_settings["custom_array"] = np.arange(5)
+        self.assertEqual(cache[copied_array_settings.freeze()], "cached")
+
+        modifiable_settings = Settings(frozen_settings)
+        modifiable_settings[Tags.SPACING_MM] = 1.0
+        self.assertEqual(frozen_settings[Tags.SPACING_MM], 0.5)
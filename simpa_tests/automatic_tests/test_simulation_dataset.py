@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import importlib.util
+import os
+import shutil
+import unittest
+
+import numpy as np
+import torch
+
+from simpa.core.device_digital_twins import RSOMExplorerP50
+from simpa.core.processing_components.monospectral.field_of_view_cropping import get_field_of_view_voxels, \
+    get_field_of_view_region
+from simpa.io_handling import save_hdf5, save_data_field, ShardedDatasetWriter, SimulationDataset, \
+    create_data_loader
+from simpa.utils import Tags, Settings
+
+
+class TestSimulationDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = "test_simulation_dataset"
+        self.shard_directory = "test_simulation_dataset_shards"
+        self.zarr_directory = "test_simulation_dataset_zarr"
+        self.device = RSOMExplorerP50(0.1, 1, 1)
+        os.makedirs(self.directory, exist_ok=True)
+        self.file_paths = [os.path.join(self.directory, f"sample_{index}.hdf5") for index in range(5)]
+        for index, file_path in enumerate(self.file_paths):
+            settings = Settings({Tags.WAVELENGTHS: [700, 800], Tags.SPACING_MM: 0.5})
+            save_hdf5({Tags.SETTINGS: settings, Tags.DIGITAL_DEVICE: self.device}, file_path)
+            for wavelength in [700, 800]:
+                save_data_field(np.full((10, 10, 10), index + wavelength, dtype=np.float32), file_path,
+                                Tags.DATA_FIELD_INITIAL_PRESSURE, wavelength)
+            save_data_field(np.arange(1000, dtype=np.int32).reshape((10, 10, 10)) + index, file_path,
+                            Tags.DATA_FIELD_SEGMENTATION)
+        with ShardedDatasetWriter(self.shard_directory, [Tags.DATA_FIELD_INITIAL_PRESSURE,
+                                                         Tags.DATA_FIELD_SEGMENTATION], samples_per_shard=2) as writer:
+            for file_path in self.file_paths:
+                writer.append(file_path)
+
+    def tearDown(self):
+        for directory in [self.directory, self.shard_directory, self.zarr_directory]:
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+
+    def test_files_and_shards_yield_the_same_samples(self):
+        data_fields = [Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_SEGMENTATION]
+        file_dataset = SimulationDataset(self.directory, data_fields, max_open_files=2)
+        shard_dataset = SimulationDataset(self.shard_directory, data_fields)
+        self.assertEqual(len(file_dataset), 5)
+        self.assertEqual(len(shard_dataset), 5)
+        self.assertEqual(file_dataset.wavelengths, [700, 800])
+
+        for index in range(5):
+            file_sample = file_dataset[index]
+            shard_sample = shard_dataset[index]
+            self.assertEqual(file_sample[Tags.DATA_FIELD_INITIAL_PRESSURE].shape, (2, 10, 10, 10))
+            self.assertTrue(torch.all(file_sample[Tags.DATA_FIELD_INITIAL_PRESSURE][1] == index + 800))
+            for data_field in data_fields:
+                self.assertTrue(torch.equal(file_sample[data_field], shard_sample[data_field]))
+        # the least recently used handles are closed
+        self.assertEqual(len(file_dataset._handles), 2)
+
+        # batches of consecutive samples are read per shard
+        batch = shard_dataset.__getitems__([1, 2, 3, 0])
+        self.assertEqual([int(sample[Tags.DATA_FIELD_SEGMENTATION][0, 0, 0]) for sample in batch], [1, 2, 3, 0])
+        file_dataset.close()
+        shard_dataset.close()
+
+    def test_wavelength_selection_and_field_of_view_cropping(self):
+        dataset = SimulationDataset(self.file_paths + [self.shard_directory], [Tags.DATA_FIELD_SEGMENTATION,
+                                                                                Tags.DATA_FIELD_INITIAL_PRESSURE],
+                                    wavelengths=[800], crop_to_field_of_view=True)
+        self.assertEqual(len(dataset), 10)
+        region = get_field_of_view_region(get_field_of_view_voxels(self.device, 0.5), 3)
+        expected = np.arange(1000, dtype=np.int32).reshape((10, 10, 10))[region] + 3
+        for index in [3, 8]:
+            sample = dataset[index]
+            self.assertTrue(np.array_equal(sample[Tags.DATA_FIELD_SEGMENTATION].numpy(), expected))
+            self.assertEqual(sample[Tags.DATA_FIELD_INITIAL_PRESSURE].shape, (1,) + expected.shape)
+
+    def test_samples_with_different_settings_share_their_field_of_view(self):
+        shutil.rmtree(self.shard_directory)
+        with ShardedDatasetWriter(self.shard_directory, [Tags.DATA_FIELD_SEGMENTATION], wavelengths=[700, 800],
+                                  samples_per_shard=5) as writer:
+            for index, file_path in enumerate(self.file_paths):
+                settings = Settings({Tags.WAVELENGTHS: [700, 800], Tags.SPACING_MM: 0.5,
+                                     Tags.VOLUME_NAME: f"sample_{index}", Tags.RANDOM_SEED: index})
+                writer.append_sample({Tags.DATA_FIELD_SEGMENTATION: np.arange(1000, dtype=np.int32).reshape(
+                    (10, 10, 10)) + index}, settings, self.device, file_path)
+        dataset = SimulationDataset(self.shard_directory, [Tags.DATA_FIELD_SEGMENTATION], crop_to_field_of_view=True)
+        self.assertEqual(len(set(dataset._readers[0].metadata_hashes)), 5)
+
+        loaded_groups = []
+        load_samples = dataset._load_samples
+
+        def record_load_samples(sample_indices):
+            loaded_groups.append(list(sample_indices))
+            return load_samples(sample_indices)
+
+        dataset._load_samples = record_load_samples
+        batch = dataset.__getitems__([0, 1, 2, 3, 4])
+        self.assertEqual(loaded_groups, [[0, 1, 2, 3, 4]])
+        self.assertEqual(len(dataset._field_of_view_voxels), 1)
+        region = get_field_of_view_region(get_field_of_view_voxels(self.device, 0.5), 3)
+        for index, sample in enumerate(batch):
+            expected = np.arange(1000, dtype=np.int32).reshape((10, 10, 10))[region] + index
+            self.assertTrue(np.array_equal(sample[Tags.DATA_FIELD_SEGMENTATION].numpy(), expected))
+        dataset.close()
+
+    def test_data_loader(self):
+        dataset = SimulationDataset(self.shard_directory, [Tags.DATA_FIELD_INITIAL_PRESSURE])
+        for num_workers in [0, 2]:
+            data_loader = create_data_loader(dataset, batch_size=2, num_workers=num_workers)
+            batches = list(data_loader)
+            self.assertEqual(len(batches), 3)
+            self.assertEqual(batches[0][Tags.DATA_FIELD_INITIAL_PRESSURE].shape, (2, 2, 10, 10, 10))
+            self.assertTrue(torch.all(batches[2][Tags.DATA_FIELD_INITIAL_PRESSURE][0, 0] == 704))
+
+    @unittest.skipIf(importlib.util.find_spec("zarr") is None, "The zarr package is not installed.")
+    def test_zarr_output_files(self):
+        os.makedirs(self.zarr_directory, exist_ok=True)
+        zarr_paths = [os.path.join(self.zarr_directory, f"sample_{index}.zarr") for index in range(2)]
+        for index, zarr_path in enumerate(zarr_paths):
+            save_hdf5({Tags.SETTINGS: Settings({Tags.WAVELENGTHS: [700, 800], Tags.SPACING_MM: 0.5}),
+                       Tags.DIGITAL_DEVICE: self.device}, zarr_path)
+            for wavelength in [700, 800]:
+                save_data_field(np.full((10, 10, 10), index + wavelength, dtype=np.float32), zarr_path,
+                                Tags.DATA_FIELD_INITIAL_PRESSURE, wavelength)
+            save_data_field(np.arange(1000, dtype=np.int32).reshape((10, 10, 10)) + index, zarr_path,
+                            Tags.DATA_FIELD_SEGMENTATION)
+
+        data_fields = [Tags.DATA_FIELD_INITIAL_PRESSURE, Tags.DATA_FIELD_SEGMENTATION]
+        file_dataset = SimulationDataset(self.file_paths[:2], data_fields, crop_to_field_of_view=True)
+        for sources in [self.zarr_directory, zarr_paths[1], [zarr_paths[0], zarr_paths[1]]]:
+            dataset = SimulationDataset(sources, data_fields, crop_to_field_of_view=True)
+            self.assertEqual(dataset.wavelengths, [700, 800])
+            for index in range(len(dataset)):
+                sample_index = int(dataset.samples[index][0][-len("0.zarr")])
+                for data_field in data_fields:
+                    self.assertTrue(torch.equal(dataset[index][data_field], file_dataset[sample_index][data_field]))
+            dataset.close()
+        self.assertEqual(len(SimulationDataset(self.zarr_directory, data_fields)), 2)
+        file_dataset.close()
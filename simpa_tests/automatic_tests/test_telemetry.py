@@ -0,0 +1,147 @@
+# SPDX-FileCopyrightText: 2021 Division of Intelligent Medical Systems, DKFZ
+# SPDX-FileCopyrightText: 2021 Janek Groehl
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+import time
+import unittest
+
+import numpy as np
+import torch
+
+import simpa as sp
+from simpa import ModelBasedAdapter, LinearUnmixing
+from simpa.core.simulation_modules.optical_module.optical_test_adapter import OpticalTestAdapter
+from simpa.core.simulation_modules.acoustic_module.acoustic_test_adapter import AcousticTestAdapter
+from simpa.core.simulation_modules.reconstruction_module.reconstruction_test_adapter import \
+    ReconstructionTestAdapter
+from simpa.utils import Tags, Settings
+from simpa.utils.telemetry import Telemetry, load_telemetry, measure, _get_rss_mb
+from simpa_tests.test_utils import create_test_structure_parameters
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.wavelengths = [700, 800]
+        self.json_lines_path = "TestTelemetry.jsonl"
+        self.settings = Settings({
+            Tags.RANDOM_SEED: 4711,
+            Tags.VOLUME_NAME: "TestTelemetry",
+            Tags.SIMULATION_PATH: ".",
+            Tags.SPACING_MM: 0.5,
+            Tags.DIM_VOLUME_Z_MM: 5,
+            Tags.DIM_VOLUME_X_MM: 5,
+            Tags.DIM_VOLUME_Y_MM: 5,
+            Tags.WAVELENGTHS: self.wavelengths,
+            Tags.GPU: False,
+            Tags.TELEMETRY_JSON_LINES_FILE: self.json_lines_path
+        })
+        self.settings.set_volume_creation_settings({
+            Tags.STRUCTURES: create_test_structure_parameters()
+        })
+        self.settings.set_optical_settings({Tags.OPTICAL_MODEL: Tags.OPTICAL_MODEL_TEST})
+        self.settings.set_acoustic_settings({})
+        self.settings.set_reconstruction_settings({})
+        self.settings["linear_unmixing"] = {
+            Tags.DATA_FIELD: Tags.DATA_FIELD_ABSORPTION_PER_CM,
+            Tags.WAVELENGTHS: self.wavelengths,
+            Tags.LINEAR_UNMIXING_SPECTRA: sp.get_simpa_internal_absorption_spectra_by_names(
+                [Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_OXYHEMOGLOBIN,
+                 Tags.SIMPA_NAMED_ABSORPTION_SPECTRUM_DEOXYHEMOGLOBIN])
+        }
+        self.device = sp.RSOMExplorerP50(0.1, 1, 1)
+
+    def tearDown(self):
+        for path in [self.settings[Tags.SIMPA_OUTPUT_FILE_PATH] if Tags.SIMPA_OUTPUT_FILE_PATH in self.settings
+                     else None, self.json_lines_path]:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def test_simulate_records_telemetry(self):
+        pipeline = [
+            ModelBasedAdapter(self.settings),
+            OpticalTestAdapter(self.settings),
+            AcousticTestAdapter(self.settings),
+            ReconstructionTestAdapter(self.settings),
+            LinearUnmixing(self.settings, "linear_unmixing")
+        ]
+        sp.simulate(pipeline, self.settings, self.device)
+
+        records = load_telemetry(self.settings[Tags.SIMPA_OUTPUT_FILE_PATH])
+        runs = [(record["element"], record["wavelength"]) for record in records if record["name"] == "run"]
+        for wavelength in self.wavelengths:
+            for element in ["ModelBasedAdapter", "OpticalTestAdapter", "AcousticTestAdapter",
+                            "ReconstructionTestAdapter"]:
+                # nested run calls of the base classes are recorded only once
+                self.assertEqual(runs.count((element, wavelength)), 1)
+        self.assertEqual(runs.count(("LinearUnmixing", None)), 1)
+        self.assertEqual(len([record for record in records if record["name"] == "simulate"]), 1)
+
+        # the sub-steps are recorded with the pipeline element and wavelength that ran them
+        self.assertIn(("hdf5_save", "OpticalTestAdapter", 800),
+                      [(record["name"], record["element"], record["wavelength"]) for record in records])
+        self.assertIn(("reconstruction_algorithm", "ReconstructionTestAdapter", 700),
+                      [(record["name"], record["element"], record["wavelength"]) for record in records])
+        for record in records:
+            self.assertGreaterEqual(record["wall_time_s"], 0)
+            self.assertGreaterEqual(record["cpu_time_s"], 0)
+            self.assertEqual(record["output_name"], "TestTelemetry")
+
+        with open(self.json_lines_path) as json_lines_file:
+            json_lines = [json.loads(line) for line in json_lines_file]
+        self.assertEqual(json_lines, records)
+
+    def test_measure_without_telemetry_does_nothing(self):
+        telemetry = Telemetry()
+        with measure("hdf5_load"):
+            pass
+        self.assertEqual(telemetry.records, [])
+
+        with telemetry:
+            with measure("outer", "Element", 700):
+                with measure("inner"):
+                    pass
+            with self.assertRaises(RuntimeError):
+                with Telemetry():
+                    pass
+        with measure("hdf5_load"):
+            pass
+        self.assertEqual([(record["name"], record["element"], record["wavelength"])
+                          for record in telemetry.records], [("inner", "Element", 700), ("outer", "Element", 700)])
+
+    @unittest.skipIf(_get_rss_mb() is None, "The resident set size is only measured on Linux.")
+    def test_peak_memory_of_nested_steps(self):
+        with Telemetry(sampling_interval_s=0.01) as telemetry:
+            start_rss_mb = _get_rss_mb()
+            with measure("outer", "Element", 700):
+                with measure("inner"):
+                    data = np.ones(2 ** 28 // 8)
+                    # gives the sampling thread time to sample the resident set size
+                    time.sleep(0.1)
+                    del data
+                with measure("hdf5_save"):
+                    pass
+        records = {record["name"]: record for record in telemetry.records}
+
+        # the peak of a step covers the whole step and not the whole process, nested steps do not reset it
+        self.assertGreater(records["inner"]["peak_rss_mb"], start_rss_mb + 200)
+        self.assertGreaterEqual(records["outer"]["peak_rss_mb"], records["inner"]["peak_rss_mb"])
+        self.assertLess(records["hdf5_save"]["peak_rss_mb"], records["inner"]["peak_rss_mb"] - 200)
+        self.assertIsNotNone(records["outer"]["process_peak_rss_mb"])
+
+    @unittest.skipIf(not torch.cuda.is_available(), "CUDA is not available.")
+    def test_peak_cuda_memory_of_nested_steps(self):
+        torch.zeros(1, device="cuda")
+        with Telemetry() as telemetry:
+            with measure("outer", "Element", 700):
+                with measure("inner"):
+                    data = torch.ones(2 ** 28 // 4, device="cuda")
+                    del data
+                with measure("hdf5_save"):
+                    pass
+        records = {record["name"]: record for record in telemetry.records}
+        self.assertGreaterEqual(records["inner"]["peak_cuda_memory_mb"], 256)
+        self.assertGreaterEqual(records["outer"]["peak_cuda_memory_mb"], 256)
+        self.assertLess(records["hdf5_save"]["peak_cuda_memory_mb"], 256)
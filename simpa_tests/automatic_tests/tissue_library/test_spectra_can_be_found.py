@@ -6,6 +6,7 @@ import unittest
 from simpa.utils import AbsorptionSpectrumLibrary
 from simpa.utils import ScatteringSpectrumLibrary
 from simpa.utils import AnisotropySpectrumLibrary
+from simpa.utils.libraries.spectrum_library import Spectrum, SpectrumRegistry, load_spectrum_table
 
 
 class TestSpectraCanBeFound(unittest.TestCase):
@@ -47,3 +48,24 @@ class TestSpectraCanBeFound(unittest.TestCase):
     @unittest.expectedFailure
     def test_anisotropy_spectra_invalid(self):
         AnisotropySpectrumLibrary().get_spectrum_by_name("This does not exist")
+
+    def test_spectra_of_the_same_file_share_the_interpolated_values(self):
+        first_spectrum = AbsorptionSpectrumLibrary().get_spectrum_by_name("Water")
+        second_spectrum = AbsorptionSpectrumLibrary().get_spectrum_by_name("Water")
+        self.assertIsNot(first_spectrum, second_spectrum)
+        self.assertIs(first_spectrum.values_interp, second_spectrum.values_interp)
+        self.assertFalse(first_spectrum.values_interp.flags.writeable)
+        self.assertEqual(first_spectrum.get_value_for_wavelength(800),
+                         Spectrum("Water", first_spectrum.wavelengths.numpy(),
+                                  first_spectrum.values.numpy()).get_value_for_wavelength(800))
+
+    def test_spectra_are_loaded_lazily(self):
+        SpectrumRegistry().clear()
+        self.assertIs(SpectrumRegistry(), SpectrumRegistry())
+        lib = AbsorptionSpectrumLibrary()
+        self.assertIn("Oxyhemoglobin", lib.get_spectra_names())
+        self.assertEqual(load_spectrum_table.cache_info().currsize, 0)
+        lib.get_spectrum_by_name("Oxyhemoglobin")
+        AbsorptionSpectrumLibrary().get_spectrum_by_name("Oxyhemoglobin")
+        self.assertEqual(load_spectrum_table.cache_info().currsize, 1)
+        self.assertEqual(len(list(lib)), len(lib.get_spectra_names()))